@@ -0,0 +1,111 @@
+'Benchmark for locating the top of vertical lines on a ruled budget page'
+
+import argparse
+import cv2
+import numpy
+import time
+from parsers.pdf_to_csv import PDF2CSV, PageLineGeometry, DEFAULT_PIXEL_COLOR
+
+PAGE_WIDTH = 2480
+PAGE_HEIGHT = 3508
+HEADER_HEIGHT = 240
+HEADER_SHADE = (200, 200, 200)
+TABLE_LEFT = 150
+TABLE_TOP = 300
+TABLE_RIGHT = PAGE_WIDTH - 150
+TABLE_BOTTOM = PAGE_HEIGHT - 200
+ROW_COUNT = 45
+COLUMN_COUNT = 12
+
+
+def get_column_x(column_index):
+    return TABLE_LEFT + column_index * ((TABLE_RIGHT - TABLE_LEFT) / COLUMN_COUNT)
+
+
+def get_row_y(row_index):
+    return TABLE_TOP + HEADER_HEIGHT + row_index * ((TABLE_BOTTOM - TABLE_TOP - HEADER_HEIGHT) / ROW_COUNT)
+
+
+def generate_ruled_page_image():
+    '''Draw an A4 page at 300 DPI with a ruled table below a shaded header.
+
+    The shaded header is what makes the pixel walk expensive on real budget
+    pages, every vertical line has to be followed through it.
+    '''
+    image = numpy.full((PAGE_HEIGHT, PAGE_WIDTH, 3), 255, dtype=numpy.uint8)
+    cv2.rectangle(image, (TABLE_LEFT, TABLE_TOP),
+                  (TABLE_RIGHT, TABLE_TOP + HEADER_HEIGHT), HEADER_SHADE, -1)
+    for column_index in range(COLUMN_COUNT + 1):
+        cv2.line(image, (get_column_x(column_index), get_row_y(0)),
+                 (get_column_x(column_index), TABLE_BOTTOM), (0, 0, 0), 3)
+    for row_index in range(ROW_COUNT + 1):
+        cv2.line(image, (TABLE_LEFT, get_row_y(row_index)),
+                 (TABLE_RIGHT, get_row_y(row_index)), (0, 0, 0), 3)
+        for column_index in range(COLUMN_COUNT):
+            cv2.putText(image, "%s.%s" % (row_index, column_index),
+                        (get_column_x(column_index) + 20, get_row_y(row_index) - 15),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return image
+
+
+def generate_ruled_page_lines():
+    '''Vertical rulings split at every row, the way HoughLinesP often
+    returns them on scanned budget pages, along with the horizontal ones.
+    '''
+    lines = []
+    for column_index in range(COLUMN_COUNT + 1):
+        for row_index in range(ROW_COUNT):
+            lines.append([get_column_x(column_index), get_row_y(row_index + 1),
+                          get_column_x(column_index), get_row_y(row_index)])
+    for row_index in range(ROW_COUNT + 1):
+        lines.append([TABLE_LEFT, get_row_y(row_index),
+                      TABLE_RIGHT, get_row_y(row_index)])
+    return numpy.array(lines, dtype=numpy.int32).reshape(-1, 1, 4)
+
+
+def legacy_fix_vertical_lines(image_object, line_geometry, max_vertical):
+    '''Pixel by pixel walk used by `PDF2CSV.fix_vertical_lines` earlier
+    '''
+    if max_vertical[1] > max_vertical[2]:
+        min_vertical_index = 2
+    else:
+        min_vertical_index = 1
+    for x1, y1, x2, y2 in line_geometry.vertical.tolist():
+        while(image_object[y2, x2].tolist() != DEFAULT_PIXEL_COLOR and y2 > 0):
+            y2 -= 1
+        if y2 < max_vertical[min_vertical_index]:
+            max_vertical[min_vertical_index] = y2
+    return max_vertical
+
+
+def time_per_page(function, repeat):
+    start_time = time.time()
+    for count in range(repeat):
+        result = function()
+    return result, (time.time() - start_time) / repeat
+
+
+def run_benchmark(repeat):
+    pdf_to_csv_obj = PDF2CSV()
+    pdf_to_csv_obj.image_object = generate_ruled_page_image()
+    line_geometry = PageLineGeometry(generate_ruled_page_lines())
+    max_vertical = [0, PAGE_HEIGHT, 0, 0]
+    legacy_result, legacy_time = time_per_page(lambda: legacy_fix_vertical_lines(pdf_to_csv_obj.image_object,
+                                                                                 line_geometry,
+                                                                                 max_vertical[:]),
+                                               repeat)
+    result, column_scan_time = time_per_page(lambda: pdf_to_csv_obj.fix_vertical_lines(line_geometry,
+                                                                                       max_vertical[:]),
+                                             repeat)
+    if legacy_result != result:
+        raise ValueError("Column scan result %s differs from pixel walk %s" % (result, legacy_result))
+    print("Vertical lines: %s" % len(line_geometry.vertical))
+    print("Pixel walk: %.2f ms/page" % (legacy_time * 1000))
+    print("Column scan: %.2f ms/page" % (column_scan_time * 1000))
+    return legacy_time, column_scan_time
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times fix_vertical_lines before and after vectorization on a ruled page")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs to average over")
+    args = parser.parse_args()
+    run_benchmark(args.repeat)
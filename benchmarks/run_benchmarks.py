@@ -0,0 +1,244 @@
+'Runs the parsers on synthetic budget documents and reports their throughput'
+
+import argparse
+from collections import OrderedDict
+import csv
+import json
+import multiprocessing
+import os
+import Queue
+import resource
+import shutil
+import sys
+import time
+from parsers.benchmarks.fix_vertical_lines_benchmark import run_benchmark as run_fix_vertical_lines_benchmark
+from parsers.benchmarks.synthetic_budget_generator import (SyntheticBudgetGenerator,
+                                                           DEFAULT_PAGE_COUNT,
+                                                           DEFAULT_ROWS_PER_PAGE)
+from parsers.workspace import Workspace
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMBINED_BUDGET_DIR = os.path.join(REPO_DIR, "combined_budget")
+RESEARCH_CODE_DIR = os.path.join(REPO_DIR, "research", "table_extraction_using_block_detection", "code")
+DEFAULT_TOLERANCE = 0.2
+MIN_OUTPUT_ROWS = 2
+RESULT_POLL_INTERVAL = 1
+
+
+def run_pdf2csv(input_pdf_filepath, output_dir, workers):
+    from parsers.pdf_to_csv import PDF2CSV
+    PDF2CSV().generate_csv_file(input_pdf_filepath, os.path.join(output_dir, "out.csv"),
+                                is_header=True, identify_columns=True, workers=workers)
+
+
+def run_pdf2csv_vector(input_pdf_filepath, output_dir, workers):
+    from parsers.pdf_to_csv import PDF2CSV
+    PDF2CSV().generate_csv_file(input_pdf_filepath, os.path.join(output_dir, "out.csv"),
+                                is_header=True, identify_columns=True, workers=workers,
+                                vector_detection=True)
+
+
+def run_expenditure(input_pdf_filepath, output_dir, workers):
+    from parsers.union_budget.expenditure_budget_csv_generator import ExpenditureBudgetCSVGenerator
+    ExpenditureBudgetCSVGenerator().generate_expenditure_budgets_csv(os.path.dirname(input_pdf_filepath) + "/",
+                                                                     "form1", page_header=True,
+                                                                     identify_columns=True,
+                                                                     workers=workers)
+
+
+def run_karnataka(input_pdf_filepath, output_dir, workers):
+    from parsers.state_budget.karnataka.karnataka_budget_csv_generator import KarnatakaBudgetCSVGenerator
+    KarnatakaBudgetCSVGenerator().generate_karnataka_budget_csv(input_pdf_filepath, output_dir,
+                                                                workers=workers)
+
+
+def run_combined(input_pdf_filepath, output_dir, workers):
+    sys.path.insert(0, COMBINED_BUDGET_DIR)
+    from combined_budget_csv_generator import CombinedBudgetCSVGenerator
+    CombinedBudgetCSVGenerator().generate_combined_budget_csv(input_pdf_filepath, output_dir,
+                                                              workers=workers)
+
+
+def run_block_detection(input_pdf_filepath, output_dir, workers):
+    sys.path.insert(0, RESEARCH_CODE_DIR)
+    from pdf2csv import process_folder
+    process_folder(os.path.dirname(input_pdf_filepath), output_dir)
+
+
+def run_fix_vertical_lines(repeat):
+    legacy_time, column_scan_time = run_fix_vertical_lines_benchmark(repeat)
+    return column_scan_time
+
+
+BENCHMARKS = OrderedDict([("pdf2csv", ("form1", run_pdf2csv)),
+                          ("pdf2csv_vector", ("form1", run_pdf2csv_vector)),
+                          ("expenditure", ("form1", run_expenditure)),
+                          ("karnataka", ("karnataka", run_karnataka)),
+                          ("combined", ("ipfs", run_combined)),
+                          ("block_detection", ("demand_draft", run_block_detection)),
+                          ("fix_vertical_lines", (None, run_fix_vertical_lines))])
+
+
+def measure_benchmark(benchmark_function, benchmark_args, result_queue):
+    '''Run a benchmark in a fresh process, so that its peak memory is not
+    hidden by the peak of an earlier benchmark
+    '''
+    start_time = time.time()
+    result = {"error": None, "value": None}
+    try:
+        result["value"] = benchmark_function(*benchmark_args)
+    except Exception, error_message:
+        result["error"] = "%s: %s" % (error_message.__class__.__name__, error_message)
+    result["wall_time"] = time.time() - start_time
+    result["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["children_max_rss_kb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    result_queue.put(result)
+
+
+def run_in_process(benchmark_function, benchmark_args):
+    '''Run a benchmark with `measure_benchmark` in a child process.
+
+    The result is polled for while the process is alive, so that a process
+    killed before reporting, like by the OOM killer, or exiting with an
+    error is reported as a failed benchmark instead of blocking the run.
+    '''
+    result_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure_benchmark,
+                                      args=(benchmark_function, benchmark_args, result_queue))
+    start_time = time.time()
+    process.start()
+    result = None
+    while result is None:
+        try:
+            result = result_queue.get(timeout=RESULT_POLL_INTERVAL)
+        except Queue.Empty:
+            if not process.is_alive():
+                break
+    if result is None:
+        try:
+            result = result_queue.get(timeout=RESULT_POLL_INTERVAL)
+        except Queue.Empty:
+            pass
+    process.join()
+    if result is None:
+        result = {"error": "Benchmark process exited without a result",
+                  "value": None, "wall_time": time.time() - start_time,
+                  "max_rss_kb": None, "children_max_rss_kb": None}
+    if process.exitcode:
+        result["error"] = "Benchmark process exited with code %s" % process.exitcode
+    return result
+
+
+def has_csv_output(document_dir):
+    '''Check if a parser wrote a CSV file with a header and at least one
+    data row next to its input or in the output directory, as some parsers
+    log errors instead of raising them and leave empty CSV files behind
+    '''
+    for dir_path, dir_names, file_names in os.walk(document_dir):
+        for file_name in file_names:
+            if not file_name.lower().endswith(".csv"):
+                continue
+            with open(os.path.join(dir_path, file_name), "rb") as csv_file:
+                filled_row_count = 0
+                for row in csv.reader(csv_file):
+                    if "".join(row).strip():
+                        filled_row_count += 1
+                        if filled_row_count >= MIN_OUTPUT_ROWS:
+                            return True
+    return False
+
+
+def run_benchmarks(benchmark_names, page_count, rows_per_page, workers, repeat):
+    '''Generate the synthetic documents and time every benchmark on them.
+
+    Returns:
+        A list of result dicts with the pages per second and peak memory of
+        every benchmark.
+    '''
+    results = []
+    with Workspace(prefix="benchmarks_") as workspace:
+        for benchmark_name in benchmark_names:
+            layout, benchmark_function = BENCHMARKS[benchmark_name]
+            if layout:
+                document_dir = workspace.get_path(benchmark_name)
+                output_dir = os.path.join(document_dir, "output")
+                os.makedirs(output_dir)
+                input_pdf_filepath = os.path.join(document_dir, "%s.pdf" % layout)
+                SyntheticBudgetGenerator().generate_document(layout, input_pdf_filepath,
+                                                             page_count=page_count,
+                                                             rows_per_page=rows_per_page)
+                measurement = run_in_process(benchmark_function,
+                                             (input_pdf_filepath, output_dir, workers))
+                if not measurement["error"] and not has_csv_output(document_dir):
+                    measurement["error"] = "No CSV output with data rows written"
+                pages = page_count
+                page_time = measurement["wall_time"] / page_count
+                shutil.rmtree(document_dir, ignore_errors=True)
+            else:
+                measurement = run_in_process(benchmark_function, (repeat,))
+                pages = 1
+                page_time = measurement["value"]
+            result = {"benchmark": benchmark_name, "layout": layout, "pages": pages,
+                      "rows_per_page": rows_per_page, "workers": workers,
+                      "wall_time": measurement["wall_time"],
+                      "pages_per_sec": None,
+                      "max_rss_kb": measurement["max_rss_kb"],
+                      "children_max_rss_kb": measurement["children_max_rss_kb"],
+                      "error": measurement["error"],
+                      "timestamp": time.time()}
+            if not measurement["error"] and page_time:
+                result["pages_per_sec"] = 1.0 / page_time
+            results.append(result)
+            print("%-20s %10s pages/sec %10s KB peak RSS %s" % (benchmark_name,
+                                                              "%.2f" % result["pages_per_sec"] if result["pages_per_sec"] else "-",
+                                                              result["max_rss_kb"],
+                                                              result["error"] or ""))
+    return results
+
+
+def get_regressions(results, baseline_filepath, tolerance):
+    '''Compare pages per second with the last baseline result of every
+    benchmark.
+
+    Returns:
+        A list of messages for benchmarks slower than the baseline by more
+        than the tolerance.
+    '''
+    baseline = {}
+    with open(baseline_filepath) as baseline_file:
+        for line in baseline_file:
+            baseline_result = json.loads(line)
+            baseline[baseline_result["benchmark"]] = baseline_result
+    regressions = []
+    for result in results:
+        baseline_result = baseline.get(result["benchmark"])
+        if not (baseline_result and baseline_result["pages_per_sec"] and result["pages_per_sec"]):
+            continue
+        if result["pages_per_sec"] < baseline_result["pages_per_sec"] * (1 - tolerance):
+            regressions.append("%s: %.2f pages/sec, baseline %.2f pages/sec" % (result["benchmark"],
+                                                                                 result["pages_per_sec"],
+                                                                                 baseline_result["pages_per_sec"]))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times parsers on synthetic budget documents")
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGE_COUNT, help="Number of pages per document")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS_PER_PAGE, help="Number of table rows per page")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used by the parsers")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs to average micro benchmarks over")
+    parser.add_argument("--output", help="JSON lines file to append the results to")
+    parser.add_argument("--baseline", help="JSON lines file of earlier results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed fraction of throughput loss against the baseline")
+    args = parser.parse_args()
+    benchmark_results = run_benchmarks(args.benchmarks, args.pages, args.rows, args.workers, args.repeat)
+    if args.output:
+        with open(args.output, "a") as output_file:
+            for benchmark_result in benchmark_results:
+                output_file.write(json.dumps(benchmark_result, sort_keys=True) + "\n")
+    if args.baseline:
+        regressions = get_regressions(benchmark_results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print("Regression: %s" % regression)
+        if regressions:
+            sys.exit(1)
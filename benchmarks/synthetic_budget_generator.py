@@ -0,0 +1,218 @@
+'Generator of synthetic budget PDFs in the layouts handled by the parsers'
+
+import argparse
+import random
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+from parsers.union_budget.expenditure_budget_csv_generator import FORMAT_DICT
+
+LAYOUTS = ["form1", "form2", "karnataka", "ipfs", "demand_draft"]
+DEFAULT_PAGE_COUNT = 10
+DEFAULT_ROWS_PER_PAGE = 30
+PAGE_MARGIN = 36
+TITLE_FONT = "Helvetica-Bold"
+BODY_FONT = "Helvetica"
+TITLE_FONT_SIZE = 10
+KARNATAKA_HEADER_ROW = ["Head of Account", "Description", "Voted / Charged",
+                        "Accounts 2015-16", "Budget Estimates 2016-17",
+                        "Revised Estimates 2016-17", "Budget Estimates 2017-18",
+                        "Plan / Non Plan"]
+IPFS_HEADER_ROW = ["Item", "Accounts 2014-15", "Budget 2015-16", "Revised 2015-16",
+                   "Budget 2016-17", "Accounts 2014-15", "Budget 2015-16",
+                   "Revised 2015-16", "Budget 2016-17"]
+DEMAND_DRAFT_HEADER_ROW = ["Major Head", "Description", "Voted", "Charged", "Total"]
+SCHEME_WORDS = ["Agriculture", "Irrigation", "Rural", "Development", "Housing",
+                "Education", "Health", "Roads", "Bridges", "Welfare", "Scheme",
+                "Grants", "Assistance", "Mission", "Secretariat", "Services",
+                "Establishment", "Capital", "Outlay", "Loans"]
+
+
+class SyntheticBudgetGenerator(object):
+    """
+    Generate budget like PDFs with ruled tables for benchmarking parsers.
+
+    Documents are drawn with reportlab as born-digital PDFs with the title,
+    header and ruling structure of each layout, filled with seeded random
+    scheme names and amounts so that runs are reproducible.
+    """
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def generate_document(self, layout, output_filepath,
+                          page_count=DEFAULT_PAGE_COUNT,
+                          rows_per_page=DEFAULT_ROWS_PER_PAGE):
+        '''Write a synthetic document.
+
+        Args:
+            - layout (string): One of `LAYOUTS`.
+            - output_filepath (string): Path of the pdf to write.
+            - page_count (int): Number of pages.
+            - rows_per_page (int): Number of table rows on every page.
+        '''
+        if layout not in LAYOUTS:
+            raise ValueError("Unknown layout %s, expected one of %s" % (layout, LAYOUTS))
+        pdf_canvas = canvas.Canvas(output_filepath, pagesize=A4)
+        for page_num in range(page_count):
+            if layout in FORMAT_DICT:
+                self.draw_expenditure_page(pdf_canvas, layout, page_num, rows_per_page)
+            elif layout == "karnataka":
+                self.draw_karnataka_page(pdf_canvas, page_num, rows_per_page)
+            elif layout == "ipfs":
+                self.draw_ipfs_page(pdf_canvas, page_num, rows_per_page)
+            elif page_num < 2:
+                self.draw_index_page(pdf_canvas, page_num, rows_per_page)
+            else:
+                self.draw_demand_draft_page(pdf_canvas, page_num, rows_per_page)
+            pdf_canvas.showPage()
+        pdf_canvas.save()
+
+    def get_scheme_name(self):
+        return " ".join(self.random.sample(SCHEME_WORDS, self.random.randint(2, 4)))
+
+    def get_amount(self):
+        if self.random.random() < 0.15:
+            return "..."
+        return "%.2f" % (self.random.random() * 10 ** self.random.randint(1, 5))
+
+    def draw_title(self, pdf_canvas, x, y, title_lines):
+        pdf_canvas.setFont(TITLE_FONT, TITLE_FONT_SIZE)
+        for title_line in title_lines:
+            pdf_canvas.drawString(x, y, title_line)
+            y -= TITLE_FONT_SIZE + 4
+        return y
+
+    def draw_table(self, pdf_canvas, left, top, column_widths, rows,
+                   header_row_count=1, font_size=6, bold_row_indices=()):
+        '''Draw a fully ruled table with its top left corner at (left, top).
+
+        Returns:
+            The y coordinate of the bottom of the table.
+        '''
+        row_height = font_size + 5
+        right = left + sum(column_widths)
+        bottom = top - row_height * len(rows)
+        for row_index, row in enumerate(rows):
+            if row_index < header_row_count or row_index in bold_row_indices:
+                pdf_canvas.setFont(TITLE_FONT, font_size)
+            else:
+                pdf_canvas.setFont(BODY_FONT, font_size)
+            x = left
+            y = top - row_height * (row_index + 1) + 3
+            for column_width, value in zip(column_widths, row):
+                pdf_canvas.drawString(x + 2, y, value[:int(column_width / (font_size * 0.5))])
+                x += column_width
+        pdf_canvas.setLineWidth(0.5)
+        x = left
+        for column_width in column_widths + [0]:
+            pdf_canvas.line(x, top, x, bottom)
+            x += column_width
+        for row_index in range(len(rows) + 1):
+            if 0 < row_index < len(rows) and row_index > header_row_count and self.random.random() < 0.7:
+                continue
+            y = top - row_height * row_index
+            pdf_canvas.line(left, y, right, y)
+        return bottom
+
+    def draw_expenditure_page(self, pdf_canvas, header_format, page_num, rows_per_page):
+        pdf_canvas.setPageSize(landscape(A4))
+        page_width, page_height = landscape(A4)
+        y = self.draw_title(pdf_canvas, PAGE_MARGIN, page_height - PAGE_MARGIN,
+                            ["Ministry of %s" % self.get_scheme_name(),
+                             "Demand No. %s" % (page_num + 1)])
+        header_rows = [FORMAT_DICT[header_format]["FIRST_HEADER_ROW"],
+                       [""] + FORMAT_DICT[header_format]["SECOND_HEADER_ROW"]]
+        column_count = len(header_rows[0])
+        column_widths = [25, 160] + [(page_width - 2 * PAGE_MARGIN - 185) / (column_count - 2)] * (column_count - 2)
+        rows = header_rows[:]
+        bold_row_indices = []
+        for row_index in range(rows_per_page):
+            if row_index % 8 == 0:
+                bold_row_indices.append(len(rows))
+                rows.append(["", self.get_scheme_name()] + [""] * (column_count - 2))
+            else:
+                rows.append(["%s." % row_index, self.get_scheme_name()] +
+                            [self.get_amount() for column_index in range(column_count - 2)])
+        self.draw_table(pdf_canvas, PAGE_MARGIN, y - 6, column_widths, rows,
+                        header_row_count=2, bold_row_indices=bold_row_indices)
+
+    def draw_karnataka_page(self, pdf_canvas, page_num, rows_per_page):
+        page_width, page_height = A4
+        y = self.draw_title(pdf_canvas, PAGE_MARGIN, page_height - PAGE_MARGIN,
+                            ["DEMAND NO. %s - %s" % (page_num + 1, self.get_scheme_name().upper()),
+                             "(Rs. in Lakhs)"])
+        column_widths = [70, 170, 35] + [(page_width - 2 * PAGE_MARGIN - 275) / 5] * 5
+        rows = [KARNATAKA_HEADER_ROW]
+        head_code = 2000 + page_num * 10
+        for row_index in range(rows_per_page):
+            voted_charged = "Charged" if self.random.random() < 0.2 else "Voted"
+            rows.append(["%s-%02d-%03d" % (head_code, row_index % 10, row_index),
+                         self.get_scheme_name(), voted_charged] +
+                        [self.get_amount() for column_index in range(4)] +
+                        [self.random.choice(["Plan", "Non Plan"])])
+        self.draw_table(pdf_canvas, PAGE_MARGIN, y - 6, column_widths, rows)
+
+    def draw_ipfs_page(self, pdf_canvas, page_num, rows_per_page):
+        '''Draw a table rotated by 90 degrees on a page with a /Rotate of 90,
+        the way the IPFS documents are laid out.
+
+        reportlab writes the media box of rotated pages with its width and
+        height swapped, so the content is drawn in a page_width by
+        page_height frame turned into the page_height by page_width box.
+        '''
+        page_width, page_height = A4
+        pdf_canvas.setPageRotation(90)
+        pdf_canvas.saveState()
+        pdf_canvas.transform(0, 1, -1, 0, page_height, 0)
+        y = self.draw_title(pdf_canvas, PAGE_MARGIN, page_height - PAGE_MARGIN,
+                            ["TABLE %s - %s" % (page_num + 1, self.get_scheme_name().upper()),
+                             "(` crore)"])
+        column_widths = [200] + [(page_width - 2 * PAGE_MARGIN - 200) / 8] * 8
+        rows = [IPFS_HEADER_ROW]
+        for row_index in range(rows_per_page):
+            rows.append(["%s. %s" % (row_index + 1, self.get_scheme_name())] +
+                        [self.get_amount() for column_index in range(8)])
+        self.draw_table(pdf_canvas, PAGE_MARGIN, y - 6, column_widths, rows)
+        pdf_canvas.restoreState()
+
+    def draw_index_page(self, pdf_canvas, page_num, rows_per_page):
+        page_width, page_height = A4
+        y = self.draw_title(pdf_canvas, PAGE_MARGIN, page_height - PAGE_MARGIN,
+                            ["DEMANDS FOR GRANTS", "INDEX"])
+        pdf_canvas.setFont(BODY_FONT, 8)
+        for row_index in range(rows_per_page):
+            y -= 12
+            pdf_canvas.drawString(PAGE_MARGIN, y, "%s. %s" % (page_num * rows_per_page + row_index + 1,
+                                                               self.get_scheme_name()))
+            pdf_canvas.drawRightString(page_width - PAGE_MARGIN, y, str(row_index + 3))
+
+    def draw_demand_draft_page(self, pdf_canvas, page_num, rows_per_page):
+        '''Draw a demand draft page with a table for every major head
+        '''
+        page_width, page_height = A4
+        y = self.draw_title(pdf_canvas, PAGE_MARGIN, page_height - PAGE_MARGIN,
+                            ["DEMAND NO. %s" % (page_num - 1),
+                             self.get_scheme_name().upper()])
+        column_widths = [60, 220] + [(page_width - 2 * PAGE_MARGIN - 280) / 3] * 3
+        table_count = self.random.randint(2, 3)
+        for table_index in range(table_count):
+            y = self.draw_title(pdf_canvas, PAGE_MARGIN, y - 10,
+                                ["MAJOR HEAD %s - %s" % (2000 + self.random.randint(0, 999),
+                                                         self.get_scheme_name().upper())])
+            rows = [DEMAND_DRAFT_HEADER_ROW]
+            for row_index in range(rows_per_page // table_count):
+                voted, charged = self.get_amount(), self.get_amount()
+                rows.append(["%02d.%03d" % (table_index, row_index),
+                             self.get_scheme_name(), voted, charged, self.get_amount()])
+            y = self.draw_table(pdf_canvas, PAGE_MARGIN, y - 4, column_widths, rows)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates synthetic budget PDFs for benchmarking")
+    parser.add_argument("layout", help="Document layout out of following: %s" % LAYOUTS)
+    parser.add_argument("output_file", help="Output PDF filepath")
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGE_COUNT, help="Number of pages")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS_PER_PAGE, help="Number of table rows per page")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated values")
+    args = parser.parse_args()
+    SyntheticBudgetGenerator(args.seed).generate_document(args.layout, args.output_file,
+                                                          page_count=args.pages,
+                                                          rows_per_page=args.rows)
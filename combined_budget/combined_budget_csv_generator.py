@@ -1,42 +1,47 @@
 'CSV generator for Combined Budget IPFS PDFs'
 
 import argparse
-import csv
 import glob
 import logging
 from logging.config import fileConfig
 import re
 import os
+from parsers.csv_file_pool import CSVFilePool
 from parsers.pdf_to_csv import PDF2CSV
 from parsers.keywords_extractor import KeywordsExtractor
-from PyPDF2 import PdfFileReader,PdfFileWriter
+from parsers.table_utils import delete_rows
+from parsers.workspace import Workspace
+from PyPDF2 import PdfFileWriter
 
 fileConfig('parsers/logging_config.ini')
 logger = logging.getLogger()
 MIN_COL_COUNT = 5
 MIN_TITLE_CHARS = 7
-TEMP_PDF_FILE = "/tmp/IPFS_temp.pdf"
+TEMP_PDF_FILE = "IPFS_temp.pdf"
 
 class CombinedBudgetCSVGenerator(PDF2CSV):
     def __init__(self):
         super(CombinedBudgetCSVGenerator, self).__init__()
-        self.keywords_extractor = KeywordsExtractor()        
+        self.keywords_extractor = KeywordsExtractor(index_pages=True)        
+        # Rotated single page PDFs are converted once, indexing them would keep
+        # an index of every temporary file
+        self.rotated_keywords_extractor = KeywordsExtractor()
         self.input_file = None
         self.output_dir = None
         self.currency_handle = '(` crore)'
         self.separator = " || " 
         self.continued_symbol = "(CONTD"
 
-    def generate_combined_budget_csv(self, input_file, output_dir):
+    def generate_combined_budget_csv(self, input_file, output_dir, workers=1):
         self.input_file = input_file
         self.output_dir = output_dir
-        self.generate_csv_file(input_file, input_file.split(".pdf")[0] + ".csv", is_header=False, check_page_rotation=True)
+        self.generate_csv_file(input_file, input_file.split(".pdf")[0] + ".csv", is_header=False, check_page_rotation=True, workers=workers)
 
     def modify_table_data(self, table):
         pagewise_table = self.split_pages(table)
         pagewise_table = self.clean_pagewise_table(pagewise_table)
-        pagewise_table,pagewise_keywords = self.create_page_to_file_map(pagewise_table)
-        self.generate_child_csv_files(pagewise_table, pagewise_keywords)
+        pagewise_table,pagewise_keywords,continued_pages = self.create_page_to_file_map(pagewise_table)
+        self.generate_child_csv_files(pagewise_table, pagewise_keywords, continued_pages)
         return None
 
     def split_pages(self, table):
@@ -68,48 +73,78 @@ class CombinedBudgetCSVGenerator(PDF2CSV):
                     row[0] = (row[0] + " " + row[1]).strip()
                     row.pop(1)
             while True:
-                empty_row_indices = []
+                empty_row_indices = set()
                 for row_index in range(len(page_table)):
                     if row_index in empty_row_indices:
                         continue
                     if page_table[row_index][0] == page_table[row_index][1] == "": 
                         for col_index in range(len(page_table[row_index])):
                             page_table[row_index-1][col_index] = page_table[row_index-1][col_index] + " " + page_table[row_index][col_index]
-                        empty_row_indices.append(row_index)
+                        empty_row_indices.add(row_index)
                     elif not "".join(page_table[row_index][1:]).strip():
                         if re.match(r"[0-9A-Z]\.|[a-z]+\)|[0-9]", page_table[row_index][0]) and row_index < len(page_table)-1:
                             for col_index in range(len(page_table[row_index])):
                                 page_table[row_index][col_index] = page_table[row_index][col_index] + " " + page_table[row_index+1][col_index]
-                            empty_row_indices.append(row_index+1)
+                            empty_row_indices.add(row_index+1)
                         else:
                             page_table[row_index-1][0] = page_table[row_index-1][0] + " " + page_table[row_index][0]
-                            empty_row_indices.append(row_index)
-                num = 0
+                            empty_row_indices.add(row_index)
                 if not empty_row_indices:
                     break
-                for row_count in empty_row_indices:
-                    page_table.pop(row_count-num)
-                    num += 1
+                delete_rows(page_table, empty_row_indices)
             pagewise_table[page_num] = page_table 
         return pagewise_table
 
     def get_rotated_pdf_keywords(self, input_pdf_filepath, page_num):
-        input_pdf_obj = PdfFileReader(open(input_pdf_filepath, 'rb')) 
         temp_pdf_obj = PdfFileWriter()
-        temp_pdf_obj.addPage(input_pdf_obj.getPage(page_num).rotateClockwise(90)) 
-        output_stream = file(TEMP_PDF_FILE, "wb")
-        temp_pdf_obj.write(output_stream)
-        output_stream.close()
-        return self.keywords_extractor.get_bold_text_phrases(TEMP_PDF_FILE, is_other_starting_phrases=True, single_word=True, page_num=1, lower_case=False) 
+        temp_pdf_obj.addPage(self.document_session.get_page(page_num).rotateClockwise(90)) 
+        with Workspace(prefix="ipfs_") as workspace:
+            temp_pdf_file = workspace.get_path(TEMP_PDF_FILE)
+            output_stream = file(temp_pdf_file, "wb")
+            temp_pdf_obj.write(output_stream)
+            output_stream.close()
+            return self.rotated_keywords_extractor.get_bold_text_phrases(temp_pdf_file, is_other_starting_phrases=True, single_word=True, page_num=1, lower_case=False) 
+
+    def get_page_keywords(self, page_num):
+        '''Get the bold phrases of a page from the HTML of the document.
+
+        Rotated pages, on which pdftohtml does not find the title, are read
+        from the bold and italic text of their content instead. Pages whose
+        title fonts can not be decoded, like CID fonts without a /ToUnicode
+        map, or on whose content no title is found either, are rotated and
+        converted with pdftohtml on their own.
+        '''
+        keyword_list = self.keywords_extractor.get_bold_text_phrases(self.input_file, is_other_starting_phrases=True, single_word=True, page_num=page_num, lower_case=False, document_session=self.document_session)
+        if not self.is_title_found(keyword_list):
+            emphasized_phrases = self.document_session.get_page_emphasized_phrases(page_num-1)
+            if emphasized_phrases is not None:
+                keyword_list = self.keywords_extractor.get_keywords(emphasized_phrases, is_other_starting_phrases=True, single_word=True, lower_case=False)
+            if emphasized_phrases is None or not self.is_title_found(keyword_list):
+                keyword_list = self.get_rotated_pdf_keywords(self.input_file, page_num-1)
+        return keyword_list
+
+    def is_title_found(self, keyword_list):
+        return bool(keyword_list) and len(keyword_list[0]) >= MIN_TITLE_CHARS
 
     def create_page_to_file_map(self, pagewise_table): 
+        '''Map pages to the titles of their tables.
+
+        A page continuing the table of the previous page takes its title and
+        loses its header row, its rows are appended to the file of the
+        previous page.
+
+        Returns:
+            Tuple of the pagewise table, the pagewise titles and the set of
+            the continued pages.
+        '''
         pagewise_keywords = {}
+        continued_pages = set()
         for page_num in pagewise_table:
-            keyword_list = self.keywords_extractor.get_bold_text_phrases(self.input_file, is_other_starting_phrases=True, single_word=True, page_num=page_num, lower_case=False)
-            if not keyword_list or len(keyword_list[0]) < MIN_TITLE_CHARS:
-                keyword_list = self.get_rotated_pdf_keywords(self.input_file, page_num-1)
-            pagewise_keywords[page_num] = keyword_list
-        for page_num in pagewise_keywords:
+            pagewise_keywords[page_num] = self.get_page_keywords(page_num)
+            if not pagewise_keywords[page_num]:
+                logger.warning("No title found on page %s, naming its file after the page" % page_num)
+                pagewise_keywords[page_num] = ["PAGE %s" % page_num]
+        for page_num in sorted(pagewise_keywords):
             currency_handle_found = False
             for keyword_index in range(len(pagewise_keywords[page_num])):
                 if pagewise_keywords[page_num][keyword_index] == self.currency_handle:
@@ -124,32 +159,37 @@ class CombinedBudgetCSVGenerator(PDF2CSV):
                 if not self.separator in pagewise_keywords[page_num]:
                     pagewise_keywords[page_num] = pagewise_keywords[page_num-1] 
                     pagewise_table[page_num].pop(0) 
-                    pagewise_table[page_num] = pagewise_table[page_num-1] + pagewise_table[page_num]
-                    pagewise_table.pop(page_num-1)
+                    continued_pages.add(page_num)
                 else:
                     pagewise_keywords[page_num] = pagewise_keywords[page_num-1].split(self.separator)[0] + self.separator + pagewise_keywords[page_num].split(self.separator)[-1] 
-        return pagewise_table,pagewise_keywords
+        return pagewise_table,pagewise_keywords,continued_pages
 
-    def generate_child_csv_files(self, pagewise_table, pagewise_keywords):
+    def generate_child_csv_files(self, pagewise_table, pagewise_keywords, continued_pages=()):
+        '''Write the table of every page to the file of its title as soon as
+        the page is reached, appending continued pages to the file of the
+        previous page. A title repeated by a page that does not continue the
+        previous one starts its file anew.
+        '''
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
-        for page_num in pagewise_table:
-            file_name = re.sub(r'^TABLE ', '', pagewise_keywords[page_num]).strip()
-            file_name = file_name.replace("/", '|')
-            file_name = file_name.replace(self.separator, '-')
-            out_csv_file = open(self.output_dir + "/" + file_name + ".csv", "wb")
-            csv_writer = csv.writer(out_csv_file, delimiter=',')
-            for row in pagewise_table[page_num]:
-                csv_writer.writerow(row)
-            out_csv_file.close() 
-        
+        with CSVFilePool() as csv_file_pool:
+            for page_num in sorted(pagewise_table):
+                file_name = re.sub(r'^TABLE ', '', pagewise_keywords[page_num]).strip()
+                file_name = file_name.replace("/", '|')
+                file_name = file_name.replace(self.separator, '-')
+                out_csv_filepath = self.output_dir + "/" + file_name + ".csv"
+                if not page_num in continued_pages:
+                    csv_file_pool.create(out_csv_filepath)
+                csv_file_pool.writerows(out_csv_filepath, pagewise_table[page_num])
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Generates CSV files from Combined Budget PDF Document(IPFS)")
     parser.add_argument("input_file", help="Input filepath for budget document")
     parser.add_argument("output_dir", help="Output directory for budget document")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to parse pages in parallel")
     args = parser.parse_args()
     obj = CombinedBudgetCSVGenerator()
     if not args.input_file or not args.output_dir: 
         print("Please input directory to begin CSV extraction")
     else:
-        obj.generate_combined_budget_csv(args.input_file, args.output_dir)
+        obj.generate_combined_budget_csv(args.input_file, args.output_dir, workers=args.workers)
@@ -0,0 +1,63 @@
+'Class for writing many CSV files a few rows at a time'
+
+from collections import OrderedDict
+import csv
+
+DEFAULT_MAX_OPEN_FILES = 32
+
+
+class CSVFilePool(object):
+    """
+    CSV files written page by page, with a bounded number of them open.
+
+    `create` starts a file, replacing an earlier file of the same path, and
+    `writerows` appends rows to it. Files are kept open in least recently
+    used order, the least recently used file is closed when another one has
+    to be opened over `max_open_files`, and reopened in append mode when it
+    is written to again.
+
+    Usage:
+        with CSVFilePool() as csv_file_pool:
+            csv_file_pool.create(out_csv_filepath)
+            csv_file_pool.writerows(out_csv_filepath, page_table)
+    """
+    def __init__(self, max_open_files=DEFAULT_MAX_OPEN_FILES):
+        self.max_open_files = max(1, max_open_files)
+        self.open_files = OrderedDict()
+        self.created_filepaths = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def create(self, filepath):
+        self.close_file(filepath)
+        self.open_file(filepath, "wb")
+        self.created_filepaths.add(filepath)
+
+    def writerows(self, filepath, rows):
+        '''Append rows to a file, creating it if it was not created before
+        '''
+        if filepath in self.open_files:
+            self.open_files[filepath] = self.open_files.pop(filepath)
+        elif filepath in self.created_filepaths:
+            self.open_file(filepath, "ab")
+        else:
+            self.create(filepath)
+        self.open_files[filepath][1].writerows(rows)
+
+    def open_file(self, filepath, mode):
+        while len(self.open_files) >= self.max_open_files:
+            self.open_files.popitem(last=False)[1][0].close()
+        out_csv_file = open(filepath, mode)
+        self.open_files[filepath] = (out_csv_file, csv.writer(out_csv_file, delimiter=','))
+
+    def close_file(self, filepath):
+        if filepath in self.open_files:
+            self.open_files.pop(filepath)[0].close()
+
+    def close(self):
+        while self.open_files:
+            self.open_files.popitem(last=False)[1][0].close()
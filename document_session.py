@@ -0,0 +1,402 @@
+'Class for sharing a parsed PDF document between the stages of a conversion'
+
+import logging
+from PyPDF2 import PdfFileReader
+from PyPDF2.pdf import ContentStream
+from parsers.keywords_extractor import (KeywordsExtractor, PageHTMLIndex,
+                                        STREAMING_XPATH_PARENT_TAGS)
+from parsers.page_cache import get_file_hash
+from parsers.page_renderer import PageRenderer
+from parsers.pdf_font import PDFFont, get_string_bytes
+from parsers.vector_table_detector import (IDENTITY_MATRIX, multiply_matrices,
+                                           transform_point)
+from parsers.workspace import Workspace
+
+logger = logging.getLogger()
+# Negative TJ offsets(in thousandths of text space units) wider than this are
+# taken as word spaces
+TJ_SPACE_OFFSET = 200
+# Text on the baseline of a run, starting at most this many ems before or
+# after its end, is added to the run
+MAX_RUN_GAP = 1.5
+# Gaps between the text of a run wider than this(in ems) are word spaces
+MIN_SPACE_GAP = 0.15
+BASELINE_TOLERANCE = 0.2
+MIN_DIRECTION_COSINE = 0.99
+UNKNOWN_WIDTH_SLACK = 0.5
+
+
+def decode_pdf_string(pdf_string, font):
+    '''Decode a string operand of a text showing operator through its font.
+
+    Returns:
+        A tuple of the unicode text and whether it was decoded through the
+        font, strings the font can not decode are read as latin-1.
+    '''
+    if font:
+        text = font.decode(pdf_string)
+        if text is not None:
+            return text, True
+    return get_string_bytes(pdf_string).decode('latin-1'), False
+
+
+class PDFDocumentSession(object):
+    """
+    A PDF document opened once and shared by every stage of its conversion.
+
+    The PyPDF2 reader, the HTML pdftohtml converts the document to and the
+    font runs of pages are created on first use and kept for the other
+    stages, so that keyword extraction, table detection and the post
+    processing of tables do not parse the document again. Page images are
+    not kept, they are rendered by the page renderer of the session every
+    time they are asked for, in chunks when iterated over. Sessions are
+    pickled to worker processes without their reader and HTML, which are
+    recreated there when used.
+
+    Usage:
+        with PDFDocumentSession(input_pdf_filepath) as document_session:
+            keywords = keywords_extractor.get_bold_text_phrases(input_pdf_filepath,
+                                                                document_session=document_session)
+            pdf_to_csv.generate_csv_file(input_pdf_filepath, out_csv_filepath,
+                                         document_session=document_session)
+    """
+    def __init__(self, pdf_filepath, page_renderer=None):
+        self.pdf_filepath = pdf_filepath
+        self.page_renderer = page_renderer or PageRenderer()
+        self.pdf_file = None
+        self.pdf_reader = None
+        self.html_index = None
+        self.document_phrases = {}
+        self.file_hash = None
+        self.page_font_runs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update({"pdf_file": None, "pdf_reader": None, "html_index": None,
+                      "document_phrases": {}, "page_font_runs": {}})
+        return state
+
+    def close(self):
+        '''Close the document and drop everything read from it
+        '''
+        if self.pdf_file:
+            self.pdf_file.close()
+        self.pdf_file = None
+        self.pdf_reader = None
+        self.html_index = None
+        self.document_phrases = {}
+        self.page_font_runs = {}
+
+    def get_pdf_reader(self):
+        '''Get the PyPDF2 reader of the document, opening it on first use
+        '''
+        if self.pdf_reader is None:
+            self.pdf_file = open(self.pdf_filepath, 'rb')
+            self.pdf_reader = PdfFileReader(self.pdf_file)
+        return self.pdf_reader
+
+    def get_file_hash(self):
+        if self.file_hash is None:
+            self.file_hash = get_file_hash(self.pdf_filepath)
+        return self.file_hash
+
+    def get_page_count(self):
+        return self.get_pdf_reader().getNumPages()
+
+    def get_page(self, page_num):
+        '''Get a PyPDF2 page by its zero based index
+        '''
+        return self.get_pdf_reader().getPage(page_num)
+
+    def get_page_rotation(self, page_num):
+        '''Get the clockwise rotation of a page in degrees
+        '''
+        page = self.get_page(page_num)
+        if '/Rotate' in page:
+            return int(page['/Rotate']) % 360
+        return 0
+
+    def get_page_size(self, page_num):
+        '''Get the width and height of a page as displayed, in points
+        '''
+        media_box = self.get_page(page_num).mediaBox
+        page_width = float(media_box.getWidth())
+        page_height = float(media_box.getHeight())
+        if self.get_page_rotation(page_num) in (90, 270):
+            return page_height, page_width
+        return page_width, page_height
+
+    def get_html_index(self):
+        '''Get the per page HTML of the document, converting it with
+        pdftohtml on first use
+        '''
+        if self.html_index is None:
+            with Workspace(prefix="pdftohtml_") as workspace:
+                html_obj = KeywordsExtractor().get_html_object(self.pdf_filepath, None,
+                                                               workspace)
+                self.html_index = PageHTMLIndex(html_obj.read())
+                html_obj.close()
+        return self.html_index
+
+    def get_phrases(self, keyword_xpath, page_num=None):
+        '''Get the text of the document HTML matching an xpath.
+
+        The whole document is parsed from the pdftohtml output stream, unless
+        its HTML was already kept for the pages or the xpath can not be
+        streamed.
+
+        Args:
+            - keyword_xpath (string): xpath selecting text nodes.
+            - page_num (int): One based number of the page to search, None
+                for the whole document.
+
+        Returns:
+            A list of the matching text, in document order.
+        '''
+        if page_num:
+            return self.get_html_index().get_page_phrases(page_num, keyword_xpath)
+        if self.html_index is None and keyword_xpath in STREAMING_XPATH_PARENT_TAGS:
+            if keyword_xpath not in self.document_phrases:
+                parent_tags = STREAMING_XPATH_PARENT_TAGS[keyword_xpath]
+                self.document_phrases[keyword_xpath] = KeywordsExtractor().get_streamed_text_nodes(self.pdf_filepath,
+                                                                                                   None,
+                                                                                                   parent_tags)
+            return self.document_phrases[keyword_xpath]
+        return self.get_html_index().get_document_phrases(keyword_xpath)
+
+    def get_page_font_runs(self, page_num):
+        '''Get the text shown on a page, grouped into runs of text shown on
+        the same line in the same font.
+
+        Text is decoded through the /ToUnicode CMap or the encoding of its
+        font, see `PDFFont`.
+
+        Args:
+            page_num (int): Zero based index of the page.
+
+        Returns:
+            A list of dicts with the `font` name, its `size`, whether it
+            `is_bold` or `is_italic`, the `text` of every run and whether
+            `is_decoded` all of it through the font, in content stream order.
+        '''
+        if page_num not in self.page_font_runs:
+            page = self.get_page(page_num)
+            fonts = {}
+            try:
+                page_fonts = page['/Resources'].getObject()['/Font'].getObject()
+                for font_key in page_fonts:
+                    fonts[font_key] = PDFFont(page_fonts[font_key].getObject(), font_key)
+            except (KeyError, AttributeError):
+                pass
+            font_runs = []
+            contents = page.getContents()
+            if contents is not None:
+                font_runs = self.read_font_runs(ContentStream(contents, page.pdf).operations,
+                                                fonts)
+            self.page_font_runs[page_num] = font_runs
+        return self.page_font_runs[page_num]
+
+    def read_font_runs(self, operations, fonts):
+        '''Group the text shown by content stream operations into font runs.
+
+        The text and transformation matrices are tracked to place every shown
+        string on the page. A string continues the last run if it is shown in
+        the same font on the same baseline, starting within `MAX_RUN_GAP` ems
+        of the end of the run, and is separated from it with a space if the
+        gap is wider than `MIN_SPACE_GAP` ems. Strings shown in fonts without
+        glyph widths are measured with an average width, which may be off by
+        `UNKNOWN_WIDTH_SLACK` of the advance, and strings placed after them
+        with a positioning operator are taken as new words.
+        '''
+        font_runs = []
+        current_run = None
+        run_line = None
+        matrix = IDENTITY_MATRIX
+        state_stack = []
+        text_matrix = text_line_matrix = IDENTITY_MATRIX
+        text_state = {"font": None, "font_name": None, "font_size": 0.0, "char_spacing": 0.0,
+                      "word_spacing": 0.0, "horizontal_scaling": 1.0, "leading": 0.0}
+        is_positioned = True
+        for operands, operator in operations:
+            if operator == "q":
+                state_stack.append((matrix, dict(text_state)))
+            elif operator == "Q":
+                if state_stack:
+                    matrix, text_state = state_stack.pop()
+            elif operator == "cm":
+                matrix = multiply_matrices(tuple(float(value) for value in operands), matrix)
+            elif operator == "Tf":
+                text_state["font"] = fonts.get(operands[0])
+                text_state["font_name"] = text_state["font"].name if text_state["font"] else str(operands[0])
+                text_state["font_size"] = float(operands[1])
+            elif operator == "Tc":
+                text_state["char_spacing"] = float(operands[0])
+            elif operator == "Tw":
+                text_state["word_spacing"] = float(operands[0])
+            elif operator == "Tz":
+                text_state["horizontal_scaling"] = float(operands[0])/100
+            elif operator == "TL":
+                text_state["leading"] = float(operands[0])
+            elif operator == "BT":
+                text_matrix = text_line_matrix = IDENTITY_MATRIX
+                is_positioned = True
+            elif operator == "Tm":
+                text_matrix = text_line_matrix = tuple(float(value) for value in operands)
+                is_positioned = True
+            elif operator in ("Td", "TD"):
+                if operator == "TD":
+                    text_state["leading"] = -float(operands[1])
+                text_matrix = text_line_matrix = multiply_matrices((1.0, 0.0, 0.0, 1.0, float(operands[0]),
+                                                                    float(operands[1])),
+                                                                   text_line_matrix)
+                is_positioned = True
+            if operator == '"':
+                text_state["word_spacing"] = float(operands[0])
+                text_state["char_spacing"] = float(operands[1])
+            if operator in ("T*", "'", '"'):
+                text_matrix = text_line_matrix = multiply_matrices((1.0, 0.0, 0.0, 1.0, 0.0,
+                                                                    -text_state["leading"]),
+                                                                   text_line_matrix)
+                is_positioned = True
+            if operator in ("'", '"', "Tj"):
+                string_elements = [operands[-1]]
+            elif operator == "TJ":
+                string_elements = operands[0]
+            else:
+                continue
+            text, is_decoded, advance = self.read_text_elements(string_elements, text_state)
+            string_line = self.get_string_line(multiply_matrices(text_matrix, matrix),
+                                               text_state["font_size"], advance)
+            text_matrix = multiply_matrices((1.0, 0.0, 0.0, 1.0, advance, 0.0), text_matrix)
+            font = text_state["font"]
+            run_font = (text_state["font_name"], text_state["font_size"],
+                        bool(font) and font.is_bold, bool(font) and font.is_italic)
+            gap = None
+            if current_run is not None and run_font == run_line["font"]:
+                gap = self.get_line_gap(run_line, string_line)
+            if gap is None:
+                current_run = {"font": run_font[0], "size": run_font[1],
+                               "is_bold": run_font[2], "is_italic": run_font[3],
+                               "is_decoded": True,
+                               "text": u""}
+                font_runs.append(current_run)
+            elif (gap > MIN_SPACE_GAP*string_line["em"] or
+                  (is_positioned and not (font and font.has_widths))):
+                if current_run["text"][-1:].strip() and text[:1].strip():
+                    current_run["text"] += u" "
+            current_run["text"] += text
+            current_run["is_decoded"] = current_run["is_decoded"] and is_decoded
+            run_line = dict(string_line, font=run_font, slack=0.0)
+            if not (font and font.has_widths):
+                run_line["slack"] = abs(string_line["end"] - string_line["start"])*UNKNOWN_WIDTH_SLACK
+            is_positioned = False
+        return font_runs
+
+    def read_text_elements(self, string_elements, text_state):
+        '''Decode the strings of a text showing operator and measure them.
+
+        Returns:
+            A tuple of the unicode text, whether all of it was decoded through
+            the font and the horizontal advance in text space units.
+        '''
+        font = text_state["font"]
+        font_size = text_state["font_size"]
+        text = u""
+        is_decoded = True
+        advance = 0.0
+        for element in string_elements:
+            if isinstance(element, basestring):
+                element_text, is_element_decoded = decode_pdf_string(element, font)
+                text += element_text
+                is_decoded = is_decoded and is_element_decoded
+                if font:
+                    element_advance = font.get_advance(element, font_size, text_state["char_spacing"],
+                                                       text_state["word_spacing"])
+                else:
+                    element_advance = len(get_string_bytes(element))*font_size/2
+                advance += element_advance*text_state["horizontal_scaling"]
+            else:
+                if float(element) < -TJ_SPACE_OFFSET:
+                    text += u" "
+                advance -= float(element)/1000*font_size*text_state["horizontal_scaling"]
+        return text, is_decoded, advance
+
+    def get_string_line(self, render_matrix, font_size, advance):
+        '''Place a shown string on its line.
+
+        Args:
+            - render_matrix (tuple): Text matrix multiplied with the current
+                transformation matrix.
+            - font_size (float): Font size set with `Tf`.
+            - advance (float): Advance of the string in text space units.
+
+        Returns:
+            A dict with the unit `direction` of the text, the offset of its
+            `baseline`, its `start` and `end` along the baseline and the
+            size of an `em`, in user space units.
+        '''
+        a, b, c, d, e, f = render_matrix
+        scale = (a*a + b*b) ** 0.5 or 1.0
+        direction = (a/scale, b/scale)
+        x, y = transform_point(render_matrix, 0.0, 0.0)
+        start = x*direction[0] + y*direction[1]
+        return {"direction": direction,
+                "baseline": y*direction[0] - x*direction[1],
+                "start": start,
+                "end": start + advance*scale,
+                "em": abs(font_size)*((c*c + d*d) ** 0.5 or scale)}
+
+    def get_line_gap(self, run_line, string_line):
+        '''Get the gap between the end of a run and a string continuing it.
+
+        Returns:
+            The gap in user space units, None if the string is not on the
+            baseline of the run or too far from its end.
+        '''
+        em = max(run_line["em"], string_line["em"])
+        direction_cosine = (run_line["direction"][0]*string_line["direction"][0] +
+                            run_line["direction"][1]*string_line["direction"][1])
+        if direction_cosine < MIN_DIRECTION_COSINE:
+            return None
+        if abs(run_line["baseline"] - string_line["baseline"]) > BASELINE_TOLERANCE*em:
+            return None
+        gap = string_line["start"] - run_line["end"]
+        if abs(gap) > MAX_RUN_GAP*em + run_line["slack"]:
+            return None
+        return gap
+
+    def get_page_emphasized_phrases(self, page_num):
+        '''Get the text of the bold and italic runs of a page, the text
+        pdftohtml tags with <b> and <i>, read from the page content so that it
+        does not depend on the orientation of the page.
+
+        Args:
+            page_num (int): Zero based index of the page.
+
+        Returns:
+            A list of the text of the runs in content stream order, None if
+            the text of any of them can not be decoded through its font.
+        '''
+        emphasized_runs = [font_run for font_run in self.get_page_font_runs(page_num)
+                           if font_run["is_bold"] or font_run["is_italic"]]
+        if not all(font_run["is_decoded"] for font_run in emphasized_runs):
+            return None
+        return [font_run["text"] for font_run in emphasized_runs]
+
+    def iter_page_images(self, first_page, last_page):
+        '''Render a range of pages with the session's renderer.
+
+        Yields:
+            Tuples of page number and page image, in page order.
+        '''
+        return self.page_renderer.iter_page_images(self.pdf_filepath, first_page,
+                                                   last_page)
+
+    def get_page_image(self, page_num):
+        return self.page_renderer.get_page_image(self.pdf_filepath, page_num)
@@ -1,91 +1,488 @@
 'Class for extracting keywords for PDF Documents in a directory'
 
+import argparse
 import csv
 import glob,os
+import json
 import logging
 from logging.config import fileConfig
 from lxml import etree
+import multiprocessing
 import re
+import subprocess
+import tempfile
 import time
+from parsers.page_cache import get_file_hash
+from parsers.workspace import Workspace
 
 DOC_DIR = "union_budgets/2015-16/Expenditure Budget/Volume II/"
 OUT_FILE = "union_budgets/2015-16/expenditure_budget_keywords_map.csv"
 OUT_CSV_HEADER = ["Department", "Keywords"]
-TEMP_INDEX_FILE = "/tmp/page.html"
-TEMP_HTML_FILE = "/tmp/pages.html"
-LOG_FILE = "/tmp/log"
+MANIFEST_FILE_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+TEMP_INDEX_FILE = "page.html"
+LOG_FILE = "log"
 SKIP_WORDS = ["total", "b. investment in public enterprises", "c. plan outlay", "other programmes", "grand total", "central plan", "state plan", "union territory plans", "union territory plans (with legislature)"]
 DEFAULT_KEYWORD_XPATH = "//b/text()|//i/text()"  
+PAGE_ANCHOR_REGEX = re.compile(r'<a name="?([0-9]+)"?></a>', re.IGNORECASE)
+CHARSET_REGEX = re.compile(r'charset=["\']?([A-Za-z0-9_-]+)', re.IGNORECASE)
+HTML_STREAM_CHUNK_SIZE = 64 * 1024
+OUTLINE_ANCHOR_NAME = "outline"
+# Parent tags of the text nodes selected by the xpaths that can be streamed,
+# None selects all text nodes
+STREAMING_XPATH_PARENT_TAGS = {DEFAULT_KEYWORD_XPATH: ("b", "i"), "//text()": None}
+SKIP_PHRASE_PATTERN = r'^no. [0-9]+/|^no. [0-9]+|^total-|^total -'
+KEYWORD_CHARS_REGEX = re.compile(r'[A-Za-z]{2,}')
+MULTIPLE_SPACES_REGEX = re.compile(r'\s{2,}')
+TRAILING_CHAR_REGEX = re.compile(r'[^a-zA-Z\d\)]$')
+TRAILING_ETC_REGEX = re.compile(r', ETC.$|, etc.$')
+LEADING_OTHER_REGEX = re.compile(r'^other ')
 fileConfig('parsers/logging_config.ini')
 logger = logging.getLogger()
 
+
+def extract_document_keywords_worker(keywords_task):
+    '''Process pool entry point for extracting the bold keywords of a document.
+
+    Args:
+        keywords_task (tuple): (keywords_extractor_obj, file_name)
+
+    Returns:
+        A tuple with the file name, the keywords of the document as written
+        to the CSV map and the error message, None if extraction succeeded.
+    '''
+    keywords_extractor_obj, file_name = keywords_task
+    try:
+        keywords_extractor_obj.department_name = os.path.basename(file_name).lower().split(".pdf")[0].decode('utf-8')
+        return file_name, str(keywords_extractor_obj.get_bold_text_phrases(file_name)), None
+    except Exception, error_message:
+        # repr keeps non-ASCII messages from failing the task itself
+        return file_name, None, repr(error_message)
+
+
+def get_department_name(file_name):
+    '''Get the department name written to the CSV map from a file name
+    '''
+    return os.path.basename(file_name).split(".pdf")[0].decode('utf-8')
+
+
+def get_manifest_key(file_name):
+    return os.path.basename(file_name).decode('utf-8')
+
+
+class PageHTMLIndex(object):
+    """
+    Per page HTML of a document converted with a single pdftohtml call.
+
+    pdftohtml marks the start of every page with an `<a name=N></a>` anchor,
+    the document is split at these anchors and every page is parsed along
+    with the document head, the same HTML a `pdftohtml -f N -l N` call gives.
+    Phrases are extracted once per page and xpath, and served from memory
+    afterwards.
+    """
+    def __init__(self, html):
+        self.html = html
+        html_parts = PAGE_ANCHOR_REGEX.split(html)
+        self.document_head = html_parts[0]
+        self.page_html = {}
+        for part_index in range(1, len(html_parts), 2):
+            self.page_html[int(html_parts[part_index])] = html_parts[part_index+1]
+        self.page_phrases = {}
+
+    def get_page_phrases(self, page_num, keyword_xpath):
+        '''Get the text matching an xpath on a page, in document order
+        '''
+        if (page_num, keyword_xpath) not in self.page_phrases:
+            dom_tree = etree.HTML(self.document_head + self.page_html.get(page_num, ""))
+            self.page_phrases[(page_num, keyword_xpath)] = dom_tree.xpath(keyword_xpath,
+                                                                          smart_strings=False)
+        return self.page_phrases[(page_num, keyword_xpath)]
+
+    def get_document_phrases(self, keyword_xpath):
+        '''Get the text matching an xpath in the whole document, in document
+        order
+        '''
+        if (None, keyword_xpath) not in self.page_phrases:
+            dom_tree = etree.HTML(self.html)
+            self.page_phrases[(None, keyword_xpath)] = dom_tree.xpath(keyword_xpath)
+        return self.page_phrases[(None, keyword_xpath)]
+
+
+class KeywordIndex(object):
+    """
+    Keywords of a document in the order they were found, with constant time
+    membership checks.
+
+    Indexing, slicing and `str` behave like the list of keywords, so the
+    index can stand in for the lists generators used before. `matches`
+    normalises the text of a table cell the way keywords are normalised.
+    """
+    def __init__(self, keywords=()):
+        self.keywords = []
+        self.keyword_set = set()
+        for keyword in keywords:
+            self.add(keyword)
+
+    def add(self, keyword):
+        '''Add a keyword if it is not already in the index
+        '''
+        if keyword not in self.keyword_set:
+            self.keyword_set.add(keyword)
+            self.keywords.append(keyword)
+
+    def matches(self, text):
+        '''Check if text, lower cased and with runs of whitespace collapsed,
+        is a keyword
+        '''
+        return MULTIPLE_SPACES_REGEX.sub(' ', text.lower()) in self.keyword_set
+
+    def __contains__(self, keyword):
+        return keyword in self.keyword_set
+
+    def __iter__(self):
+        return iter(self.keywords)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __getitem__(self, index):
+        return self.keywords[index]
+
+    def __str__(self):
+        return str(self.keywords)
+
+    def __repr__(self):
+        return repr(self.keywords)
+
+
+class TextNodeCollector(object):
+    """
+    lxml parser target collecting text nodes in document order.
+
+    The parser hands over start, end and character data events instead of
+    building a tree, so no element is kept once it has been parsed. Text
+    nodes are matched by their parent tag, which covers the `//text()` and
+    `//b/text()|//i/text()` xpaths. The document outline pdftohtml appends
+    in single file mode is not part of the pages and ends the collection.
+    """
+    def __init__(self, parent_tags):
+        self.parent_tags = parent_tags
+        self.open_tags = []
+        self.text_buffer = []
+        self.text_nodes = []
+        self.finished = False
+
+    def start(self, tag, attrib):
+        self.flush_text()
+        if tag == "a" and attrib.get("name") == OUTLINE_ANCHOR_NAME:
+            self.finished = True
+        self.open_tags.append(tag)
+
+    def end(self, tag):
+        self.flush_text()
+        if self.open_tags:
+            self.open_tags.pop()
+
+    def data(self, data):
+        if not self.finished:
+            self.text_buffer.append(data)
+
+    def comment(self, text):
+        self.flush_text()
+
+    def close(self):
+        self.flush_text()
+        return self.text_nodes
+
+    def flush_text(self):
+        if not self.text_buffer:
+            return
+        if self.parent_tags is None or (self.open_tags and self.open_tags[-1] in self.parent_tags):
+            self.text_nodes.append("".join(self.text_buffer))
+        self.text_buffer = []
+
+
 class KeywordsExtractor(object):
-    def __init__(self):
+    """
+    Extract bold, italic or any text phrases of PDF documents.
+
+    With `index_pages` a document is converted once and the phrases of single
+    pages are served from an in memory index, instead of running pdftohtml
+    for every page. With `stream_html` the output of pdftohtml is parsed
+    while it is produced, without a temp file or a DOM of the document.
+    """
+    def __init__(self, index_pages=False, stream_html=False):
         self.skip_words = SKIP_WORDS
         self.department_name = ""
+        self.skip_phrase_matchers = {}
+        self.index_pages = index_pages
+        self.stream_html = stream_html
+        self.page_indices = {}
+
+    def extract_bold_keywords(self, input_dir=DOC_DIR, output_filepath=OUT_FILE,
+                              workers=1, force=False):
+        '''Extract Bold keywords from all PDF documents in the directory and generate a CSV mapping.
+
+        Documents are distributed over a pool of processes and their rows are
+        written as they finish. The keywords of every document are kept in a
+        manifest next to the CSV file, and documents whose size and
+        modification time, or else content hash, did not change since the
+        last run are served from it.
 
-    def extract_bold_keywords(self):
-        '''Extract Bold keywords from all PDF documents in the directory and generate a CSV mapping
+        Args:
+            - input_dir (string): Directory of the PDF documents.
+            - output_filepath (string): Path of the CSV map to write.
+            - workers (int): Number of processes extracting documents.
+            - force (boolean): Extract all documents ignoring the manifest.
         '''
-        with open(OUT_FILE, "wb") as csv_file:
-            csv_writer = csv.writer(csv_file, delimiter=',') 
+        manifest_filepath = output_filepath + MANIFEST_FILE_SUFFIX
+        manifest = {} if force else self.load_manifest(manifest_filepath)
+        updated_manifest = {}
+        manifest_entries = {}
+        pending_file_names = []
+        with open(output_filepath, "wb") as csv_file:
+            csv_writer = csv.writer(csv_file, delimiter=',')
             csv_writer.writerow(OUT_CSV_HEADER)
-            for file_name in glob.glob("%s*.pdf" % DOC_DIR):
-                try:
-                    self.department_name = os.path.basename(file_name).lower().split(".pdf")[0].decode('utf-8')
-                    bold_text_phrases = self.get_bold_text_phrases(file_name)
-                    csv_writer.writerow([os.path.basename(file_name).split(".pdf")[0].decode('utf-8'), str(bold_text_phrases)]) 
-                    logger.info("Processing PDF document for department: %s" % self.department_name)
-                except Exception, error_message:
-                    logger.error("Unable to extract keywords for department: %s, error_message: %s" % (self.department_name, error_message))
-
-    def get_bold_text_phrases(self, file_name, keyword_xpath=DEFAULT_KEYWORD_XPATH,is_other_starting_phrases=False, single_word=False, page_num=None, lower_case=True): 
+            try:
+                for file_name in sorted(glob.glob(os.path.join(input_dir, "*.pdf"))):
+                    manifest_entry = self.get_manifest_entry(file_name, manifest.get(get_manifest_key(file_name)))
+                    if "keywords" in manifest_entry:
+                        csv_writer.writerow([get_department_name(file_name), manifest_entry["keywords"]])
+                        updated_manifest[get_manifest_key(file_name)] = manifest_entry
+                    else:
+                        pending_file_names.append(file_name)
+                        manifest_entries[file_name] = manifest_entry
+                logger.info("Extracting keywords of %s documents, %s unchanged" % (len(pending_file_names),
+                                                                                 len(updated_manifest)))
+                for file_name, keywords, error_message in self.generate_document_keywords(pending_file_names, workers):
+                    department_name = get_department_name(file_name)
+                    if error_message is not None:
+                        logger.error("Unable to extract keywords for department: %s, error_message: %s" % (department_name.lower(), error_message))
+                        continue
+                    csv_writer.writerow([department_name, keywords])
+                    csv_file.flush()
+                    manifest_entries[file_name]["keywords"] = keywords
+                    updated_manifest[get_manifest_key(file_name)] = manifest_entries[file_name]
+                    logger.info("Processing PDF document for department: %s" % department_name.lower())
+            finally:
+                self.write_manifest(manifest_filepath, updated_manifest)
+
+    def generate_document_keywords(self, file_names, workers):
+        '''Extract keywords of documents, in a pool of processes if more than
+        one worker is requested.
+
+        Yields:
+            (file_name, keywords, error_message) tuples in the order the
+            documents finish.
+        '''
+        keywords_tasks = [(self, file_name) for file_name in file_names]
+        if workers <= 1 or len(keywords_tasks) <= 1:
+            for keywords_task in keywords_tasks:
+                yield extract_document_keywords_worker(keywords_task)
+            return
+        pool = multiprocessing.Pool(min(workers, len(keywords_tasks)))
+        try:
+            for document_keywords in pool.imap_unordered(extract_document_keywords_worker,
+                                                         keywords_tasks):
+                yield document_keywords
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def get_manifest_entry(self, file_name, manifest_entry):
+        '''Get the manifest entry of a document, with its keywords only if
+        the document did not change since they were extracted.
+
+        The content hash is computed only if the size or modification time of
+        the document changed.
+        '''
+        file_stat = os.stat(file_name)
+        if (manifest_entry and manifest_entry["size"] == file_stat.st_size and
+                manifest_entry["mtime"] == file_stat.st_mtime):
+            return manifest_entry
+        file_hash = get_file_hash(file_name)
+        updated_entry = {"size": file_stat.st_size, "mtime": file_stat.st_mtime,
+                         "sha1": file_hash}
+        if manifest_entry and manifest_entry["sha1"] == file_hash:
+            updated_entry["keywords"] = manifest_entry["keywords"]
+        return updated_entry
+
+    def load_manifest(self, manifest_filepath):
+        '''Load the document entries of a manifest, an empty dict if the
+        manifest is missing, unreadable or of an older version
+        '''
+        try:
+            with open(manifest_filepath, "rb") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (IOError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest.get("documents", {})
+
+    def write_manifest(self, manifest_filepath, documents):
+        manifest_dir = os.path.dirname(os.path.abspath(manifest_filepath))
+        temp_file_descriptor, temp_file = tempfile.mkstemp(dir=manifest_dir)
+        with os.fdopen(temp_file_descriptor, "wb") as temp_file_obj:
+            json.dump({"version": MANIFEST_VERSION, "documents": documents}, temp_file_obj,
+                      indent=1, sort_keys=True)
+        os.rename(temp_file, manifest_filepath)
+
+    def get_bold_text_phrases(self, file_name, keyword_xpath=DEFAULT_KEYWORD_XPATH,is_other_starting_phrases=False, single_word=False, page_num=None, lower_case=True, document_session=None): 
         '''Extract bold text phrases from input HTML object 
+
+        With a `PDFDocumentSession` of the document the phrases are taken from
+        its HTML, which is converted once for all callers of the session.
+        '''
+        if document_session:
+            phrases = document_session.get_phrases(keyword_xpath, page_num)
+        elif page_num and self.index_pages:
+            phrases = self.get_page_index(file_name).get_page_phrases(page_num, keyword_xpath)
+        elif self.stream_html and keyword_xpath in STREAMING_XPATH_PARENT_TAGS:
+            phrases = self.get_streamed_text_nodes(file_name, page_num,
+                                                   STREAMING_XPATH_PARENT_TAGS[keyword_xpath])
+        else:
+            with Workspace(prefix="pdftohtml_") as workspace:
+                html_obj = self.get_html_object(file_name, page_num, workspace)
+                dom_tree = etree.HTML(html_obj.read())
+                html_obj.close()
+            phrases = dom_tree.xpath(keyword_xpath)
+        return self.get_keywords(phrases, is_other_starting_phrases, single_word, lower_case)
+
+    def get_keywords(self, phrases, is_other_starting_phrases=False, single_word=False, lower_case=True):
+        '''Clean phrases and collect the ones that are keywords.
+
+        Args:
+            - phrases (list): Text extracted from a document.
+            - is_other_starting_phrases (boolean): Keep phrases starting with
+                skip words.
+            - single_word (boolean): Keep single word phrases.
+            - lower_case (boolean): Lower case the phrases.
+
+        Returns:
+            A `KeywordIndex` of the keywords, in document order.
         '''
-        html_obj = self.get_html_object(file_name, page_num)
-        dom_tree = etree.HTML(html_obj.read())
-        bold_text_phrases = []
-        previous_keyword = None
-        for phrase in dom_tree.xpath(keyword_xpath):
+        bold_text_phrases = KeywordIndex()
+        skip_phrase_matcher = self.get_skip_phrase_matcher(is_other_starting_phrases)
+        for phrase in phrases:
             phrase = self.clean_extracted_phrase(phrase, is_other_starting_phrases, lower_case)
-            if re.search(r'^no. [0-9]+/|^no. [0-9]+|^total-|^total -', phrase) or phrase == self.department_name.encode('utf-8'):
-                continue
-            if phrase in self.skip_words and not is_other_starting_phrases:
+            if skip_phrase_matcher.search(phrase):
                 continue
-            if re.search(r'[A-Za-z]{2,}', phrase):
+            if KEYWORD_CHARS_REGEX.search(phrase):
                 if not phrase in bold_text_phrases:
                     if not single_word and not len(phrase.split(" ")) > 1:
                         continue
-                    bold_text_phrases.append(phrase.strip())
+                    bold_text_phrases.add(phrase.strip())
         return bold_text_phrases
 
+    def get_skip_phrase_matcher(self, is_other_starting_phrases):
+        '''Compile the serial number and total prefixes, the department name
+        and, unless other starting phrases are kept, the skip words into a
+        single regex
+        '''
+        matcher_key = (self.department_name, tuple(self.skip_words), is_other_starting_phrases)
+        if matcher_key not in self.skip_phrase_matchers:
+            exact_phrases = [self.department_name.encode('utf-8')]
+            if not is_other_starting_phrases:
+                exact_phrases += self.skip_words
+            self.skip_phrase_matchers[matcher_key] = re.compile(
+                r'%s|^(?:%s)\Z' % (SKIP_PHRASE_PATTERN,
+                                   "|".join(re.escape(phrase) for phrase in exact_phrases)))
+        return self.skip_phrase_matchers[matcher_key]
+
     def clean_extracted_phrase(self, phrase, is_other_starting_phrases, lower_case):
         '''Cleanse phrase text to remove unwanted characters and words
         '''
         if lower_case:
             phrase = phrase.lower()
         phrase = phrase.encode('utf-8').replace('\xa0', ' ').replace('\xc2', '').strip()
-        phrase = re.sub(r'\s{2,}', ' ', phrase)
+        phrase = MULTIPLE_SPACES_REGEX.sub(' ', phrase)
         if not is_other_starting_phrases:
-            phrase = re.sub(r'[^a-zA-Z\d\)]$', '', phrase)
-            phrase = re.sub(r', ETC.$|, etc.$', '', phrase)
-            phrase = re.sub(r'^other ', '', phrase).strip()
+            phrase = TRAILING_CHAR_REGEX.sub('', phrase)
+            phrase = TRAILING_ETC_REGEX.sub('', phrase)
+            phrase = LEADING_OTHER_REGEX.sub('', phrase).strip()
         return phrase
 
-    def get_html_object(self, file_name, page_num):
+    def get_streamed_text_nodes(self, file_name, page_num, parent_tags):
+        '''Collect text nodes from the HTML pdftohtml writes to its stdout.
+
+        Args:
+            - file_name (string): Path of the pdf.
+            - page_num (int): Page to convert, None for the whole document.
+            - parent_tags (tuple): Tags whose text nodes are collected, None
+                for all text nodes.
+
+        Returns:
+            A list of text nodes in document order.
+        '''
+        command = ["pdftohtml", "-stdout", "-noframes", "-i", "-q"]
+        if page_num:
+            command += ["-f", str(page_num), "-l", str(page_num)]
+        command.append(file_name)
+        with open(os.devnull, "wb") as log_file:
+            html_process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                            stderr=log_file)
+            try:
+                html_chunk = html_process.stdout.read(HTML_STREAM_CHUNK_SIZE)
+                if not html_chunk:
+                    raise IOError("No HTML output from pdftohtml for %s" % file_name)
+                charset_match = CHARSET_REGEX.search(html_chunk)
+                text_node_collector = TextNodeCollector(parent_tags)
+                html_parser = etree.HTMLParser(target=text_node_collector,
+                                               encoding=charset_match.group(1) if charset_match else None)
+                while html_chunk and not text_node_collector.finished:
+                    html_parser.feed(html_chunk)
+                    html_chunk = html_process.stdout.read(HTML_STREAM_CHUNK_SIZE)
+                return html_parser.close()
+            finally:
+                html_process.stdout.close()
+                html_process.wait()
+
+    def get_page_index(self, file_name):
+        '''Get the page index of a document, converting it on first use.
+
+        Indices are kept per path, size and modification time, so that a
+        changed document is converted again.
+        '''
+        file_stat = os.stat(file_name)
+        index_key = (os.path.abspath(file_name), file_stat.st_size, file_stat.st_mtime)
+        if index_key not in self.page_indices:
+            with Workspace(prefix="pdftohtml_") as workspace:
+                html_obj = self.get_html_object(file_name, None, workspace)
+                self.page_indices[index_key] = PageHTMLIndex(html_obj.read())
+                html_obj.close()
+        return self.page_indices[index_key]
+
+    def clear_page_indices(self):
+        '''Drop the page indices of all documents
+        '''
+        self.page_indices = {}
+
+    def get_html_object(self, file_name, page_num, workspace):
         '''Convert PDF file into HTML file using pdftohtml(http://sourceforge.net/projects/pdftohtml/)
+
+        The HTML files are written to the given workspace.
         '''
         file_stub = re.sub(r'\s', '_', os.path.basename(file_name).split(".pdf")[0].lower().strip())
-        index_file = TEMP_INDEX_FILE.replace(".html", "_%s.html" % file_stub) 
-        html_file = TEMP_INDEX_FILE.replace(".html", "_%ss.html" % file_stub) 
+        index_file = workspace.get_path(TEMP_INDEX_FILE.replace(".html", "_%s.html" % file_stub))
+        html_file = workspace.get_path(TEMP_INDEX_FILE.replace(".html", "_%ss.html" % file_stub))
+        log_file = workspace.get_path(LOG_FILE)
         if page_num:
-            command = "pdftohtml -f '%s' -l '%s' '%s' '%s' > %s" % (page_num, page_num, file_name, index_file, LOG_FILE)
+            command = "pdftohtml -f '%s' -l '%s' '%s' '%s' > '%s'" % (page_num, page_num, file_name, index_file, log_file)
         else:
-            command = "pdftohtml '%s' '%s' > %s" % (file_name, index_file, LOG_FILE)
+            command = "pdftohtml '%s' '%s' > '%s'" % (file_name, index_file, log_file)
         os.system(command)
         html_obj = open(html_file, "rb")
         return html_obj
 
 if __name__ == '__main__':
-    obj = KeywordsExtractor()
-    obj.extract_bold_keywords()
+    parser = argparse.ArgumentParser(description="Generates a CSV map of the bold keywords of PDF documents in a directory")
+    parser.add_argument("input_dir", nargs="?", default=DOC_DIR, help="Directory of the PDF documents")
+    parser.add_argument("output_file", nargs="?", default=OUT_FILE, help="Output CSV filepath")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes extracting documents in parallel")
+    parser.add_argument("--stream", action="store_true", help="Parse pdftohtml output while it is produced instead of through a temp file")
+    parser.add_argument("--force", action="store_true", help="Extract all documents, including the ones unchanged since the last run")
+    args = parser.parse_args()
+    obj = KeywordsExtractor(stream_html=args.stream)
+    obj.extract_bold_keywords(args.input_dir, args.output_file, workers=args.workers, force=args.force)
@@ -0,0 +1,148 @@
+'Class for caching table extraction results of PDF pages on disk'
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger()
+CACHE_FILE_EXTENSION = ".json"
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_SIZE_MB = 1024
+DEFAULT_CACHE_DIR = "~/.cache/parsers/pages"
+
+
+def get_file_hash(filepath):
+    '''Get the SHA1 hex digest of a file's content
+    '''
+    file_hash = hashlib.sha1()
+    with open(filepath, 'rb') as file_obj:
+        for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class PageResultCache(object):
+    """
+    On disk cache of per page extraction results.
+
+    Entries are keyed by the content hash of the pdf, the page number and the
+    detection parameters, so that changes to the post processing of tables do
+    not need pages to be rendered and sent through tabula again. Every hit
+    refreshes the modification time of the entry, and the least recently used
+    entries are evicted once the cache grows over its size limit.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_size = max_size_mb * 1024 * 1024
+        self.total_size = None
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def get_page_key(self, pdf_hash, page_num, detection_params):
+        '''Get the cache key of a page.
+
+        Args:
+            - pdf_hash (string): Content hash of the pdf.
+            - page_num (int): Zero based page number.
+            - detection_params (dict): Parameters which affect the table data
+                extracted from the page.
+
+        Returns:
+            A hex digest string identifying the page result.
+        '''
+        key_data = json.dumps([pdf_hash, page_num, detection_params],
+                              sort_keys=True)
+        return hashlib.sha1(key_data).hexdigest()
+
+    def get(self, page_key):
+        '''Get a cached page result.
+
+        Returns:
+            A dict with the `table_data` and `table_request` of the page, None
+            if the page is not cached.
+        '''
+        cache_file = self.get_cache_file(page_key)
+        try:
+            with open(cache_file, 'rb') as cache_file_obj:
+                page_result = json.load(cache_file_obj)
+            os.utime(cache_file, None)
+        except (IOError, OSError, ValueError):
+            return None
+        page_result["table_data"] = page_result["table_data"].encode('latin-1')
+        return page_result
+
+    def set(self, page_key, table_data, table_request):
+        '''Store the result of a page and evict old entries if required.
+
+        Args:
+            - page_key (string): Key from `get_page_key`.
+            - table_data (string): Raw tabula CSV of the page.
+            - table_request (dict): Detected table bounds and columns sent to
+                tabula, None if no table was found.
+        '''
+        # latin-1 maps every byte to a code point, so any tabula output
+        # survives the JSON round trip unchanged
+        page_result = {"table_data": table_data.decode('latin-1'),
+                       "table_request": table_request}
+        temp_file_descriptor, temp_file = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(temp_file_descriptor, 'wb') as temp_file_obj:
+            json.dump(page_result, temp_file_obj)
+        os.rename(temp_file, self.get_cache_file(page_key))
+        if self.total_size is None:
+            self.total_size = self.get_total_size()
+        else:
+            self.total_size += os.path.getsize(self.get_cache_file(page_key))
+        if self.total_size > self.max_size:
+            self.evict()
+
+    def get_cache_file(self, page_key):
+        return os.path.join(self.cache_dir, page_key + CACHE_FILE_EXTENSION)
+
+    def get_cache_files(self):
+        return glob.glob(os.path.join(self.cache_dir, "*" + CACHE_FILE_EXTENSION))
+
+    def get_total_size(self):
+        return sum(os.path.getsize(cache_file) for cache_file in self.get_cache_files())
+
+    def evict(self):
+        '''Delete least recently used entries until the cache fits its limit
+        '''
+        cache_entries = []
+        for cache_file in self.get_cache_files():
+            try:
+                file_stat = os.stat(cache_file)
+            except OSError:
+                continue
+            cache_entries.append((file_stat.st_mtime, file_stat.st_size, cache_file))
+        cache_entries.sort()
+        self.total_size = sum(entry[1] for entry in cache_entries)
+        for mtime, size, cache_file in cache_entries:
+            if self.total_size <= self.max_size:
+                break
+            try:
+                os.remove(cache_file)
+            except OSError:
+                continue
+            self.total_size -= size
+
+    def clear(self):
+        '''Invalidate the cache by deleting all entries
+        '''
+        for cache_file in self.get_cache_files():
+            os.remove(cache_file)
+        self.total_size = 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manages the page result cache of PDF to CSV conversions")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="Cache directory")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached page results")
+    args = parser.parse_args()
+    page_cache = PageResultCache(args.cache_dir)
+    if args.clear:
+        page_cache.clear()
+    else:
+        print("%s entries, %s bytes" % (len(page_cache.get_cache_files()), page_cache.get_total_size()))
@@ -0,0 +1,156 @@
+'Class for rendering PDF pages into images'
+
+import cv2
+import logging
+import numpy
+import subprocess
+
+logger = logging.getLogger()
+DEFAULT_DENSITY = 300
+DEFAULT_CHUNK_SIZE = 10
+PNM_COLOR_MAGIC = "P6"
+PNM_GRAYSCALE_MAGIC = "P5"
+
+
+def read_pnm_header_token(stream):
+    '''Read the next whitespace separated token of a PNM header.
+
+    Returns:
+        The token string, empty if the stream has ended.
+    '''
+    token = ""
+    while True:
+        char = stream.read(1)
+        if not char:
+            return token
+        if char == "#":
+            stream.readline()
+        elif char.isspace():
+            if token:
+                return token
+        else:
+            token += char
+
+
+def read_pnm_image(stream):
+    '''Read the next 8 bit PPM(color) or PGM(grayscale) image from a stream.
+
+    Returns:
+        The image as a numpy array in the channel order of `cv2.imread`, None
+        if the stream has ended.
+    '''
+    magic = read_pnm_header_token(stream)
+    if not magic:
+        return None
+    if magic not in (PNM_COLOR_MAGIC, PNM_GRAYSCALE_MAGIC):
+        raise ValueError("Unexpected image format in render output: %s" % magic)
+    width = int(read_pnm_header_token(stream))
+    height = int(read_pnm_header_token(stream))
+    read_pnm_header_token(stream)
+    if magic == PNM_COLOR_MAGIC:
+        image_shape = (height, width, 3)
+    else:
+        image_shape = (height, width)
+    image_data = stream.read(numpy.prod(image_shape))
+    if len(image_data) != numpy.prod(image_shape):
+        return None
+    image = numpy.frombuffer(image_data, dtype=numpy.uint8).reshape(image_shape)
+    if magic == PNM_COLOR_MAGIC:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return image.copy()
+
+
+class PageRenderer(object):
+    """
+    Render a range of pdf pages with a `convert` call per chunk of pages.
+
+    Rendering every page with its own `convert` call makes ImageMagick parse
+    the whole document through Ghostscript once per page, so up to
+    `chunk_size` pages are rendered in one pass. ImageMagick keeps all pages
+    of a call in its pixel cache before writing any of them, so the chunk size
+    bounds the memory and disk it needs. The images are streamed back over a
+    pipe as raw PPM/PGM data and handed over as numpy arrays, without touching
+    the disk.
+    """
+    def __init__(self, density=DEFAULT_DENSITY, grayscale=False,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        self.density = density
+        self.grayscale = grayscale
+        self.chunk_size = max(1, chunk_size)
+
+    def iter_page_images(self, input_pdf_filepath, first_page, last_page):
+        '''Render a range of pages and yield their images in page order.
+
+        Pages are rendered `chunk_size` at a time. If rendering a chunk fails,
+        its pages from the failed one on are rendered again one at a time, so
+        that a single bad page does not lose the rest of the chunk.
+
+        Args:
+            - input_pdf_filepath (string): The path of the pdf to be rendered.
+            - first_page (int): Zero based index of the first page to render.
+            - last_page (int): Zero based index of the last page to render.
+
+        Yields:
+            Tuples of page number and page image, the image is None if the
+            page could not be rendered.
+        '''
+        for chunk_first_page in range(first_page, last_page+1, self.chunk_size):
+            chunk_last_page = min(chunk_first_page+self.chunk_size, last_page+1) - 1
+            page_num = chunk_first_page
+            chunk_images = self.render_pages(input_pdf_filepath, chunk_first_page,
+                                             chunk_last_page)
+            try:
+                for page_image in chunk_images:
+                    if page_image is None:
+                        break
+                    yield page_num, page_image
+                    page_num += 1
+            finally:
+                chunk_images.close()
+            for page_num in range(page_num, chunk_last_page+1):
+                page_image = None
+                if chunk_first_page != chunk_last_page:
+                    page_images = self.render_pages(input_pdf_filepath, page_num,
+                                                    page_num)
+                    try:
+                        page_image = next(page_images)
+                    finally:
+                        page_images.close()
+                if page_image is None:
+                    logger.warning("Unable to render page {0} of file {1}".format(page_num, input_pdf_filepath))
+                yield page_num, page_image
+
+    def render_pages(self, input_pdf_filepath, first_page, last_page):
+        '''Render a range of pages with a single `convert` call.
+
+        Yields:
+            The image of every page of the range in page order, None for the
+            page at which the output of `convert` ended and for every page
+            after it.
+        '''
+        if self.grayscale:
+            output_format = "-colorspace Gray pgm:-"
+        else:
+            output_format = "ppm:-"
+        command = "convert -density %s '%s'[%s-%s] -depth 8 %s" % (self.density,
+                                                                  input_pdf_filepath,
+                                                                  first_page,
+                                                                  last_page,
+                                                                  output_format)
+        logger.info("Rendering: %s" % command)
+        render_process = subprocess.Popen(command, shell=True,
+                                          stdout=subprocess.PIPE)
+        try:
+            for page_num in range(first_page, last_page+1):
+                yield read_pnm_image(render_process.stdout)
+        finally:
+            render_process.stdout.close()
+            render_process.wait()
+
+    def get_page_image(self, input_pdf_filepath, page_num):
+        '''Render a single page and return its image.
+        '''
+        for rendered_page_num, page_image in self.iter_page_images(input_pdf_filepath,
+                                                                   page_num,
+                                                                   page_num):
+            return page_image
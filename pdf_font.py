@@ -0,0 +1,325 @@
+'Class for decoding the text shown with the fonts of a PDF page'
+
+import binascii
+import re
+from PyPDF2.generic import TextStringObject
+
+FORCE_BOLD_FLAG = 1 << 18
+ITALIC_FLAG = 1 << 6
+NONSYMBOLIC_FLAG = 1 << 5
+SYMBOLIC_FLAG = 1 << 2
+BOLD_FONT_WEIGHT = 600
+MAX_CMAP_RANGE_SIZE = 0x10000
+# Glyph width(in thousandths of an em) assumed for fonts without widths, like
+# the standard 14 fonts
+AVERAGE_GLYPH_WIDTH = 500
+DEFAULT_CID_WIDTH = 1000
+IDENTITY_ENCODINGS = ["/Identity-H", "/Identity-V"]
+SUBSET_PREFIX_REGEX = re.compile(r'^[A-Z]{6}\+')
+BOLD_NAME_REGEX = re.compile(r'bold|black|heavy|demi|semibd|extrabd|ultrabd|[-,]bd|[-,]blk', re.IGNORECASE)
+ITALIC_NAME_REGEX = re.compile(r'italic|oblique|[-,]it$', re.IGNORECASE)
+CMAP_TOKEN_REGEX = re.compile(r'<([0-9A-Fa-f\s]*)>|(\[|\]|begin\w+|end\w+)')
+UNDECODED_CHAR_REGEX = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffd]')
+GLYPH_UNICODE_REGEX = re.compile(r'^uni([0-9A-F]{4})$|^u([0-9A-F]{4,6})$')
+SIMPLE_FONT_ENCODINGS = {"/WinAnsiEncoding": "cp1252",
+                         "/MacRomanEncoding": "mac_roman",
+                         "/StandardEncoding": "latin-1",
+                         "/PDFDocEncoding": "latin-1"}
+GLYPH_NAME_CHARS = {"space": u" ", "exclam": u"!", "quotedbl": u"\"",
+                    "numbersign": u"#", "dollar": u"$", "percent": u"%",
+                    "ampersand": u"&", "quotesingle": u"'", "quoteright": u"\u2019",
+                    "quoteleft": u"\u2018", "parenleft": u"(", "parenright": u")",
+                    "asterisk": u"*", "plus": u"+", "comma": u",", "hyphen": u"-",
+                    "minus": u"\u2212", "period": u".", "slash": u"/", "colon": u":",
+                    "semicolon": u";", "less": u"<", "equal": u"=", "greater": u">",
+                    "question": u"?", "at": u"@", "bracketleft": u"[",
+                    "backslash": u"\\", "bracketright": u"]", "underscore": u"_",
+                    "grave": u"`", "braceleft": u"{", "bar": u"|", "braceright": u"}",
+                    "endash": u"\u2013", "emdash": u"\u2014", "bullet": u"\u2022",
+                    "zero": u"0", "one": u"1", "two": u"2", "three": u"3",
+                    "four": u"4", "five": u"5", "six": u"6", "seven": u"7",
+                    "eight": u"8", "nine": u"9"}
+
+
+def get_string_bytes(pdf_string):
+    '''Get the bytes of a string operand as written in the content stream,
+    which PyPDF2 decodes as PDFDocEncoding where it can
+    '''
+    if isinstance(pdf_string, TextStringObject):
+        try:
+            return pdf_string.get_original_bytes()
+        except Exception:
+            pass
+    if isinstance(pdf_string, unicode):
+        return pdf_string.encode('latin-1', 'replace')
+    return str(pdf_string)
+
+
+def get_glyph_char(glyph_name):
+    '''Get the character of a glyph name of an encoding /Differences array.
+
+    Returns:
+        The unicode character, None for glyph names that are not known.
+    '''
+    glyph_name = glyph_name.lstrip("/")
+    if len(glyph_name) == 1 and glyph_name.isalpha():
+        return unicode(glyph_name)
+    if glyph_name in GLYPH_NAME_CHARS:
+        return GLYPH_NAME_CHARS[glyph_name]
+    glyph_unicode_match = GLYPH_UNICODE_REGEX.match(glyph_name)
+    if glyph_unicode_match:
+        return unichr(int(glyph_unicode_match.group(1) or glyph_unicode_match.group(2), 16))
+    return None
+
+
+def parse_to_unicode_cmap(cmap_data):
+    '''Parse the code space ranges and character mappings of a ToUnicode
+    CMap.
+
+    Args:
+        cmap_data (string): Decoded data of the CMap stream.
+
+    Returns:
+        A tuple with a list of (byte_count, first_code, last_code) code space
+        ranges and a dict with the unicode text of every code, by its bytes.
+    '''
+    code_ranges = []
+    code_map = {}
+    section = None
+    operands = []
+    array_operand = None
+    for token in CMAP_TOKEN_REGEX.finditer(cmap_data):
+        hex_value, keyword = token.groups()
+        if keyword:
+            if keyword.startswith("begin"):
+                section = keyword[len("begin"):]
+                operands = []
+            elif keyword.startswith("end"):
+                section = None
+            elif keyword == "[":
+                array_operand = []
+            elif keyword == "]" and array_operand is not None:
+                operands.append(array_operand)
+                array_operand = None
+        else:
+            hex_value = re.sub(r'\s', '', hex_value)
+            if len(hex_value) % 2:
+                hex_value += "0"
+            value = binascii.unhexlify(hex_value)
+            if array_operand is not None:
+                array_operand.append(value)
+                continue
+            operands.append(value)
+        if section == "codespacerange" and len(operands) == 2:
+            code_ranges.append((len(operands[0]), int(binascii.hexlify(operands[0]) or "0", 16),
+                                int(binascii.hexlify(operands[1]) or "0", 16)))
+            operands = []
+        elif section == "bfchar" and len(operands) == 2:
+            code_map[operands[0]] = operands[1].decode('utf-16-be', 'replace')
+            operands = []
+        elif section == "bfrange" and len(operands) == 3:
+            first_code, last_code, destination = operands
+            code_length = len(first_code)
+            first_value = int(binascii.hexlify(first_code) or "0", 16)
+            last_value = int(binascii.hexlify(last_code) or "0", 16)
+            range_size = min(last_value - first_value + 1, MAX_CMAP_RANGE_SIZE)
+            for code_offset in range(max(range_size, 0)):
+                code = binascii.unhexlify("%0*x" % (code_length*2, first_value + code_offset))
+                if isinstance(destination, list):
+                    if code_offset >= len(destination):
+                        break
+                    code_map[code] = destination[code_offset].decode('utf-16-be', 'replace')
+                else:
+                    destination_value = int(binascii.hexlify(destination) or "0", 16) + code_offset
+                    code_map[code] = binascii.unhexlify("%0*x" % (len(destination)*2,
+                                                                  destination_value)).decode('utf-16-be', 'replace')
+            operands = []
+    return code_ranges, code_map
+
+
+def get_dictionary_value(dictionary, key, default=None):
+    '''Get a value of a PyPDF2 dictionary with indirect objects resolved
+    '''
+    if dictionary is not None and key in dictionary:
+        return dictionary[key]
+    return default
+
+
+class PDFFont(object):
+    """
+    A font of a PDF page, for telling its weight and style and decoding the
+    strings shown with it to unicode.
+
+    Strings are decoded through the /ToUnicode CMap of the font if it has
+    one, and otherwise through the encoding of a simple font. Composite fonts
+    without a /ToUnicode CMap, like Identity-H CID fonts, symbolic fonts
+    without an encoding and glyph names that are not known can not be
+    decoded, `decode` returns None for strings shown with them. Fonts are
+    taken as bold from their name, like `Arial-BoldMT`, `Arial,Black` or
+    `Frutiger-Heavy`, and from the flags and weight of their font descriptor.
+    The advance of strings is measured with the /Widths of simple fonts and
+    the /W of composite fonts with an identity encoding, and estimated with
+    `AVERAGE_GLYPH_WIDTH` for other fonts.
+
+    Usage:
+        font = PDFFont(page['/Resources']['/Font']['/F1'])
+        text = font.decode(pdf_string)
+    """
+    def __init__(self, font_dict, font_key=None):
+        self.name = str(get_dictionary_value(font_dict, '/BaseFont', font_key))
+        self.is_composite = get_dictionary_value(font_dict, '/Subtype') == "/Type0"
+        font_descriptor = self.get_font_descriptor(font_dict)
+        flags = int(get_dictionary_value(font_descriptor, '/Flags', 0))
+        font_weight = float(get_dictionary_value(font_descriptor, '/FontWeight', 0))
+        italic_angle = float(get_dictionary_value(font_descriptor, '/ItalicAngle', 0))
+        style_name = SUBSET_PREFIX_REGEX.sub('', self.name)
+        self.is_bold = bool(BOLD_NAME_REGEX.search(style_name) or flags & FORCE_BOLD_FLAG or
+                            font_weight >= BOLD_FONT_WEIGHT)
+        self.is_italic = bool(ITALIC_NAME_REGEX.search(style_name) or flags & ITALIC_FLAG or
+                              italic_angle)
+        self.code_ranges = []
+        self.code_map = None
+        self.encoding = None
+        self.differences = {}
+        self.widths = {}
+        self.default_width = None
+        try:
+            self.set_widths(font_dict, font_descriptor)
+        except (AttributeError, IndexError, TypeError, ValueError):
+            self.widths = {}
+            self.default_width = None
+        self.has_widths = self.default_width is not None
+        to_unicode = get_dictionary_value(font_dict, '/ToUnicode')
+        if to_unicode is not None:
+            try:
+                self.code_ranges, self.code_map = parse_to_unicode_cmap(to_unicode.getData())
+            except Exception:
+                self.code_map = None
+        if self.code_map is None and not self.is_composite:
+            self.set_simple_encoding(get_dictionary_value(font_dict, '/Encoding'), flags)
+
+    def get_font_descriptor(self, font_dict):
+        '''Get the font descriptor of a font, the one of its descendant font
+        for composite fonts
+        '''
+        font_descriptor = get_dictionary_value(font_dict, '/FontDescriptor')
+        if font_descriptor is None:
+            descendant_fonts = get_dictionary_value(font_dict, '/DescendantFonts')
+            if descendant_fonts:
+                font_descriptor = get_dictionary_value(descendant_fonts[0].getObject(),
+                                                       '/FontDescriptor')
+        return font_descriptor
+
+    def set_widths(self, font_dict, font_descriptor):
+        '''Set the glyph widths of the codes of a font, in thousandths of an
+        em, and the width of codes without one
+        '''
+        if self.is_composite:
+            if str(get_dictionary_value(font_dict, '/Encoding')) not in IDENTITY_ENCODINGS:
+                return
+            descendant_font = get_dictionary_value(font_dict, '/DescendantFonts')[0].getObject()
+            self.default_width = float(get_dictionary_value(descendant_font, '/DW', DEFAULT_CID_WIDTH))
+            cid_widths = [value.getObject() for value in get_dictionary_value(descendant_font, '/W', [])]
+            while len(cid_widths) >= 2:
+                first_cid = int(cid_widths[0])
+                if isinstance(cid_widths[1], list):
+                    for cid_offset, width in enumerate(cid_widths[1]):
+                        self.widths[first_cid + cid_offset] = float(width.getObject())
+                    cid_widths = cid_widths[2:]
+                else:
+                    for cid in range(first_cid, min(int(cid_widths[1]), first_cid + MAX_CMAP_RANGE_SIZE) + 1):
+                        self.widths[cid] = float(cid_widths[2])
+                    cid_widths = cid_widths[3:]
+        elif get_dictionary_value(font_dict, '/Widths') is not None:
+            first_char = int(get_dictionary_value(font_dict, '/FirstChar', 0))
+            for code_offset, width in enumerate(get_dictionary_value(font_dict, '/Widths')):
+                self.widths[first_char + code_offset] = float(width.getObject())
+            self.default_width = float(get_dictionary_value(font_descriptor, '/MissingWidth', 0))
+
+    def set_simple_encoding(self, encoding, flags):
+        '''Set the codec and /Differences glyphs strings of a simple font are
+        decoded with, none for symbolic fonts without an encoding
+        '''
+        base_encoding = encoding
+        if encoding is not None and not isinstance(encoding, basestring):
+            base_encoding = get_dictionary_value(encoding, '/BaseEncoding')
+            code = 0
+            for difference in get_dictionary_value(encoding, '/Differences', []):
+                if isinstance(difference, basestring):
+                    self.differences[code] = get_glyph_char(difference)
+                    code += 1
+                else:
+                    code = int(difference)
+        if base_encoding is not None:
+            self.encoding = SIMPLE_FONT_ENCODINGS.get(str(base_encoding))
+        elif encoding is not None or not flags & SYMBOLIC_FLAG or flags & NONSYMBOLIC_FLAG:
+            self.encoding = SIMPLE_FONT_ENCODINGS["/StandardEncoding"]
+
+    def get_code_length(self, string_bytes, position):
+        for code_length, first_code, last_code in sorted(self.code_ranges):
+            code = string_bytes[position:position+code_length]
+            if len(code) == code_length and first_code <= int(binascii.hexlify(code), 16) <= last_code:
+                return code_length
+        if self.is_composite:
+            return 2
+        return 1
+
+    def get_advance(self, pdf_string, font_size, char_spacing=0.0, word_spacing=0.0):
+        '''Get the horizontal advance of a string operand of a text showing
+        operator, in unscaled text space units.
+
+        Args:
+            - pdf_string (string): String operand.
+            - font_size (float): Font size set with `Tf`.
+            - char_spacing (float): Character spacing set with `Tc`.
+            - word_spacing (float): Word spacing set with `Tw`, applied to
+                single byte codes 32.
+        '''
+        string_bytes = get_string_bytes(pdf_string)
+        advance = 0.0
+        position = 0
+        while position < len(string_bytes):
+            code_length = 1
+            if self.is_composite:
+                code_length = self.get_code_length(string_bytes, position)
+            code = string_bytes[position:position+code_length]
+            width = AVERAGE_GLYPH_WIDTH
+            if self.has_widths:
+                width = self.widths.get(int(binascii.hexlify(code), 16), self.default_width)
+            advance += width/1000.0*font_size + char_spacing
+            if code == " ":
+                advance += word_spacing
+            position += code_length
+        return advance
+
+    def decode(self, pdf_string):
+        '''Decode a string operand of a text showing operator.
+
+        Returns:
+            The unicode text, None if the string can not be decoded through
+            the font.
+        '''
+        string_bytes = get_string_bytes(pdf_string)
+        text = u""
+        position = 0
+        if self.code_map is not None:
+            while position < len(string_bytes):
+                code_length = self.get_code_length(string_bytes, position)
+                code = string_bytes[position:position+code_length]
+                if code not in self.code_map:
+                    return None
+                text += self.code_map[code]
+                position += code_length
+        elif self.encoding:
+            for char in string_bytes:
+                if ord(char) in self.differences:
+                    if self.differences[ord(char)] is None:
+                        return None
+                    text += self.differences[ord(char)]
+                else:
+                    text += char.decode(self.encoding, 'replace')
+        else:
+            return None
+        if UNDECODED_CHAR_REGEX.search(text):
+            return None
+        return text
@@ -8,10 +8,22 @@ import logging
 from logging.config import fileConfig
 import ConfigParser
 import io
+import math
+import multiprocessing
 import os
+from parsers.document_session import PDFDocumentSession
+from parsers.page_cache import PageResultCache
+from parsers.page_renderer import PageRenderer, DEFAULT_DENSITY
+from parsers.pipeline_metrics import PipelineMetrics
+from parsers.table_utils import ColumnStats, delete_columns
 from PyPDF2 import PdfFileReader, PdfFileWriter
 import re
 import subprocess
+from parsers.tabula_worker import (TabulaWorker, TabulaWorkerError,
+                                   get_tabula_arguments, RESPONSE_OK,
+                                   RESPONSE_ERROR)
+from parsers.vector_table_detector import VectorTableDetector
+from parsers.workspace import Workspace
 
 fileConfig('parsers/logging_config.ini')
 logger = logging.getLogger()
@@ -19,6 +31,156 @@ BUFFER_LENGTH = 10
 DEFAULT_PIXEL_COLOR = [255, 255, 255]
 PAGE_BREAK_HANDLE = '"||page_break||"'
 DEFAULT_APERTURE_SIZE = 3
+PAGE_RANGES_PER_WORKER = 4
+TABULA_BATCH_SIZE = 10
+PAGE_CACHE_VERSION = 1
+
+
+def generate_page_range_table_data_worker(page_range_task):
+    '''Process pool entry point for extracting table data of a page range.
+
+    Every task carries its own pickled copy of the generator object, so
+    subclass hooks like `modify_image` behave exactly as they do in the serial
+    pipeline. Every task writes its temp files to its own workspace to keep
+    workers from overwriting each other's files.
+
+    Args:
+        page_range_task (tuple): (pdf_to_csv_obj, input_pdf_filepath,
+            first_page, last_page, is_header, identify_columns,
+            check_page_rotation)
+
+    Returns:
+        A tuple with a list of the table data extracted from every page of the
+        range, and the pipeline metrics records of the range.
+    '''
+    (pdf_to_csv_obj, input_pdf_filepath, first_page, last_page, is_header,
+     identify_columns, check_page_rotation) = page_range_task
+    input_pdf_obj = pdf_to_csv_obj.document_session.get_pdf_reader()
+    pdf_to_csv_obj.metrics.start_document(pdf_to_csv_obj.metrics.document)
+    with Workspace(prefix="pdf2csv_pages_%s_%s_" % (first_page, last_page),
+                   keep=pdf_to_csv_obj.debug_artifacts) as workspace:
+        pdf_to_csv_obj.workspace = workspace
+        pdf_to_csv_obj.set_temp_file_paths(pdf_to_csv_obj.temp_handle)
+        try:
+            page_range_table_data = list(pdf_to_csv_obj.generate_page_range_table_data(input_pdf_filepath,
+                                                                                       input_pdf_obj,
+                                                                                       first_page,
+                                                                                       last_page,
+                                                                                       is_header,
+                                                                                       identify_columns,
+                                                                                       check_page_rotation))
+            return page_range_table_data, pdf_to_csv_obj.metrics.records
+        finally:
+            pdf_to_csv_obj.close_tabula_worker()
+            pdf_to_csv_obj.document_session.close()
+
+
+def get_page_runs(first_page, last_page, skip_pages):
+    '''Split a page range into contiguous runs of pages not in skip_pages.
+
+    Returns:
+        A list of (first_page, last_page) tuples.
+    '''
+    page_runs = []
+    for page_num in range(first_page, last_page+1):
+        if page_num in skip_pages:
+            continue
+        if page_runs and page_runs[-1][1] == page_num-1:
+            page_runs[-1] = (page_runs[-1][0], page_num)
+        else:
+            page_runs.append((page_num, page_num))
+    return page_runs
+
+
+class PageLineGeometry(object):
+    """
+    Vertical and horizontal segments of the Hough lines detected on a page.
+
+    The segments are split once per page into NumPy arrays of (x1, y1, x2, y2)
+    rows, so that the table limit computations work on arrays instead of
+    walking the Hough output line by line. Where the original computations
+    depend on the order of the lines, only the candidate lines are walked.
+    """
+    def __init__(self, lines):
+        self.has_lines = type(lines).__module__ == "numpy"
+        if self.has_lines:
+            self.segments = lines.reshape(-1, 4)
+        else:
+            self.segments = numpy.zeros((0, 4), dtype=numpy.int32)
+        is_vertical = self.segments[:, 0] == self.segments[:, 2]
+        is_flat = self.segments[:, 1] == self.segments[:, 3]
+        self.vertical = self.segments[is_vertical]
+        self.horizontal = self.segments[is_flat & ~is_vertical]
+        self.other = self.segments[~(is_vertical | is_flat)]
+        self.flat = self.segments[is_flat]
+
+    def get_max_vertical_line(self):
+        '''Get (length, y1, y2) of the last longest vertical line, None if
+        no vertical line has a non negative length
+        '''
+        return self.get_last_longest_line(self.vertical[:, 1] - self.vertical[:, 3],
+                                          self.vertical[:, 1], self.vertical[:, 3])
+
+    def get_max_horizontal_line(self):
+        '''Get (length, x1, x2) of the last longest horizontal line, None if
+        no horizontal line has a non negative length
+        '''
+        return self.get_last_longest_line(self.horizontal[:, 2] - self.horizontal[:, 0],
+                                          self.horizontal[:, 0], self.horizontal[:, 2])
+
+    def get_last_longest_line(self, lengths, start_coordinates, end_coordinates):
+        if not len(lengths) or lengths.max() < 0:
+            return None
+        line_index = len(lengths) - 1 - numpy.argmax(lengths[::-1])
+        return (int(lengths[line_index]), int(start_coordinates[line_index]),
+                int(end_coordinates[line_index]))
+
+    def get_min_coordinate_above(self, coordinates, base_line):
+        '''Get the smallest coordinate greater than base line, 0 if none
+        '''
+        coordinates = coordinates[coordinates > base_line]
+        if not len(coordinates):
+            return 0
+        return int(coordinates.min())
+
+    def get_stretch(self, coordinates):
+        '''Get the buffered [min, max] stretch of coordinates.
+
+        Matches applying `PDF2CSV.get_max_stretch` to the coordinates in
+        order. After the first coordinate, only coordinates that are a new
+        minimum or maximum of the rest can move the stretch, so only those
+        are walked.
+        '''
+        if not len(coordinates):
+            return [0, 0]
+        stretch = [int(coordinates[0]) + BUFFER_LENGTH] * 2
+        coordinates = coordinates[1:]
+        if len(coordinates):
+            running_min = numpy.minimum.accumulate(coordinates)
+            running_max = numpy.maximum.accumulate(coordinates)
+            is_candidate = numpy.ones(len(coordinates), dtype=bool)
+            is_candidate[1:] = ((running_min[1:] < running_min[:-1]) |
+                                (running_max[1:] > running_max[:-1]))
+            for coordinate in coordinates[is_candidate].tolist():
+                if coordinate < stretch[0]:
+                    stretch[0] = coordinate - BUFFER_LENGTH
+                elif coordinate > stretch[1]:
+                    stretch[1] = coordinate + BUFFER_LENGTH
+        return stretch
+
+    def get_horizontal_base_line(self):
+        '''Gives vertical coordinate of horizontal base line(aka header line)
+        '''
+        horizontal_base_line = 0
+        for y1 in self.flat[:, 1].tolist():
+            if horizontal_base_line == 0 or horizontal_base_line > y1:
+                horizontal_base_line = y1 + BUFFER_LENGTH
+        return horizontal_base_line
+
+    def get_column_coordinates(self):
+        '''Get the distinct x coordinates of vertical lines
+        '''
+        return numpy.unique(self.vertical[:, 0]).tolist()
 
 
 class PDF2CSV(object):
@@ -27,12 +189,29 @@ class PDF2CSV(object):
     """
     def __init__(self):
         self.page_break = PAGE_BREAK_HANDLE
+        self.temp_handle = ''
+        self.temp_pdf_file = ''
         self.temp_img_file = ''
         self.temp_csv_file = ''
+        self.workspace = None
+        self.debug_artifacts = False
+        self.image_object = None
+        self.page_renderer = PageRenderer()
+        self.vector_detection = False
+        self.tabula_worker = None
+        self.tabula_worker_enabled = None
+        self.tabula_failure_count = 0
+        self.page_cache = None
+        self.pdf_hash = None
+        self.metrics = PipelineMetrics()
+        self.document_session = None
 
     def generate_csv_file(self, input_pdf_filepath, out_csv_filepath,
                           is_header=True, identify_columns=False,
-                          temp_file_postfix="", check_page_rotation=False):
+                          temp_file_postfix="", check_page_rotation=False,
+                          workers=1, density=DEFAULT_DENSITY, grayscale=False,
+                          debug_artifacts=False, vector_detection=False,
+                          metrics_filepath=None, document_session=None):
         """
         Generate the csv file for a given pdf.
 
@@ -49,43 +228,345 @@ class PDF2CSV(object):
                 generated for the processing. Defaults to an empty string ""
             - check_page_rotation (boolean): The program tries to detect the
                 table with multiple rotation angles.
+            - workers (int): Number of processes used to extract page tables
+                in parallel. Defaults to 1, which processes the pages one
+                after another in the current process.
+            - density (int): DPI at which the pages are rendered for line
+                detection. Defaults to 300.
+            - grayscale (boolean): Render the pages as grayscale images
+                instead of color ones. Defaults to False.
+            - debug_artifacts (boolean): Write the page image with the
+                detected table lines and bounds drawn on it to the temp image
+                file, and keep the workspace with the temp files after the
+                conversion. Defaults to False.
+            - vector_detection (boolean): Detect tables from the ruling lines
+                drawn in the page content stream, pages on which no table is
+                found this way are rendered for line detection. Defaults to
+                False.
+            - metrics_filepath (string): JSON lines file to which the time
+                taken by every pipeline stage of every page, and a summary of
+                the document, are appended. Defaults to None, which disables
+                the instrumentation.
+            - document_session (obj:`PDFDocumentSession`): Session of the pdf
+                shared with the stages run before and after the conversion,
+                like keyword extraction. Defaults to None, which opens a
+                session for the conversion only.
 
         Returns:
             None
         """
-        input_pdf_obj = PdfFileReader(open(input_pdf_filepath, 'rb'))
-        total_pages = input_pdf_obj.getNumPages()
-        department_name = os.path.basename(input_pdf_filepath).lower().split(".pdf")[0].decode('utf-8')
-        temp_handle = re.sub(r'[^A-Za-z0-9]', '_', department_name)
-        self.temp_pdf_file = '/tmp/temp_doc_%s%s.pdf' % (temp_handle,
-                                                         temp_file_postfix)
-        self.temp_img_file = '/tmp/pdf_image_%s%s.png' % (temp_handle,
-                                                          temp_file_postfix)
-        self.temp_csv_file = '/tmp/temp_data_%s%s.csv' % (temp_handle,
-                                                          temp_file_postfix)
-        out_file_obj = open(self.temp_csv_file, 'w')
-        for page_num in range(total_pages):
-            page_table_data = self.generate_page_table_data(input_pdf_filepath,
-                                                            input_pdf_obj,
-                                                            page_num,
+        if document_session:
+            self.document_session = document_session
+        else:
+            self.document_session = PDFDocumentSession(input_pdf_filepath)
+        try:
+            input_pdf_obj = self.document_session.get_pdf_reader()
+            total_pages = input_pdf_obj.getNumPages()
+            department_name = os.path.basename(input_pdf_filepath).lower().split(".pdf")[0].decode('utf-8')
+            temp_handle = re.sub(r'[^A-Za-z0-9]', '_', department_name)
+            self.page_renderer = PageRenderer(density=density, grayscale=grayscale,
+                                              chunk_size=TABULA_BATCH_SIZE)
+            self.document_session.page_renderer = self.page_renderer
+            self.debug_artifacts = debug_artifacts
+            self.vector_detection = vector_detection
+            self.metrics = PipelineMetrics(enabled=bool(metrics_filepath))
+            self.metrics.start_document(input_pdf_filepath)
+            self.page_cache = self.get_page_cache()
+            if self.page_cache:
+                self.pdf_hash = self.document_session.get_file_hash()
+            with Workspace(prefix="pdf2csv_%s_" % temp_handle,
+                           keep=debug_artifacts) as workspace:
+                self.workspace = workspace
+                self.set_temp_file_paths(temp_handle + temp_file_postfix)
+                if not total_pages:
+                    page_tables = []
+                elif workers > 1:
+                    page_tables = self.generate_parallel_page_table_data(input_pdf_filepath,
+                                                                         total_pages,
+                                                                         is_header,
+                                                                         identify_columns,
+                                                                         check_page_rotation,
+                                                                         workers)
+                else:
+                    page_tables = self.generate_page_range_table_data(input_pdf_filepath,
+                                                                      input_pdf_obj,
+                                                                      0,
+                                                                      total_pages-1,
+                                                                      is_header,
+                                                                      identify_columns,
+                                                                      check_page_rotation)
+                out_file_obj = open(self.temp_csv_file, 'w')
+                try:
+                    for page_table_data in page_tables:
+                        if page_table_data:
+                            out_file_obj.write("\n%s" % page_table_data)
+                        out_file_obj.write("\n%s" % self.page_break)
+                finally:
+                    self.close_tabula_worker()
+                out_file_obj.close()
+                with self.metrics.stage("process_csv_file"):
+                    self.process_csv_file(out_csv_filepath)
+            self.workspace = None
+            if metrics_filepath:
+                self.metrics.write_json_lines(metrics_filepath)
+        finally:
+            if not document_session:
+                self.document_session.close()
+            self.document_session = None
+
+    def set_temp_file_paths(self, temp_handle):
+        '''Set the paths of the temp files used while processing a document.
+
+        The temp files are placed in the workspace of the current job.
+
+        Args:
+            temp_handle (string): Handle used to name the temp files.
+        '''
+        self.temp_handle = temp_handle
+        self.temp_pdf_file = self.workspace.get_path('temp_doc_%s.pdf' % temp_handle)
+        self.temp_img_file = self.workspace.get_path('pdf_image_%s.png' % temp_handle)
+        self.temp_csv_file = self.workspace.get_path('temp_data_%s.csv' % temp_handle)
+
+    def generate_parallel_page_table_data(self, input_pdf_filepath, total_pages,
+                                          is_header, identify_columns,
+                                          check_page_rotation, workers):
+        '''Extract table data of all pages using a pool of processes.
+
+        Contiguous page ranges are distributed over the pool, so that every
+        range is rendered with a `convert` call per chunk of pages, but
+        results are yielded in page order so that the page break markers and
+        hence the input of `modify_table_data` are the same as in the serial
+        pipeline.
+
+        Args:
+            - input_pdf_filepath (string): The path of the pdf to be parsed.
+            - total_pages (int): Number of pages in the pdf.
+            - is_header (boolean): Used while detecting table limits.
+            - identify_columns (boolean): Used while detecting columns.
+            - check_page_rotation (boolean): The program tries to detect the
+                table with multiple rotation angles.
+            - workers (int): Number of processes in the pool.
+
+        Yields:
+            The table data of every page, in page order.
+        '''
+        self.image_object = None
+        self.close_tabula_worker()
+        range_size = int(math.ceil(float(total_pages)/(workers*PAGE_RANGES_PER_WORKER)))
+        page_range_tasks = [(self, input_pdf_filepath, first_page,
+                             min(first_page+range_size, total_pages)-1,
+                             is_header, identify_columns, check_page_rotation)
+                            for first_page in range(0, total_pages, range_size)]
+        pool = multiprocessing.Pool(workers)
+        try:
+            for page_range_table_data, metrics_records in pool.imap(generate_page_range_table_data_worker,
+                                                                    page_range_tasks):
+                self.metrics.extend(metrics_records)
+                for page_table_data in page_range_table_data:
+                    yield page_table_data
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def generate_page_range_table_data(self, input_pdf_filepath, input_pdf_obj,
+                                       first_page, last_page, is_header,
+                                       identify_columns, check_page_rotation):
+        '''Extract table data of a range of pages.
+
+        Pages found in the page result cache are not rendered again, the
+        remaining pages are processed in contiguous runs.
+
+        Args:
+            - input_pdf_filepath (string): The path of the pdf to be parsed.
+            - input_pdf_obj (obj:`PdfFileReader`): pdf file reader object used
+                to access information from the pdf.
+            - first_page (int): Zero based index of the first page.
+            - last_page (int): Zero based index of the last page.
+            - is_header (boolean): Used while detecting table limits.
+            - identify_columns (boolean): Used while detecting columns.
+            - check_page_rotation (boolean): The program tries to detect the
+                table with multiple rotation angles.
+
+        Yields:
+            The table data of every page of the range, in page order.
+        '''
+        cache_params = self.get_page_cache_params(is_header, identify_columns,
+                                                  check_page_rotation)
+        cached_tables_data = self.get_cached_tables_data(first_page, last_page,
+                                                         cache_params)
+        page_num = first_page
+        for run_first_page, run_last_page in get_page_runs(first_page, last_page,
+                                                           cached_tables_data):
+            for page_num in range(page_num, run_first_page):
+                yield cached_tables_data[page_num]
+            for page_table_data in self.extract_page_range_table_data(input_pdf_filepath,
+                                                                      input_pdf_obj,
+                                                                      run_first_page,
+                                                                      run_last_page,
+                                                                      is_header,
+                                                                      identify_columns,
+                                                                      check_page_rotation,
+                                                                      cache_params):
+                yield page_table_data
+            page_num = run_last_page + 1
+        for page_num in range(page_num, last_page+1):
+            yield cached_tables_data[page_num]
+
+    def extract_page_range_table_data(self, input_pdf_filepath, input_pdf_obj,
+                                      first_page, last_page, is_header,
+                                      identify_columns, check_page_rotation,
+                                      cache_params):
+        '''Render a range of pages in chunks and extract their table data.
+
+        Table requests of up to `TABULA_BATCH_SIZE` pages are sent to tabula
+        together, pages for which no table data is returned are retried
+        rotated one at a time. With vector detection only the pages on which
+        it finds no table are rendered. The results are stored in the page
+        result cache, if it is enabled, except for pages on which tabula
+        failed.
+
+        Yields:
+            The table data of every page of the range, in page order.
+        '''
+        page_requests = []
+        vector_table_requests = {}
+        if self.vector_detection:
+            for page_num in range(first_page, last_page+1):
+                table_request = self.get_vector_table_request(input_pdf_filepath,
+                                                              input_pdf_obj,
+                                                              page_num,
+                                                              is_header,
+                                                              identify_columns)
+                if table_request:
+                    vector_table_requests[page_num] = table_request
+        for page_num, page_image in self.iter_page_images(input_pdf_filepath,
+                                                          first_page, last_page,
+                                                          vector_table_requests):
+            if page_num in vector_table_requests:
+                table_request = vector_table_requests[page_num]
+            else:
+                table_request = self.get_page_table_request(input_pdf_filepath,
+                                                            input_pdf_obj, page_num,
                                                             is_header,
                                                             identify_columns,
-                                                            check_page_rotation)
-            if page_table_data:
-                out_file_obj.write("\n%s" % page_table_data)
-            out_file_obj.write("\n%s" % self.page_break)
-        out_file_obj.close()
-        self.process_csv_file(out_csv_filepath)
+                                                            page_image=page_image)
+            page_requests.append((page_num, table_request))
+            if len(page_requests) == TABULA_BATCH_SIZE or page_num == last_page:
+                table_requests = [page_request[1] for page_request in page_requests
+                                  if page_request[1]]
+                table_results = iter(self.extract_table_results(table_requests))
+                for page_num, table_request in page_requests:
+                    page_table_data = ""
+                    is_failed = False
+                    if table_request:
+                        page_table_data, is_failed = next(table_results)
+                        if not page_table_data and check_page_rotation:
+                            tabula_failure_count = self.tabula_failure_count
+                            page_table_data = self.generate_rotated_page_table_data(input_pdf_obj,
+                                                                                    page_num,
+                                                                                    is_header,
+                                                                                    identify_columns)
+                            if self.tabula_failure_count != tabula_failure_count:
+                                is_failed = True
+                    if not is_failed:
+                        self.set_cached_page_result(page_num, cache_params,
+                                                    page_table_data, table_request)
+                    yield page_table_data
+                page_requests = []
+
+    def iter_page_images(self, input_pdf_filepath, first_page, last_page,
+                         skip_pages):
+        '''Render the pages of a range which are not in skip_pages.
+
+        Yields:
+            Tuples of page number and page image for every page of the range,
+            in page order, the image is None for skipped pages.
+        '''
+        page_num = first_page
+        for run_first_page, run_last_page in get_page_runs(first_page, last_page,
+                                                           skip_pages):
+            for page_num in range(page_num, run_first_page):
+                yield page_num, None
+            page_images = self.page_renderer.iter_page_images(input_pdf_filepath,
+                                                              run_first_page,
+                                                              run_last_page)
+            for page_num, page_image in self.metrics.iter_stage("render", page_images):
+                yield page_num, page_image
+            page_num = run_last_page + 1
+        for page_num in range(page_num, last_page+1):
+            yield page_num, None
+
+    def get_page_cache(self):
+        '''Get the page result cache configured in `parsers_config.ini`, None
+        if it is disabled
+        '''
+        parser_config = self.get_parser_config()
+        if not (parser_config.has_option('cache', 'enabled') and
+                parser_config.getboolean('cache', 'enabled')):
+            return None
+        return PageResultCache(parser_config.get('cache', 'dir'),
+                               parser_config.getint('cache', 'max_size_mb'))
+
+    def get_page_cache_params(self, is_header, identify_columns,
+                              check_page_rotation):
+        '''Get the parameters which affect the table data extracted from a
+        page, used along with the pdf hash and page number as cache key
+        '''
+        parser_config = self.get_parser_config()
+        return {"version": PAGE_CACHE_VERSION,
+                "parser": self.__class__.__name__,
+                "is_header": bool(is_header),
+                "identify_columns": bool(identify_columns),
+                "check_page_rotation": bool(check_page_rotation),
+                "vector_detection": self.vector_detection,
+                "aperture_size": DEFAULT_APERTURE_SIZE,
+                "density": self.page_renderer.density,
+                "grayscale": self.page_renderer.grayscale,
+                "tabula": [parser_config.get('tabula', 'command'),
+                           parser_config.get('tabula', 'jar')]}
+
+    def get_cached_tables_data(self, first_page, last_page, cache_params):
+        '''Get the cached table data of a range of pages.
+
+        Returns:
+            A dict with the table data of every cached page by page number.
+        '''
+        cached_tables_data = {}
+        if not self.page_cache:
+            return cached_tables_data
+        with self.metrics.stage("cache_lookup"):
+            for page_num in range(first_page, last_page+1):
+                page_key = self.page_cache.get_page_key(self.pdf_hash, page_num,
+                                                        cache_params)
+                page_result = self.page_cache.get(page_key)
+                if page_result:
+                    cached_tables_data[page_num] = page_result["table_data"]
+            self.metrics.add_counter("hits", len(cached_tables_data))
+        if cached_tables_data:
+            logger.info("Using cached table data of %s pages" % len(cached_tables_data))
+        return cached_tables_data
+
+    def set_cached_page_result(self, page_num, cache_params, page_table_data,
+                               table_request):
+        '''Store the table data and detected table of a page in the cache
+        '''
+        if not self.page_cache:
+            return
+        page_key = self.page_cache.get_page_key(self.pdf_hash, page_num,
+                                                cache_params)
+        self.page_cache.set(page_key, page_table_data, table_request)
 
     def generate_page_table_data(self, input_pdf_filepath, input_pdf_obj,
                                  page_num, is_header, identify_columns,
-                                 check_page_rotation):
+                                 check_page_rotation, page_image=None):
         '''Convert a pdf page into table using image processing and tabula.
 
         This function acts as the pipeline through which we extract tables
         from pdf. The pipeline consists of the following steps : -
             - Check Rotation of the page.
-            - Generate Image of the page using `convert` command.
+            - Generate Image of the page using `convert` command, unless it
+                was already rendered along with its page range.
             - Detect lines for the table.
             - Use tabula with the coordinates detected from the previous
                 processes.
@@ -99,11 +580,61 @@ class PDF2CSV(object):
             - indentify_columns (boolean): ???
             - check_page_rotation (boolean): The program tries to detect the
                 table with multiple rotation angles.
+            - page_image (obj:`numpy.ndarray`): Rendered image of the page,
+                the page is rendered on demand if not passed.
 
         Returns:
             A (???? format ????) table data extracted from the page.
         '''
         page_table_data = ""
+        table_request = self.get_page_table_request(input_pdf_filepath,
+                                                    input_pdf_obj, page_num,
+                                                    is_header, identify_columns,
+                                                    page_image=page_image)
+        if table_request:
+            page_table_data = self.extract_tables([table_request])[0]
+            if not page_table_data and check_page_rotation:
+                page_table_data = self.generate_rotated_page_table_data(input_pdf_obj,
+                                                                        page_num,
+                                                                        is_header,
+                                                                        identify_columns)
+        return page_table_data
+
+    def generate_rotated_page_table_data(self, input_pdf_obj, page_num,
+                                         is_header, identify_columns):
+        '''Retry table extraction for a page after rotating it clockwise.
+        '''
+        logger.info("Rotating Page")
+        rotated_pdf_obj = self.get_rotated_pdf_obj(input_pdf_obj, page_num)
+        return self.generate_page_table_data(self.temp_pdf_file, rotated_pdf_obj,
+                                             0, is_header, identify_columns,
+                                             check_page_rotation=False)
+
+    def get_page_table_request(self, input_pdf_filepath, input_pdf_obj,
+                               page_num, is_header, identify_columns,
+                               page_image=None):
+        '''Detect the table on a page and build the tabula request for it.
+
+        Args:
+            - input_pdf_filepath (string): The path of the pdf to be parsed.
+            - input_pdf_obj (obj:`PdfFileReader`): pdf file reader object used
+                to access information from the pdf.
+            - page_num (int): The page number to detect tables on.
+            - is_header (boolean): Used while detecting table limits.
+            - identify_columns (boolean): Pass the detected columns to tabula.
+            - page_image (obj:`numpy.ndarray`): Rendered image of the page,
+                the page is rendered on demand if not passed.
+
+        Returns:
+            A table request dict as accepted by `get_tabula_arguments`, None if
+            no table was found on the page.
+        '''
+        if page_image is None and self.vector_detection:
+            table_request = self.get_vector_table_request(input_pdf_filepath,
+                                                          input_pdf_obj, page_num,
+                                                          is_header, identify_columns)
+            if table_request:
+                return table_request
         page_layout = input_pdf_obj.getPage(page_num)['/MediaBox']
         if '/Rotate' in input_pdf_obj.getPage(page_num) and input_pdf_obj.getPage(page_num)['/Rotate'] == 90:
             page_width = float(page_layout[3])
@@ -111,50 +642,156 @@ class PDF2CSV(object):
         else:
             page_width = float(page_layout[2])
             page_height = float(page_layout[3])
-        command = "convert -density 300 '%s'[%s] '%s'" % (input_pdf_filepath,
-                                                          page_num,
-                                                          self.temp_img_file)
-        subprocess.check_output(command, shell=True)
-        self.image_object = cv2.imread(self.temp_img_file)
-        image_height, image_width, channels = self.image_object.shape
+        if page_image is None:
+            with self.metrics.stage("render", page_num):
+                page_image = self.page_renderer.get_page_image(input_pdf_filepath,
+                                                               page_num)
+        self.image_object = page_image
+        image_height, image_width = self.image_object.shape[:2]
         self.horizontal_ratio = page_width/image_width
         self.vertical_ratio = page_height/image_height
-        lines = self.get_straight_lines()
-        table_limits = self.get_table_limits(lines, is_header)
+        with self.metrics.stage("straight_lines", page_num):
+            lines = self.get_straight_lines()
+            line_geometry = PageLineGeometry(lines)
+            self.metrics.add_counter("hough_segments", len(line_geometry.segments))
+        with self.metrics.stage("table_limits", page_num):
+            table_limits = self.get_table_limits(line_geometry, is_header)
         column_coordinates = None
-        if identify_columns:
-            lines = self.modify_image(lines, table_limits)
-        if type(lines).__module__ == "numpy":
-            lines, column_coordinates = self.extend_lines_for_table(lines,
-                                                                    is_header,
-                                                                    table_limits)
-        table_bounds = self.get_table_bounds()
-        tabula_command = self.get_tabula_command_extenstion()
-        if table_bounds and column_coordinates:
+        with self.metrics.stage("extend_lines", page_num):
             if identify_columns:
-                column_values = ""
-                for value in column_coordinates:
-                    if column_values:
-                        column_values += "," + str(value)
-                    else:
-                        column_values = str(value)
-                command = "%s --pages %s --area %s,%s,%s,%s --columns %s '%s'" % (tabula_command, page_num+1, table_bounds["top"], table_bounds["left"], table_bounds["bottom"], table_bounds["right"], column_values, input_pdf_filepath)
-            else:
-                command = "%s --pages %s --area %s,%s,%s,%s '%s'" % (tabula_command, page_num+1, table_bounds["top"], table_bounds["left"], table_bounds["bottom"], table_bounds["right"], input_pdf_filepath)
-            logger.info("Processing: %s" % command)
-            try:
-                page_table_data = subprocess.check_output(command, shell=True)
-            except subprocess.CalledProcessError as e:
-                logger.error("command '{}' return with error (code {}): {}".format(e.cmd, e.returncode, e.output))
-                page_table_data = e.output
-            if not page_table_data and check_page_rotation:
-                logger.info("Rotating Page")
-                rotated_pdf_obj = self.get_rotated_pdf_obj(input_pdf_obj, page_num)
-                page_table_data = self.generate_page_table_data(self.temp_pdf_file, rotated_pdf_obj, 0, is_header, check_page_rotation=False)
-        else:
+                modified_lines = self.modify_image(lines, table_limits)
+                if modified_lines is not lines:
+                    line_geometry = PageLineGeometry(modified_lines)
+            if line_geometry.has_lines:
+                line_geometry, column_coordinates = self.extend_lines_for_table(line_geometry,
+                                                                                is_header,
+                                                                                table_limits)
+        with self.metrics.stage("table_bounds", page_num):
+            table_bounds = self.get_table_bounds()
+        if not (table_bounds and column_coordinates):
             warning_message = "No table found on {0} from file {1}"
             logger.warning(warning_message.format(page_num, input_pdf_filepath))
-        return page_table_data
+            return None
+        table_request = {"pdf": input_pdf_filepath,
+                         "page": page_num+1,
+                         "area": [table_bounds["top"], table_bounds["left"],
+                                  table_bounds["bottom"], table_bounds["right"]],
+                         "columns": None}
+        if identify_columns:
+            table_request["columns"] = column_coordinates
+        return table_request
+
+    def get_vector_table_request(self, input_pdf_filepath, input_pdf_obj,
+                                 page_num, is_header, identify_columns):
+        '''Build the tabula request for a page from its vector ruling lines.
+
+        Args:
+            - is_header (boolean): Used while detecting table limits.
+
+        Returns:
+            A table request dict as accepted by `get_tabula_arguments`, None if
+            the page has to be rendered to detect its table.
+        '''
+        with self.metrics.stage("vector_detection", page_num):
+            vector_table = VectorTableDetector().detect_table(input_pdf_obj.getPage(page_num),
+                                                              is_header=is_header)
+        if not vector_table:
+            return None
+        table_bounds = vector_table["table_bounds"]
+        table_request = {"pdf": input_pdf_filepath,
+                         "page": page_num+1,
+                         "area": [table_bounds["top"], table_bounds["left"],
+                                  table_bounds["bottom"], table_bounds["right"]],
+                         "columns": None}
+        if identify_columns:
+            table_request["columns"] = vector_table["column_coordinates"]
+        return table_request
+
+    def extract_tables(self, table_requests):
+        '''Extract table data for a batch of table requests using tabula.
+
+        Requests go to the long lived tabula worker when it is enabled in
+        `parsers_config.ini`, requests the worker can not serve fall back to
+        running the tabula command for the page.
+
+        Args:
+            table_requests (list): Table requests built by
+                `get_page_table_request`.
+
+        Returns:
+            A list with the table data of every request.
+        '''
+        return [table_data for table_data, is_failed in self.extract_table_results(table_requests)]
+
+    def extract_table_results(self, table_requests):
+        '''Extract table data for a batch of table requests, telling apart
+        requests for which tabula failed.
+
+        Returns:
+            A list with a (table_data, is_failed) tuple for every request,
+            is_failed is True if the tabula command failed for the request.
+        '''
+        if not table_requests:
+            return []
+        worker_responses = [(None, None)] * len(table_requests)
+        tabula_worker = self.get_tabula_worker()
+        if tabula_worker:
+            try:
+                with self.metrics.stage("tabula_worker"):
+                    self.metrics.add_counter("requests", len(table_requests))
+                    worker_responses = tabula_worker.extract_tables(table_requests)
+            except TabulaWorkerError as error:
+                logger.warning("Falling back to tabula command: %s" % error)
+                self.tabula_worker_enabled = False
+        table_results = []
+        for table_request, (status, table_data) in zip(table_requests,
+                                                       worker_responses):
+            if status == RESPONSE_OK:
+                table_results.append((table_data, False))
+            else:
+                if status == RESPONSE_ERROR:
+                    logger.warning("Tabula worker failed for page %s: %s" % (table_request["page"], table_data))
+                with self.metrics.stage("tabula_command", table_request["page"]-1):
+                    table_results.append(self.run_tabula_command(table_request))
+        return table_results
+
+    def run_tabula_command(self, table_request):
+        '''Extract table data for a table request with a new tabula process.
+
+        Returns:
+            A (table_data, is_failed) tuple, table_data is the output of the
+            command even if it failed.
+        '''
+        command = "%s %s" % (self.get_tabula_command_extenstion(),
+                             " ".join("'%s'" % argument for argument in get_tabula_arguments(table_request)))
+        logger.info("Processing: %s" % command)
+        try:
+            return subprocess.check_output(command, shell=True), False
+        except subprocess.CalledProcessError as e:
+            logger.error("command '{}' return with error (code {}): {}".format(e.cmd, e.returncode, e.output))
+            self.tabula_failure_count += 1
+            return e.output, True
+
+    def get_tabula_worker(self):
+        '''Get the tabula worker of this process, None if it is disabled
+        '''
+        if self.tabula_worker_enabled is None:
+            parser_config = self.get_parser_config()
+            self.tabula_worker_enabled = (parser_config.has_option('tabula', 'use_worker') and
+                                          parser_config.getboolean('tabula', 'use_worker'))
+            if self.tabula_worker_enabled:
+                self.tabula_worker = TabulaWorker(parser_config.get('tabula', 'jar'))
+        if not self.tabula_worker_enabled:
+            return None
+        return self.tabula_worker
+
+    def close_tabula_worker(self):
+        '''Stop the tabula worker of this process, if any
+        '''
+        if self.tabula_worker:
+            self.tabula_worker.close()
+        self.tabula_worker = None
+        self.tabula_worker_enabled = None
 
     def get_rotated_pdf_obj(self, input_pdf_obj, page_num):
         '''Rotate a given pdf clockwise 90 degress.
@@ -178,7 +815,7 @@ class PDF2CSV(object):
     def get_straight_lines(self, aperture_size=DEFAULT_APERTURE_SIZE):
         '''Extract long straight lines using Probabilistic Hough Transform
         '''
-        image_gray = cv2.cvtColor(self.image_object, cv2.COLOR_BGR2GRAY)
+        image_gray = self.get_gray_image()
         edges = cv2.Canny(image_gray, 100, 150, apertureSize=aperture_size)
         min_line_length = 100
         max_line_gap = 100
@@ -186,46 +823,44 @@ class PDF2CSV(object):
                                 max_line_gap)
         return lines
 
-    def get_table_limits(self, lines, is_header):
+    def get_gray_image(self):
+        '''Get the grayscale version of the page image
+        '''
+        if len(self.image_object.shape) == 2:
+            return self.image_object
+        return cv2.cvtColor(self.image_object, cv2.COLOR_BGR2GRAY)
+
+    def get_table_limits(self, line_geometry, is_header):
         '''Get maximum horizontal and vertical line coordinates for bounding box
         '''
         table_limits = {}
-        found_horizontal_line = False
-        found_vertical_line = False
+        found_horizontal_line = len(line_geometry.horizontal) > 0
+        found_vertical_line = len(line_geometry.vertical) > 0
         vertical_stretch = [0,0]
         horizontal_stretch = [0,0]
         max_horizontal = [0,0,0,0]
         max_vertical = [0,0,0,0]
         horizontal_base_line = 0
         if is_header:
-            horizontal_base_line = self.get_horizontal_base_line(lines)
+            horizontal_base_line = self.get_horizontal_base_line(line_geometry)
         vertical_base_line = 0
-        if type(lines).__module__ == "numpy":
-            for line in lines:
-                for x1,y1,x2,y2 in line:
-                    if x1 == x2:
-                        if not found_vertical_line:
-                            found_vertical_line = True
-                        length = (y1 - y2)
-                        if max_vertical[0] <= length:
-                            max_vertical[0] = length
-                            max_vertical[1] = y1 + BUFFER_LENGTH
-                            max_vertical[2] = y2 - BUFFER_LENGTH
-                        if (max_vertical[3] == 0 or max_vertical[3] > (x1 - BUFFER_LENGTH)) and (x1 - BUFFER_LENGTH) > vertical_base_line:
-                            max_vertical[3] = (x1 - BUFFER_LENGTH)
-                        horizontal_stretch = self.get_max_stretch(x1, horizontal_stretch)
-                    elif y1 == y2:
-                        if not found_horizontal_line:
-                            found_horizontal_line = True
-                        length = (x2 - x1)
-                        if max_horizontal[0] <= length:
-                            max_horizontal[0] = length
-                            max_horizontal[1] = x1 - BUFFER_LENGTH
-                            max_horizontal[2] = x2 + BUFFER_LENGTH
-                        if (max_horizontal[3] == 0 or max_horizontal[3] > (y1 - BUFFER_LENGTH)) and (y1 - BUFFER_LENGTH) > horizontal_base_line:
-                            max_horizontal[3] = (y1 - BUFFER_LENGTH)
-                        if not is_header:
-                            vertical_stretch = self.get_max_stretch(y1, vertical_stretch)
+        if found_vertical_line:
+            max_vertical_line = line_geometry.get_max_vertical_line()
+            if max_vertical_line:
+                length, y1, y2 = max_vertical_line
+                max_vertical[0:3] = [length, y1 + BUFFER_LENGTH, y2 - BUFFER_LENGTH]
+            max_vertical[3] = line_geometry.get_min_coordinate_above(line_geometry.vertical[:, 0] - BUFFER_LENGTH,
+                                                                     vertical_base_line)
+            horizontal_stretch = line_geometry.get_stretch(line_geometry.vertical[:, 0])
+        if found_horizontal_line:
+            max_horizontal_line = line_geometry.get_max_horizontal_line()
+            if max_horizontal_line:
+                length, x1, x2 = max_horizontal_line
+                max_horizontal[0:3] = [length, x1 - BUFFER_LENGTH, x2 + BUFFER_LENGTH]
+            max_horizontal[3] = line_geometry.get_min_coordinate_above(line_geometry.horizontal[:, 1] - BUFFER_LENGTH,
+                                                                       horizontal_base_line)
+            if not is_header:
+                vertical_stretch = line_geometry.get_stretch(line_geometry.horizontal[:, 1])
         if max_vertical[2] > max_horizontal[3] and max_horizontal[3] > 0:
             max_vertical[2] = max_horizontal[3]
         if max_horizontal[1] >  max_vertical[3] and max_vertical[3] > 0:
@@ -234,42 +869,38 @@ class PDF2CSV(object):
             max_vertical[1:3] = vertical_stretch
         elif not found_horizontal_line and found_vertical_line:
             max_horizontal[1:3] = horizontal_stretch
-        max_vertical = self.fix_vertical_lines(lines, max_vertical)
+        max_vertical = self.fix_vertical_lines(line_geometry, max_vertical)
         table_limits["horizontal"] = {"stretch": horizontal_stretch, "found": found_horizontal_line, "max": max_horizontal}
         table_limits["vertical"] = {"stretch": vertical_stretch, "found": found_vertical_line, "max": max_vertical}
         return table_limits
 
-    def extend_lines_for_table(self, lines, is_header, table_limits):
+    def extend_lines_for_table(self, line_geometry, is_header, table_limits):
         '''
         Extend straight lines to create table bounds
         '''
-        column_coordinates = []
-        for line in lines:
-            for x1, y1, x2, y2 in line:
-                if x1 == x2:
-                    y1 = table_limits["vertical"]["max"][1]
-                    y2 = table_limits["vertical"]["max"][2]
-                    column_coordinates.append(x1)
-                elif y1 == y2:
-                    x1 = table_limits["horizontal"]["max"][1]
-                    x2 = table_limits["horizontal"]["max"][2]
-                cv2.line(self.image_object, (x1, y1), (x2, y2), (0, 0, 0), 4)
+        vertical_limits = table_limits["vertical"]["max"]
+        horizontal_limits = table_limits["horizontal"]["max"]
+        column_coordinates = line_geometry.get_column_coordinates()
+        for x1 in column_coordinates:
+            cv2.line(self.image_object, (x1, vertical_limits[1]),
+                     (x1, vertical_limits[2]), (0, 0, 0), 4)
+        for y1 in numpy.unique(line_geometry.horizontal[:, 1]).tolist():
+            cv2.line(self.image_object, (horizontal_limits[1], y1),
+                     (horizontal_limits[2], y1), (0, 0, 0), 4)
+        for x1, y1, x2, y2 in line_geometry.other.tolist():
+            cv2.line(self.image_object, (x1, y1), (x2, y2), (0, 0, 0), 4)
         cv2.line(self.image_object,
-                 (table_limits["horizontal"]["max"][2],
-                  table_limits["vertical"]["max"][1]),
-                 (table_limits["horizontal"]["max"][2],
-                  table_limits["vertical"]["max"][2]),
+                 (horizontal_limits[2], vertical_limits[1]),
+                 (horizontal_limits[2], vertical_limits[2]),
                  (0, 0, 0), 4)
         cv2.line(self.image_object,
-                 (table_limits["horizontal"]["max"][1],
-                  table_limits["vertical"]["max"][1]),
-                 (table_limits["horizontal"]["max"][1],
-                  table_limits["vertical"]["max"][2]),
+                 (horizontal_limits[1], vertical_limits[1]),
+                 (horizontal_limits[1], vertical_limits[2]),
                  (0, 0, 0), 4)
-        cv2.imwrite(self.temp_img_file, self.image_object)
+        self.write_debug_image()
         if column_coordinates:
             column_coordinates = self.get_clubbed_column_coordinates(column_coordinates)
-        return lines, column_coordinates
+        return line_geometry, column_coordinates
 
     def get_max_stretch(self, coordinate, stretch_vector):
         if stretch_vector[0] == stretch_vector[1] == 0:
@@ -300,42 +931,53 @@ class PDF2CSV(object):
             clubbed_column_coordinates.append((sum(column_cluster)/len(column_cluster))*self.horizontal_ratio)
         return clubbed_column_coordinates
 
-    def fix_vertical_lines(self, lines, max_vertical):
-        image_height, image_width, channels = self.image_object.shape
+    def fix_vertical_lines(self, line_geometry, max_vertical):
+        '''Extend the upper limit of the table to the top of vertical lines.
+
+        Every vertical line is followed upwards from its upper end until the
+        first default(white) pixel. Instead of walking the columns pixel by
+        pixel, the row of the last default pixel at or above every row is
+        computed once for the columns which have vertical lines.
+        '''
         if max_vertical[1] > max_vertical[2]:
             min_vertical_index = 2
         else:
             min_vertical_index = 1
-        if not type(lines).__module__ == "numpy":
+        vertical_lines = line_geometry.vertical
+        if not len(vertical_lines):
             return max_vertical
-        for line in lines:
-            for x1, y1, x2, y2 in line:
-                if x1 == x2:
-                    while(self.image_object[y2, x2].tolist() != DEFAULT_PIXEL_COLOR and y2 > 0):
-                        y2 -= 1
-                    if y2 < max_vertical[min_vertical_index]:
-                        max_vertical[min_vertical_index] = y2
+        column_indices, line_column_indices = numpy.unique(vertical_lines[:, 2],
+                                                           return_inverse=True)
+        columns = self.image_object[:, column_indices]
+        if len(columns.shape) == 3:
+            is_default_pixel = (columns == DEFAULT_PIXEL_COLOR).all(axis=2)
+        else:
+            is_default_pixel = columns == DEFAULT_PIXEL_COLOR[0]
+        row_indices = numpy.arange(columns.shape[0]).reshape(-1, 1)
+        last_default_rows = numpy.maximum.accumulate(numpy.where(is_default_pixel,
+                                                                 row_indices, 0),
+                                                     axis=0)
+        line_top = int(last_default_rows[vertical_lines[:, 3],
+                                         line_column_indices].min())
+        if line_top < max_vertical[min_vertical_index]:
+            max_vertical[min_vertical_index] = line_top
         return max_vertical
 
-    def get_horizontal_base_line(self, lines):
+    def get_horizontal_base_line(self, line_geometry):
         '''Gives vertical coordinate of horizontal base line(aka header line)
         '''
-        horizontal_base_line = 0
-        for line in lines:
-            for x1, y1, x2, y2 in line:
-                if y1 == y2 and (horizontal_base_line == 0 or horizontal_base_line > y1):
-                    horizontal_base_line = y1 + BUFFER_LENGTH
-        return horizontal_base_line
+        return line_geometry.get_horizontal_base_line()
 
     def get_table_bounds(self):
         '''
         Get best possible table bounds
         '''
         table_bounds = None
-        image_gray = cv2.cvtColor(self.image_object, cv2.COLOR_BGR2GRAY)
+        image_gray = self.get_gray_image()
         temp_image, contours, hierarchy = cv2.findContours(image_gray,
                                                            cv2.RETR_LIST,
                                                            cv2.CHAIN_APPROX_SIMPLE)
+        self.metrics.add_counter("contours", len(contours))
         best_match_contour_index = None
         max_contour_size = 0
         count = 0
@@ -357,38 +999,31 @@ class PDF2CSV(object):
                             "left": x*self.horizontal_ratio,
                             "bottom": (h+y)*self.vertical_ratio,
                             "right": (w+x)*self.horizontal_ratio}
-            cv2.imwrite(self.temp_img_file, self.image_object)
+            self.write_debug_image()
         return table_bounds
 
+    def write_debug_image(self):
+        '''Write the page image to the temp image file if debugging is on
+        '''
+        if self.debug_artifacts:
+            cv2.imwrite(self.temp_img_file, self.image_object)
+
     def process_csv_file(self, out_csv_filepath):
         '''Deletes empty rows and columns from table
         '''
         table = []
-        empty_columns = []
-        total_col_count = 0
-        is_row_len_consistent = True
+        column_stats = ColumnStats()
         with open(self.temp_csv_file, 'rb') as in_csv_file:
             csv_reader = csv.reader(in_csv_file, delimiter=',')
             for row in csv_reader:
                 if ''.join(row).strip():
                     table.append(row)
-                    if total_col_count == 0:
-                        total_col_count = len(row)
-                    elif total_col_count != len(row):
-                        is_row_len_consistent = False
-        if is_row_len_consistent:
-            for col_count in range(len(table[0])):
-                total_col_val = ""
-                for row_count in range(len(table)):
-                    total_col_val += table[row_count][col_count]
-                if not total_col_val.strip():
-                    empty_columns.append(col_count)
-        for row in table:
-            num = 0
-            for col_count in empty_columns:
-                row.pop(col_count-num)
-                num += 1
-        table = self.modify_table_data(table)
+                    column_stats.add_row(row)
+        if column_stats.is_row_len_consistent:
+            delete_columns(table, column_stats.get_empty_columns())
+        self.metrics.add_counter("rows", len(table))
+        with self.metrics.stage("modify_table_data"):
+            table = self.modify_table_data(table)
         if not table:
             return
         out_csv_file = open(out_csv_filepath, "wb")
@@ -402,19 +1037,8 @@ class PDF2CSV(object):
         '''
         Deletes empty columns generated from Tabula
         '''
-        empty_columns = []
-        for col_count in range(len(table[0])):
-            total_col_val = ""
-            for row_count in range(len(table)):
-                total_col_val += table[row_count][col_count]
-            if not total_col_val.strip():
-                empty_columns.append(col_count)
-        for row in table:
-            num = 0
-            for col_count in empty_columns:
-                row.pop(col_count-num)
-                num += 1
-        return table
+        column_stats = ColumnStats(table)
+        return delete_columns(table, column_stats.get_empty_columns())
 
     def modify_image(self, lines, table_limits):
         '''
@@ -440,18 +1064,31 @@ class PDF2CSV(object):
         Returns:
             A string with the extension
         '''
-        # Load the configuration file
+        return self.get_parser_config().get('tabula', 'command')
+
+    def get_parser_config(self):
+        '''Load the parsers configuration file
+
+        Returns:
+            A RawConfigParser object with the configuration
+        '''
         with open('parsers/parsers_config.ini') as f:
             parser_config = f.read()
         PARSER_CONFIG = ConfigParser.RawConfigParser(allow_no_value=True)
         PARSER_CONFIG.readfp(io.BytesIO(parser_config))
-        return PARSER_CONFIG.get('tabula', 'command')
+        return PARSER_CONFIG
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Extracts CSV file from single table PDF document(A4)")
     parser.add_argument("--header", help="Use if file consists of a page header(& we need to skip it)")
     parser.add_argument("--columns", help="Identify columns and then parse")
     parser.add_argument("--rotate", help="If no table is identified then algo will rotate and try again")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to parse pages in parallel")
+    parser.add_argument("--density", type=int, default=DEFAULT_DENSITY, help="DPI at which pages are rendered for line detection")
+    parser.add_argument("--grayscale", action="store_true", help="Render pages as grayscale images")
+    parser.add_argument("--debug_artifacts", action="store_true", help="Keep the temp files, including page images with detected table lines and bounds")
+    parser.add_argument("--vector", action="store_true", help="Detect tables from the lines drawn in the PDF before rendering pages")
+    parser.add_argument("--metrics_file", help="JSON lines file to append per page stage timings and a document summary to")
     parser.add_argument("input_file", help="Input PDF filepath")
     parser.add_argument("output_file", help="Output CSV filepath")
     args = parser.parse_args()
@@ -459,4 +1096,4 @@ if __name__ == '__main__':
     if not args.input_file or not args.output_file:
         print("Please pass input and output filepaths")
     else:
-        obj.generate_csv_file(args.input_file, args.output_file, is_header=args.header, identify_columns=args.columns, check_page_rotation=args.rotate)
+        obj.generate_csv_file(args.input_file, args.output_file, is_header=args.header, identify_columns=args.columns, check_page_rotation=args.rotate, workers=args.workers, density=args.density, grayscale=args.grayscale, debug_artifacts=args.debug_artifacts, vector_detection=args.vector, metrics_filepath=args.metrics_file)
@@ -0,0 +1,158 @@
+'Class for recording stage level timings and counters of the PDF to CSV pipeline'
+
+from contextlib import contextmanager
+import json
+import logging
+import resource
+import time
+
+logger = logging.getLogger()
+SUMMARY_STAGE = "summary"
+SLOWEST_PAGES_COUNT = 5
+
+
+def get_cpu_times():
+    '''Get CPU time(user + system) used by this process and its waited for
+    children
+    '''
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (self_usage.ru_utime + self_usage.ru_stime,
+            children_usage.ru_utime + children_usage.ru_stime)
+
+
+def get_max_rss():
+    '''Get the peak resident set size of this process in kilobytes
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class PipelineMetrics(object):
+    """
+    Record wall time, CPU time and peak RSS of pipeline stages per page.
+
+    Every stage produces a record with the counters added while it was open,
+    like the number of Hough segments or contours found on a page. Records
+    are written to a JSON lines file followed by a summary of the document.
+    When disabled, stages are not timed and nothing is recorded.
+
+    Usage:
+        with metrics.stage("straight_lines", page_num):
+            lines = get_straight_lines()
+            metrics.add_counter("hough_segments", len(lines))
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.document = None
+        self.records = []
+        self.open_records = []
+
+    def start_document(self, document):
+        '''Drop the records of the previous document
+        '''
+        self.document = document
+        self.records = []
+        self.open_records = []
+
+    @contextmanager
+    def stage(self, stage_name, page_num=None):
+        '''Time the enclosed block as a stage of a page, or of the document
+        if no page number is given
+        '''
+        if not self.enabled:
+            yield
+            return
+        record = {"document": self.document, "stage": stage_name,
+                  "page_num": page_num, "counters": {}}
+        self.open_records.append(record)
+        start_wall_time = time.time()
+        start_cpu_time, start_child_cpu_time = get_cpu_times()
+        try:
+            yield
+        finally:
+            end_cpu_time, end_child_cpu_time = get_cpu_times()
+            record["wall_time"] = time.time() - start_wall_time
+            record["cpu_time"] = end_cpu_time - start_cpu_time
+            record["child_cpu_time"] = end_child_cpu_time - start_child_cpu_time
+            record["max_rss_kb"] = get_max_rss()
+            self.open_records.remove(record)
+            self.records.append(record)
+
+    def iter_stage(self, stage_name, page_items):
+        '''Time the production of every item of an iterable of
+        (page_num, ...) tuples, like the images of a render process
+        '''
+        page_items = iter(page_items)
+        while True:
+            with self.stage(stage_name):
+                try:
+                    page_item = next(page_items)
+                except StopIteration:
+                    page_item = None
+                if self.enabled and page_item:
+                    self.open_records[-1]["page_num"] = page_item[0]
+            if page_item is None:
+                if self.enabled:
+                    self.records.pop()
+                return
+            yield page_item
+
+    def add_counter(self, counter_name, value):
+        '''Add a counter to the innermost open stage
+        '''
+        if not (self.enabled and self.open_records):
+            return
+        counters = self.open_records[-1]["counters"]
+        counters[counter_name] = counters.get(counter_name, 0) + value
+
+    def extend(self, records):
+        '''Add records collected in another process
+        '''
+        if self.enabled:
+            self.records.extend(records)
+
+    def get_summary(self):
+        '''Summarize the records of the document.
+
+        Returns:
+            A dict with the calls, wall time and CPU time of every stage,
+            the peak RSS and the slowest pages by wall time.
+        '''
+        stages = {}
+        page_wall_times = {}
+        for record in self.records:
+            stage_summary = stages.setdefault(record["stage"],
+                                              {"calls": 0, "wall_time": 0.0,
+                                               "cpu_time": 0.0,
+                                               "child_cpu_time": 0.0,
+                                               "counters": {}})
+            stage_summary["calls"] += 1
+            for time_key in ("wall_time", "cpu_time", "child_cpu_time"):
+                stage_summary[time_key] += record[time_key]
+            for counter_name, value in record["counters"].items():
+                stage_summary["counters"][counter_name] = stage_summary["counters"].get(counter_name, 0) + value
+            if record["page_num"] is not None:
+                page_wall_times[record["page_num"]] = page_wall_times.get(record["page_num"], 0.0) + record["wall_time"]
+        slowest_pages = sorted(page_wall_times.items(), key=lambda page_item: page_item[1],
+                               reverse=True)[:SLOWEST_PAGES_COUNT]
+        return {"document": self.document, "stage": SUMMARY_STAGE,
+                "pages": len(page_wall_times), "stages": stages,
+                "max_rss_kb": max([record["max_rss_kb"] for record in self.records] or [0]),
+                "slowest_pages": [{"page_num": page_num, "wall_time": wall_time}
+                                  for page_num, wall_time in slowest_pages]}
+
+    def write_json_lines(self, metrics_filepath):
+        '''Append the records and the summary of the document to a JSON
+        lines file
+        '''
+        if not self.enabled:
+            return
+        summary = self.get_summary()
+        with open(metrics_filepath, "a") as metrics_file:
+            for record in self.records + [summary]:
+                metrics_file.write(json.dumps(record, sort_keys=True) + "\n")
+        for stage_name, stage_summary in sorted(summary["stages"].items()):
+            logger.info("%s: %s calls, %.3fs wall, %.3fs cpu" % (stage_name,
+                                                              stage_summary["calls"],
+                                                              stage_summary["wall_time"],
+                                                              stage_summary["cpu_time"]))
@@ -1,10 +1,10 @@
 '''The execution script to convert a folder of ddg pdfs to ddg csvs
 '''
 import os
-import subprocess
 import argparse
 import cv2
 import pandas as pd
+from parsers.page_renderer import PageRenderer
 from image_to_block_feature_generator import (BlockTextualFeatureGenerator,
                                               filter_unwanted_blocks,
                                               separate_blocks)
@@ -39,14 +39,10 @@ def get_page_width_height(pdf, page_num):
     return page_width, page_height
 
 
-def get_page_image_from_pdf(pdf_file_path, page_num, image_file_name):
-    '''Extract pdf page as image.
+def get_page_image_from_pdf(pdf_file_path, page_num):
+    '''Extract pdf page as grayscale image.
     '''
-    command = 'convert -density 300 "%s"[%s] "%s"' % (pdf_file_path,
-                                                      page_num,
-                                                      image_file_name)
-    subprocess.check_output(command, shell=True)
-    return cv2.imread(image_file_name, 0)
+    return PageRenderer(grayscale=True).get_page_image(pdf_file_path, page_num)
 
 def check_and_create_folder(path):
     '''Check if the folder exists, if not create it.
@@ -79,9 +75,15 @@ def process_folder(input_folder_path, output_folder_path):
         num_pages = pdf.getNumPages()
         # skip first 2 pages to skip the index
         # TODO: move this to config.
-        for page_num in range(2, num_pages):
+        if num_pages <= 2:
+            continue
+        page_images = PageRenderer(grayscale=True).iter_page_images(pdf_file_path,
+                                                                    2,
+                                                                    num_pages - 1)
+        for page_num, img_page in page_images:
+            if img_page is None:
+                continue
             page_width, page_height = get_page_width_height(pdf, page_num)
-            img_page = get_page_image_from_pdf(pdf_file_path, page_num, 'tmp.png')
             image_height, image_width = img_page.shape
             horizontal_ratio = page_width / image_width
             vertical_ratio = page_height / image_height
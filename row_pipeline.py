@@ -0,0 +1,44 @@
+'Class for running table transformations as a chain of row stages'
+
+
+def table_stage(table_function):
+    '''Wrap a function transforming a table given as a list of rows into a
+    stage, for rules that reach back an unbounded number of rows
+    '''
+    def run_table_stage(rows):
+        for row in table_function(list(rows)):
+            yield row
+    return run_table_stage
+
+
+class RowPipeline(object):
+    """
+    Transform the rows of a table with a chain of stages in a single pass.
+
+    A stage is a callable taking an iterator of rows and returning an
+    iterator of rows, usually a generator keeping the few rows of look-behind
+    it needs as local state. Rows are pulled through all stages one after
+    another, so the rules of consecutive stages are applied to a row before
+    the next row is read. Stages wrapped with `table_stage` see the table as
+    a list and hold back the rows until all of them have been read.
+
+    Usage:
+        table = RowPipeline([self.strip_rows,
+                             table_stage(self.delete_duplicate_rows)]).run(table)
+    """
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+
+    def add_stage(self, stage):
+        self.stages.append(stage)
+
+    def run(self, rows):
+        '''Run the rows through all stages.
+
+        Returns:
+            The list of transformed rows.
+        '''
+        rows = iter(rows)
+        for stage in self.stages:
+            rows = stage(rows)
+        return list(rows)
@@ -0,0 +1,157 @@
+'Batch CSV generation for directories of Karnataka Budget PDF volumes'
+
+import argparse
+import glob
+import logging
+from logging.config import fileConfig
+import multiprocessing
+import os
+import re
+import sys
+import time
+from parsers.document_session import PDFDocumentSession
+from parsers.state_budget.karnataka.karnataka_budget_csv_generator import KarnatakaBudgetCSVGenerator
+from parsers.state_budget.karnataka.karnataka_receipts_budget_csv_generator import KarnatakaReceiptsBudgetCSViGenerator
+
+fileConfig('parsers/logging_config.ini')
+logger = logging.getLogger()
+RECEIPTS_FILENAME_REGEX = re.compile(r"receipt", re.IGNORECASE)
+
+
+def get_volume_generator(input_file):
+    '''Get the generator for a volume, the receipts generator for volumes
+    with receipt in their file name and the expenditure one for all others
+    '''
+    if RECEIPTS_FILENAME_REGEX.search(os.path.basename(input_file)):
+        return KarnatakaReceiptsBudgetCSViGenerator()
+    return KarnatakaBudgetCSVGenerator()
+
+
+def get_written_csv_files(output_dir, start_time):
+    '''Get the CSV files of a directory modified since a conversion started,
+    with the start time truncated to the second for file systems storing
+    whole seconds
+    '''
+    return [csv_file for csv_file in glob.glob(os.path.join(output_dir, "*.csv"))
+            if os.path.getmtime(csv_file) >= int(start_time)]
+
+
+def generate_volume_csv_worker(volume_task):
+    '''Convert a single volume in a worker process.
+
+    Pages of the volume are converted serially, as processes of a pool can
+    not start a pool of their own. The document session the page count is
+    read from is passed on to the generator, so that the volume is parsed
+    once. Some stages of the generators log their errors instead of raising
+    them, so a volume without any CSV file written by this conversion is
+    reported as failed as well, CSV files left in the output directory by an
+    earlier run are not counted.
+
+    Returns:
+        (input_file, page_count, wall_time, error_message) tuple, the error
+        message is None if the volume was converted.
+    '''
+    input_file, output_dir = volume_task
+    start_time = time.time()
+    page_count = 0
+    error_message = None
+    try:
+        with PDFDocumentSession(input_file) as document_session:
+            page_count = document_session.get_page_count()
+            get_volume_generator(input_file).generate_karnataka_budget_csv(input_file, output_dir,
+                                                                           document_session=document_session)
+        if not get_written_csv_files(output_dir, start_time):
+            error_message = "No CSV files written"
+    except Exception, error:
+        logger.error("Unable to convert volume %s" % input_file, exc_info=True)
+        error_message = repr(error)
+    return input_file, page_count, time.time() - start_time, error_message
+
+
+class KarnatakaBatchCSVGenerator(object):
+    """
+    Convert every Karnataka Budget volume of a directory.
+
+    Expenditure and receipts volumes are told apart by their file names, and
+    the per head CSV files of every volume are written to a directory of the
+    output directory named after the volume. Volumes are converted
+    concurrently by a bounded pool of processes, and a failing volume does
+    not stop the others.
+
+    Usage:
+        results = KarnatakaBatchCSVGenerator(workers=4).generate_batch_csv(input_dir, output_dir)
+    """
+    def __init__(self, workers=1):
+        self.workers = workers
+
+    def get_volume_tasks(self, input_dir, output_dir):
+        volume_tasks = []
+        for input_file in sorted(glob.glob(os.path.join(input_dir, "*.pdf"))):
+            volume_name = os.path.splitext(os.path.basename(input_file))[0]
+            volume_tasks.append((input_file, os.path.join(output_dir, volume_name)))
+        return volume_tasks
+
+    def generate_volume_results(self, volume_tasks):
+        '''Convert volumes, in a pool of processes if more than one worker
+        is requested.
+
+        Yields:
+            The result tuples of `generate_volume_csv_worker` in the order
+            the volumes finish.
+        '''
+        if self.workers <= 1 or len(volume_tasks) <= 1:
+            for volume_task in volume_tasks:
+                yield generate_volume_csv_worker(volume_task)
+            return
+        pool = multiprocessing.Pool(min(self.workers, len(volume_tasks)))
+        try:
+            for volume_result in pool.imap_unordered(generate_volume_csv_worker, volume_tasks):
+                yield volume_result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def generate_batch_csv(self, input_dir, output_dir):
+        '''Convert all volumes of a directory and report the throughput and
+        the volumes that failed.
+
+        Args:
+            - input_dir (string): Directory of the PDF volumes.
+            - output_dir (string): Directory to write a directory of CSV
+                files per volume to.
+
+        Returns:
+            A list of the result tuples of all volumes.
+        '''
+        volume_tasks = self.get_volume_tasks(input_dir, output_dir)
+        if not volume_tasks:
+            logger.error("No PDF volumes found in %s" % input_dir)
+            return []
+        start_time = time.time()
+        volume_results = []
+        for input_file, page_count, wall_time, error_message in self.generate_volume_results(volume_tasks):
+            logger.info("Finished volume %s, %s pages in %.1f seconds" % (input_file, page_count, wall_time))
+            volume_results.append((input_file, page_count, wall_time, error_message))
+        self.log_report(volume_results, time.time() - start_time)
+        return volume_results
+
+    def log_report(self, volume_results, wall_time):
+        failed_results = [volume_result for volume_result in volume_results if volume_result[3]]
+        page_count = sum(volume_result[1] for volume_result in volume_results
+                         if not volume_result[3])
+        logger.info("Converted %s of %s volumes, %s pages in %.1f seconds (%.2f pages/sec)" % (
+                    len(volume_results) - len(failed_results), len(volume_results), page_count,
+                    wall_time, page_count / wall_time if wall_time else 0.0))
+        for input_file, page_count, volume_wall_time, error_message in failed_results:
+            logger.error("Failed volume %s: %s" % (input_file, error_message))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates CSV files from a directory of Karnataka State Budget PDF volumes")
+    parser.add_argument("input_dir", help="Input directory of budget volumes")
+    parser.add_argument("output_dir", help="Output directory, with a directory per volume")
+    parser.add_argument("--workers", type=int, default=1, help="Number of volumes converted in parallel")
+    args = parser.parse_args()
+    results = KarnatakaBatchCSVGenerator(workers=args.workers).generate_batch_csv(args.input_dir, args.output_dir)
+    if not results or any(result[3] for result in results):
+        sys.exit(1)
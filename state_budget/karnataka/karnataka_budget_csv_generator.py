@@ -1,21 +1,53 @@
 'CSV generator for Karnataka Budget PDFs'
 
 import argparse
-import csv
 import logging
 from logging.config import fileConfig
 import re
 import os
+import string
+from parsers.csv_file_pool import CSVFilePool
 from parsers.pdf_to_csv import PDF2CSV
 from parsers.keywords_extractor import KeywordsExtractor
+from parsers.table_utils import delete_rows
 fileConfig('parsers/logging_config.ini')
 logger = logging.getLogger()
 
+GLYPH_BYTES = '\xe2\x80'
+GLYPH_WORD = 'vjU'
+GLYPH_TRANSLATE_TABLE = string.maketrans('\x90', '-')
+# bytes `string-escape` writes as \xhh, and backslashes followed by x which
+# it writes as \\x, in either case leaving '\x' in the escaped value
+ESCAPED_BYTES_REGEX = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]|\\x')
+MULTIPLE_SPACES_REGEX = re.compile(r"\s{2,}")
+CLEAR_TOKEN_CHARS_REGEX = re.compile(r"[a-zA-Z0-9\.\(\)\&\-\+]")
+
+
+def clean_cell_value(val):
+    '''Strip the Windows-1252 encoded Kannada glyphs from a cell value.
+
+    Of a value with glyph bytes left only its trailing run of clear tokens is
+    kept, that is words of ASCII letters, digits and punctuation, starting no
+    earlier than its second word.
+    '''
+    val = val.replace(GLYPH_WORD, '').translate(GLYPH_TRANSLATE_TABLE, GLYPH_BYTES)
+    if ESCAPED_BYTES_REGEX.search(val):
+        if not " " in val:
+            return ""
+        val_list = MULTIPLE_SPACES_REGEX.sub(" ", val).split(" ")
+        clear_index = len(val_list)
+        while clear_index > 0 and not ESCAPED_BYTES_REGEX.search(val_list[clear_index-1]) and CLEAR_TOKEN_CHARS_REGEX.search(val_list[clear_index-1]):
+            clear_index -= 1
+        if clear_index == len(val_list):
+            return ""
+        val = " ".join(val_list[max(clear_index, 1):])
+    return val.strip()
+
 
 class KarnatakaBudgetCSVGenerator(PDF2CSV):
     def __init__(self):
         super(KarnatakaBudgetCSVGenerator, self).__init__()
-        self.keywords_extractor = KeywordsExtractor()
+        self.keywords_extractor = KeywordsExtractor(index_pages=True)
         self.min_col_count = 8
         self.max_col_count = 10
         self.currency_slug = "(Rs. in Lakhs)"
@@ -23,14 +55,16 @@ class KarnatakaBudgetCSVGenerator(PDF2CSV):
         self.parent_scheme_regex = r"([A-Z]+\.|\([a-z]+\)|\d{4,}|^[MDCLXVI]+ |^Total)"
         self.voted_charged_column = True
 
-    def generate_karnataka_budget_csv(self, input_file, output_dir):
+    def generate_karnataka_budget_csv(self, input_file, output_dir, workers=1,
+                                      document_session=None):
         '''
         Main call comes here setting global variable and calling PDF to CSV
         '''
         self.input_file = input_file
         self.output_dir = output_dir
         self.generate_csv_file(input_file, input_file.split(".pdf")[0] + ".csv",
-                               is_header=True, identify_columns=True)
+                               is_header=True, identify_columns=True,
+                               workers=workers, document_session=document_session)
 
     def modify_table_data(self, table):
         '''
@@ -94,34 +128,20 @@ class KarnatakaBudgetCSVGenerator(PDF2CSV):
         '''
         Cleansing pagewise tables to remove Kannada chars(Windows-1252 encoded)
         '''
+        cleaned_values = {}
         for page_num in pagewise_table:
             page_table = pagewise_table[page_num]
-            unwanted_row_indices = {}
+            unwanted_row_indices = []
             for row_index in range(len(page_table)):
-                for col_index in range(len(page_table[row_index])):
-                    val = page_table[row_index][col_index]
-                    val = re.sub(r'(\xe2|\x80|vjU)', '', val).replace('\x90', '-')
-                    if '\\x' in val.encode('string-escape'):
-                        if " " in val:
-                            val = re.sub(r"\s{2,}", " ", val)
-                            val_list = val.split(" ")
-                            clear_index = 0
-                            for val_index in range(len(val_list)):
-                                if not '\\x' in val_list[val_index].encode('string-escape') and re.findall(r"[a-zA-Z0-9\.\(\)\&\-\+]{1,}", val_list[val_index]):
-                                    if clear_index == 0:
-                                        clear_index = val_index
-                                else:
-                                    clear_index = 0
-                            if clear_index > 0:
-                                val =  " ".join(val.split(" ")[clear_index:])
-                            else:
-                                val = ""
-                        else:
-                            val = ""
-                    page_table[row_index][col_index] = val.strip()
-                if not "".join(page_table[row_index]).strip():
-                    unwanted_row_indices[row_index] = True
-            self.delete_unwanted_rows(unwanted_row_indices.keys(), page_table)
+                row = page_table[row_index]
+                for col_index in range(len(row)):
+                    val = row[col_index]
+                    if val not in cleaned_values:
+                        cleaned_values[val] = clean_cell_value(val)
+                    row[col_index] = cleaned_values[val]
+                if not "".join(row).strip():
+                    unwanted_row_indices.append(row_index)
+            self.delete_unwanted_rows(unwanted_row_indices, page_table)
         return pagewise_table
 
     def correct_column_count(self,row_index, page_table):
@@ -192,18 +212,14 @@ class KarnatakaBudgetCSVGenerator(PDF2CSV):
     def delete_unwanted_rows(self, unwanted_row_indices, page_table):
         '''Deleting unwanted row indices from page tables
         '''
-        unwanted_row_indices.sort()
-        num = 0
-        for row_index in unwanted_row_indices:
-            page_table.pop(row_index-num)
-            num += 1
+        delete_rows(page_table, unwanted_row_indices)
 
     def generate_page_headers_map(self, pagewise_table):
         '''Generating pagewise headers for tables
         '''
         page_headers_map = {}
         for page_num in pagewise_table:
-            keyword_list = self.keywords_extractor.get_bold_text_phrases(self.input_file, keyword_xpath="//text()", is_other_starting_phrases=True, single_word=True, page_num=page_num, lower_case=False)
+            keyword_list = self.keywords_extractor.get_bold_text_phrases(self.input_file, keyword_xpath="//text()", is_other_starting_phrases=True, single_word=True, page_num=page_num, lower_case=False, document_session=self.document_session)
             page_header = []
             for keyword_index in range(len(keyword_list)):
                 keyword = keyword_list[keyword_index]
@@ -219,51 +235,74 @@ class KarnatakaBudgetCSVGenerator(PDF2CSV):
             page_headers_map[page_num] = "|".join(page_header[:3])
         return page_headers_map
 
-    def write_page_table(self, file_name, file_table):
-        '''Creating new file and writing file table in it
+    def get_page_table_filepath(self, file_name):
+        '''Getting CSV filepath of a head from its page header
         '''
         file_name = file_name.split("|")[2].strip() + "|" + file_name.split("|")[1].strip()
         file_name = file_name.replace("/", "|")
-        out_csv_file = open(self.output_dir + "/" + file_name + ".csv", "wb")
-        csv_writer = csv.writer(out_csv_file, delimiter=',')
-        for row in file_table:
-            csv_writer.writerow(row)
-        out_csv_file.close()
+        return self.output_dir + "/" + file_name + ".csv"
+
+    def write_file_rows(self, csv_file_pool, file_name, file_filepath, file_rows):
+        '''Writing rows of a head, creating its file for the first rows
+        written since the head started.
+
+        Returns:
+            The filepath of the file of the head.
+        '''
+        if not file_filepath:
+            file_filepath = self.get_page_table_filepath(file_name)
+            csv_file_pool.create(file_filepath)
+        csv_file_pool.writerows(file_filepath, file_rows)
+        return file_filepath
 
     def generate_pagewise_csv_files(self, pagewise_table, pagewise_headers):
-        '''Generating pagewise CSV files
+        '''Generating CSV files of heads, writing the rows of every page once
+        the page is merged into the table of its head, in page order.
+
+        The last row of a head is held back, as the first row of the next page
+        of the same head can continue it. Rows of pages before the first page
+        header are held back until the header is known.
         '''
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
         file_name = ""
-        file_table = []
-        for page_num in pagewise_table:
-            if file_name and file_name != pagewise_headers[page_num]:
-                self.write_page_table(file_name, file_table)
-                file_table = pagewise_table[page_num]
-                file_name = pagewise_headers[page_num]
-            else:
-                if not file_name:
-                    file_table += pagewise_table[page_num]
-                elif len(pagewise_table[page_num]) <= 1:
-                    continue
+        file_filepath = None
+        pending_rows = []
+        with CSVFilePool() as csv_file_pool:
+            for page_num in sorted(pagewise_table):
+                page_table = pagewise_table[page_num]
+                if file_name and file_name != pagewise_headers[page_num]:
+                    self.write_file_rows(csv_file_pool, file_name, file_filepath, pending_rows)
+                    file_filepath = None
+                    pending_rows = list(page_table)
+                    file_name = pagewise_headers[page_num]
                 else:
-                    if re.match(self.parent_scheme_regex, pagewise_table[page_num][1][1]) or pagewise_table[page_num][1][0]:
-                        file_table += pagewise_table[page_num][1:]
-                    elif not "".join(pagewise_table[page_num][1][2:]):
-                        file_table[-1][1] += " " + pagewise_table[page_num][1][1]
-                        file_table += pagewise_table[page_num][2:]
-                file_name = pagewise_headers[page_num]
-        if file_table:
-            self.write_page_table(file_name, file_table)
+                    if not file_name:
+                        pending_rows += page_table
+                    elif len(page_table) <= 1:
+                        continue
+                    else:
+                        if re.match(self.parent_scheme_regex, page_table[1][1]) or page_table[1][0]:
+                            pending_rows += page_table[1:]
+                        elif not "".join(page_table[1][2:]):
+                            pending_rows[-1][1] += " " + page_table[1][1]
+                            pending_rows += page_table[2:]
+                    file_name = pagewise_headers[page_num]
+                if file_name and len(pending_rows) > 1:
+                    file_filepath = self.write_file_rows(csv_file_pool, file_name, file_filepath,
+                                                         pending_rows[:-1])
+                    pending_rows = pending_rows[-1:]
+            if pending_rows:
+                self.write_file_rows(csv_file_pool, file_name, file_filepath, pending_rows)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Generates CSV files from Karnataka State Budget PDF Document")
     parser.add_argument("input_file", help="Input filepath for budget document")
     parser.add_argument("output_dir", help="Output directory for budget document")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to parse pages in parallel")
     args = parser.parse_args()
     obj = KarnatakaBudgetCSVGenerator()
     if not args.input_file or not args.output_dir:
         print("Please input directory to begin CSV extraction")
     else:
-        obj.generate_karnataka_budget_csv(args.input_file, args.output_dir)
+        obj.generate_karnataka_budget_csv(args.input_file, args.output_dir, workers=args.workers)
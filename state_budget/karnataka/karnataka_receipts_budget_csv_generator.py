@@ -72,7 +72,7 @@ class KarnatakaReceiptsBudgetCSViGenerator(KarnatakaBudgetCSVGenerator):
         pagewise_keywords = {}
         page_headers_map = {}
         for page_num in pagewise_table:
-            keyword_list = self.keywords_extractor.get_bold_text_phrases(self.input_file, keyword_xpath="//text()", is_other_starting_phrases=True, single_word=True, page_num=page_num, lower_case=False)
+            keyword_list = self.keywords_extractor.get_bold_text_phrases(self.input_file, keyword_xpath="//text()", is_other_starting_phrases=True, single_word=True, page_num=page_num, lower_case=False, document_session=self.document_session)
             page_header = []
             for keyword in keyword_list:
                 keyword = re.sub(self.empty_char_regex, '', keyword).replace('\x90', '-')
@@ -91,9 +91,10 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Generates CSV files from Karnataka Receipts State Budget PDF Document")
     parser.add_argument("input_file", help="Input filepath for budget document")
     parser.add_argument("output_dir", help="Output directory for budget document")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to parse pages in parallel")
     args = parser.parse_args()
     obj = KarnatakaReceiptsBudgetCSViGenerator()
     if not args.input_file or not args.output_dir: 
         print("Please input directory to begin CSV extraction")
     else:
-        obj.generate_karnataka_budget_csv(args.input_file, args.output_dir)    
+        obj.generate_karnataka_budget_csv(args.input_file, args.output_dir, workers=args.workers)    
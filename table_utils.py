@@ -0,0 +1,115 @@
+'Functions and classes for working with tables held as lists of rows'
+
+
+def get_deleted_row_indices(row_indices):
+    '''Get the rows deleted by popping rows one after another at their index
+    less the number of rows popped before them.
+
+    Indices are popped in ascending order. A repeated index pops the closest
+    row before it that is still in the table, the way popping it a second
+    time did.
+
+    Args:
+        - row_indices (list): Indices of the rows in the table.
+
+    Returns:
+        A set of the indices of the deleted rows.
+    '''
+    deleted_row_indices = set()
+    for row_index in sorted(row_indices):
+        while row_index in deleted_row_indices:
+            row_index -= 1
+        deleted_row_indices.add(row_index)
+    return deleted_row_indices
+
+
+def delete_rows(table, row_indices):
+    '''Delete rows from a table in place, in a single pass over the table.
+
+    Args:
+        - table (list): List of rows.
+        - row_indices (list): Indices of the rows to delete, see
+            `get_deleted_row_indices` for repeated indices.
+
+    Returns:
+        The table.
+    '''
+    row_indices = sorted(row_indices)
+    if not row_indices:
+        return table
+    if any(row_index < num for num, row_index in enumerate(row_indices)):
+        # the first row was repeated, which popped rows from the end
+        for num, row_index in enumerate(row_indices):
+            table.pop(row_index-num)
+        return table
+    if row_indices[-1] >= len(table):
+        raise IndexError("pop index out of range")
+    deleted_row_indices = get_deleted_row_indices(row_indices)
+    table[:] = [row for row_index, row in enumerate(table) if row_index not in deleted_row_indices]
+    return table
+
+
+def delete_columns(table, col_indices):
+    '''Delete columns from every row of a table in place, in a single pass
+    over every row.
+
+    Args:
+        - table (list): List of rows.
+        - col_indices (list): Indices of the columns to delete.
+
+    Returns:
+        The table.
+    '''
+    deleted_col_indices = set(col_indices)
+    if not deleted_col_indices:
+        return table
+    last_col_index = max(deleted_col_indices)
+    for row in table:
+        if last_col_index >= len(row):
+            raise IndexError("pop index out of range")
+        row[:] = [value for col_index, value in enumerate(row) if col_index not in deleted_col_indices]
+    return table
+
+
+class ColumnStats(object):
+    """
+    Statistics of the columns of a table, collected in a single sweep over
+    its rows.
+
+    Rows can be added while a table is read, keeping only a count of filled
+    cells per column, instead of joining the values of every column into a
+    string to check it for emptiness. Cells are taken as filled if anything
+    but whitespace is left in them.
+
+    Usage:
+        column_stats = ColumnStats(table)
+        if column_stats.is_row_len_consistent:
+            delete_columns(table, column_stats.get_empty_columns())
+    """
+    def __init__(self, rows=()):
+        self.row_count = 0
+        self.col_count = 0
+        self.is_row_len_consistent = True
+        self.filled_counts = []
+        for row in rows:
+            self.add_row(row)
+
+    def add_row(self, row):
+        if not self.row_count:
+            self.col_count = len(row)
+        elif self.col_count != len(row):
+            self.is_row_len_consistent = False
+        self.row_count += 1
+        if len(row) > len(self.filled_counts):
+            self.filled_counts += [0] * (len(row) - len(self.filled_counts))
+        for col_index, value in enumerate(row):
+            if value.strip():
+                self.filled_counts[col_index] += 1
+
+    def get_empty_columns(self):
+        '''Get the indices of the columns of the first row without a filled
+        cell in any row
+        '''
+        return [col_index for col_index in range(self.col_count)
+                if not self.filled_counts[col_index]]
+
@@ -0,0 +1,175 @@
+'Long lived tabula process for extracting tables from many pages'
+
+import json
+import logging
+import os
+import subprocess
+import sys
+
+logger = logging.getLogger()
+READY_HANDLE = "READY"
+RESPONSE_OK = "OK"
+RESPONSE_ERROR = "ERROR"
+TABULA_CLASS = "technology.tabula.CommandLineApp"
+CLI_PARSER_CLASS = "org.apache.commons.cli.DefaultParser"
+
+
+class TabulaWorkerError(Exception):
+    """
+    Raised when the tabula worker process can not serve requests.
+    """
+    pass
+
+
+def get_tabula_arguments(table_request):
+    '''Build tabula command line arguments for a table request.
+
+    Args:
+        table_request (dict): Request with the keys `pdf`, `page`(1 based),
+            `area`(top, left, bottom, right) and `columns`(None to let
+            tabula guess them).
+
+    Returns:
+        A list of tabula command line arguments.
+    '''
+    arguments = ["--pages", str(table_request["page"]),
+                 "--area", ",".join(str(value) for value in table_request["area"])]
+    if table_request["columns"]:
+        arguments += ["--columns",
+                      ",".join(str(value) for value in table_request["columns"])]
+    arguments.append(table_request["pdf"])
+    return arguments
+
+
+class TabulaWorker(object):
+    """
+    Client for a tabula process that keeps a single JVM running.
+
+    Starting `java -jar tabula` for every page costs more than the extraction
+    itself, so the worker loads the tabula jar once and takes batches of
+    table requests over stdin, streaming the CSV of every request back over
+    stdout. The worker moves anything else written to its stdout, like the
+    output of tabula or the JVM, over to stderr.
+    """
+    def __init__(self, jar_filepath):
+        self.jar_filepath = jar_filepath
+        self.process = None
+
+    def start(self):
+        '''Start the worker process and wait for the JVM to be ready.
+        '''
+        worker_script = os.path.splitext(os.path.abspath(__file__))[0] + ".py"
+        self.process = subprocess.Popen([sys.executable, worker_script,
+                                         self.jar_filepath],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        if self.process.stdout.readline().strip() != READY_HANDLE:
+            self.close()
+            raise TabulaWorkerError("Unable to start tabula worker with jar: %s" % self.jar_filepath)
+
+    def extract_tables(self, table_requests):
+        '''Extract tables for a batch of requests in one round trip.
+
+        Args:
+            table_requests (list): Table requests as accepted by
+                `get_tabula_arguments`.
+
+        Returns:
+            A list with a (status, data) tuple for every request, the status
+            is `RESPONSE_OK` when data contains the table CSV.
+        '''
+        if not self.process:
+            self.start()
+        try:
+            self.process.stdin.write(json.dumps({"requests": table_requests}) + "\n")
+            self.process.stdin.flush()
+            responses = []
+            for table_request in table_requests:
+                response_header = self.process.stdout.readline().split()
+                if len(response_header) != 2:
+                    raise TabulaWorkerError("Tabula worker stopped responding")
+                status, data_length = response_header
+                if status not in (RESPONSE_OK, RESPONSE_ERROR):
+                    raise TabulaWorkerError("Unexpected tabula worker response: %s" % status)
+                data = self.process.stdout.read(int(data_length))
+                if len(data) != int(data_length):
+                    raise TabulaWorkerError("Tabula worker stopped responding")
+                responses.append((status, data))
+        except TabulaWorkerError:
+            self.close()
+            raise
+        except (IOError, ValueError) as error:
+            self.close()
+            raise TabulaWorkerError("Tabula worker failed: %s" % error)
+        return responses
+
+    def close(self):
+        '''Stop the worker process.
+        '''
+        if not self.process:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait()
+        except (IOError, OSError):
+            self.process.kill()
+        self.process = None
+
+
+def get_error_message(error):
+    '''Get the message of an exception as utf-8 bytes, whether it was raised
+    with a unicode or a byte string message
+    '''
+    try:
+        return unicode(error).encode('utf-8')
+    except UnicodeError:
+        return str(error).decode('utf-8', 'replace').encode('utf-8')
+
+
+def write_response(response_stream, status, data):
+    response_stream.write("%s %s\n%s" % (status, len(data), data))
+
+
+def serve(jar_filepath):
+    '''Serve table requests from stdin using tabula loaded in a single JVM.
+
+    Needs JPype(https://github.com/jpype-project/jpype) to run tabula inside
+    this process, callers fall back to running the tabula command otherwise.
+
+    Responses are written to a duplicate of the stdout file descriptor, and
+    stdout itself is pointed at stderr before the JVM starts, so that nothing
+    tabula, PDFBox or JPype print can end up inside a response.
+    '''
+    try:
+        import jpype
+    except ImportError:
+        sys.stderr.write("JPype is required to run the tabula worker\n")
+        sys.exit(1)
+    sys.stdout.flush()
+    response_stream = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    jpype.startJVM(jpype.getDefaultJVMPath(),
+                   "-Djava.class.path=%s" % jar_filepath,
+                   "-Djava.awt.headless=true")
+    command_line_app = jpype.JClass(TABULA_CLASS)
+    command_line_parser = jpype.JClass(CLI_PARSER_CLASS)
+    string_builder = jpype.JClass("java.lang.StringBuilder")
+    options = command_line_app.buildOptions()
+    response_stream.write("%s\n" % READY_HANDLE)
+    response_stream.flush()
+    for line in iter(sys.stdin.readline, ''):
+        for table_request in json.loads(line)["requests"]:
+            try:
+                arguments = jpype.JArray(jpype.JString)(get_tabula_arguments(table_request))
+                command_line = command_line_parser().parse(options, arguments)
+                table_data = string_builder()
+                command_line_app(table_data, command_line).extractTables(command_line)
+                write_response(response_stream, RESPONSE_OK,
+                               unicode(table_data.toString()).encode('utf-8'))
+            except Exception as error:
+                write_response(response_stream, RESPONSE_ERROR, get_error_message(error))
+        response_stream.flush()
+    jpype.shutdownJVM()
+
+if __name__ == '__main__':
+    serve(sys.argv[1])
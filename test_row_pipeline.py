@@ -0,0 +1,60 @@
+'Regression tests of the row pipeline against the table transformations it replaced'
+
+import random
+import unittest
+from parsers.row_pipeline import RowPipeline, table_stage
+from parsers.union_budget.expenditure_budget_csv_generator import ExpenditureBudgetCSVGenerator
+
+RANDOM_CASE_COUNT = 5000
+CELL_VALUES = ["Major", "Head", "", " ", "1234"]
+
+
+def merge_major_head_rows(table):
+    '''Merge "Major" rows into the "Head" row below them the way
+    `ExpenditureBudgetCSVGenerator.modify_table_data` used to, popping the
+    merged rows by their unadjusted indices
+    '''
+    empty_row_indices = []
+    for row_num in range(len(table)-1):
+        if "".join(table[row_num]).strip() == "Major" and table[row_num+1][1].strip() == "Head":
+            table[row_num+1][1] = "Major " + table[row_num+1][1]
+            table[row_num][1] == ""
+            empty_row_indices.append(row_num)
+    for row_count in empty_row_indices:
+        table.pop(row_count)
+    return table
+
+
+def get_result(transform_function, table):
+    try:
+        return transform_function(table)
+    except IndexError:
+        return IndexError
+
+
+class RowPipelineTest(unittest.TestCase):
+    def test_stage_order(self):
+        def add_one(rows):
+            for row in rows:
+                yield row + [1]
+
+        def reverse_table(table):
+            return table[::-1]
+
+        self.assertEqual(RowPipeline([add_one, table_stage(reverse_table), add_one]).run([[0], [2]]),
+                         [[2, 1, 1], [0, 1, 1]])
+        self.assertEqual(RowPipeline().run(iter([[0]])), [[0]])
+
+    def test_major_head_merge(self):
+        csv_generator = ExpenditureBudgetCSVGenerator()
+        random_state = random.Random(0)
+        for case_num in range(RANDOM_CASE_COUNT):
+            table = [[random_state.choice(CELL_VALUES) for col_num in range(random_state.randint(1, 3))]
+                     for row_num in range(random_state.randint(0, 8))]
+            expected_table = get_result(merge_major_head_rows, [list(row) for row in table])
+            pipeline = RowPipeline([csv_generator.merge_major_head_rows])
+            self.assertEqual(get_result(pipeline.run, table), expected_table, "table %s" % table)
+
+
+if __name__ == '__main__':
+    unittest.main()
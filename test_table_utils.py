@@ -0,0 +1,80 @@
+'Regression tests of the single pass row and column deletion against the pop loops it replaced'
+
+import random
+import unittest
+from parsers.table_utils import delete_columns, delete_rows, get_deleted_row_indices
+
+RANDOM_CASE_COUNT = 5000
+
+
+def pop_rows(table, row_indices):
+    '''Delete rows the way the generators used to, popping them one after
+    another at their index less the number of rows popped before them
+    '''
+    num = 0
+    for row_index in row_indices:
+        table.pop(row_index-num)
+        num += 1
+    return table
+
+
+def pop_columns(table, col_indices):
+    for row in table:
+        num = 0
+        for col_index in col_indices:
+            row.pop(col_index-num)
+            num += 1
+    return table
+
+
+def get_result(delete_function, table, indices):
+    try:
+        return delete_function(table, indices)
+    except IndexError:
+        return IndexError
+
+
+class DeleteRowsTest(unittest.TestCase):
+    def test_duplicate_indices(self):
+        self.assertEqual(delete_rows(range(6), [2, 2, 4]), pop_rows(range(6), [2, 2, 4]))
+        self.assertEqual(get_deleted_row_indices([2, 2, 4]), set([1, 2, 4]))
+
+    def test_shifted_indices(self):
+        # a repeated first row popped the rows at the end of the table
+        self.assertEqual(delete_rows(range(6), [0, 0, 1]), pop_rows(range(6), [0, 0, 1]))
+
+    def test_out_of_range_index(self):
+        self.assertRaises(IndexError, delete_rows, range(3), [1, 3])
+
+    def test_random_indices(self):
+        random_state = random.Random(0)
+        for case_num in range(RANDOM_CASE_COUNT):
+            row_count = random_state.randint(0, 8)
+            row_indices = sorted(random_state.randint(0, row_count + 1)
+                                 for index_num in range(random_state.randint(0, 6)))
+            table = [[str(row_index)] for row_index in range(row_count)]
+            expected_table = get_result(pop_rows, [list(row) for row in table], row_indices)
+            self.assertEqual(get_result(delete_rows, table, row_indices), expected_table,
+                             "rows %s of %s" % (row_indices, row_count))
+            is_first_row_repeated = any(row_index < num for num, row_index in enumerate(row_indices))
+            if expected_table is not IndexError and not is_first_row_repeated:
+                self.assertEqual([row_index for row_index in range(row_count)
+                                  if row_index not in get_deleted_row_indices(row_indices)],
+                                 [int(row[0]) for row in expected_table])
+
+
+class DeleteColumnsTest(unittest.TestCase):
+    def test_random_indices(self):
+        random_state = random.Random(0)
+        for case_num in range(RANDOM_CASE_COUNT):
+            col_count = random_state.randint(1, 8)
+            col_indices = sorted(set(random_state.randint(0, col_count)
+                                     for index_num in range(random_state.randint(0, 4))))
+            table = [[str(col_index) for col_index in range(col_count)] for row_num in range(3)]
+            expected_table = get_result(pop_columns, [list(row) for row in table], col_indices)
+            self.assertEqual(get_result(delete_columns, table, col_indices), expected_table,
+                             "columns %s of %s" % (col_indices, col_count))
+
+
+if __name__ == '__main__':
+    unittest.main()
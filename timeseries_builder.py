@@ -0,0 +1,249 @@
+'Class for building timeseries CSV files out of yearly budget CSV files'
+
+import json
+import logging
+from multiprocessing.pool import ThreadPool
+import os
+import pandas as pd
+from parsers.page_cache import get_file_hash
+import tempfile
+
+logger = logging.getLogger()
+DEFAULT_READ_THREADS = 4
+MANIFEST_FILE_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+# Share of the rows of a timeseries a yearly file appended to it has to have
+MIN_MATCHED_ROW_SHARE = 0.5
+
+
+class TimeseriesBuilder(object):
+    """
+    Build a timeseries out of the CSV files of the same table for every year.
+
+    Every yearly file repeats the table of the previous year with newer
+    estimates. The first file is kept whole, of every later file the column
+    at `inserted_col_index` is inserted before the last column of the
+    timeseries and its last two columns are appended to it.
+
+    Rows of the yearly files are matched by the value of their first column,
+    the indicator or head, and by how often that value occurred above them,
+    so that rows added or dropped in a year do not shift the rows after
+    them. Rows a year does not have are left empty for it, rows only later
+    years have are inserted after the row they follow in the first year
+    having them. Files are read concurrently and the timeseries is put
+    together with a single concat.
+
+    The yearly files and their content hashes are recorded in a manifest next
+    to the timeseries. A timeseries whose files did not change is not built
+    again, and one whose files only gained newer years gets the columns of
+    those years appended instead of being rebuilt.
+
+    Usage:
+        builder = TimeseriesBuilder(inserted_col_index=-3)
+        builder.generate_timeseries_file(sorted(yearly_csv_files), output_filepath)
+        builder.append_timeseries_file(output_filepath, [new_year_csv_file])
+    """
+    def __init__(self, inserted_col_index, read_threads=DEFAULT_READ_THREADS):
+        self.inserted_col_index = inserted_col_index
+        self.read_threads = read_threads
+
+    def read_csv_files(self, file_names):
+        thread_pool = ThreadPool(max(1, min(self.read_threads, len(file_names))))
+        try:
+            return thread_pool.map(pd.read_csv, file_names)
+        finally:
+            thread_pool.close()
+            thread_pool.join()
+
+    def set_row_keys(self, file_df):
+        '''Index the rows of a yearly table by the stripped value of their
+        first column and its occurrence count
+        '''
+        key_values = file_df[file_df.columns[0]].astype(str).str.strip()
+        occurrences = key_values.groupby(key_values).cumcount()
+        file_df.index = pd.MultiIndex.from_arrays([key_values.values, occurrences.values])
+        return file_df
+
+    def get_timeseries_columns(self, yearly_dfs):
+        '''Get the columns of the timeseries in the order the yearly columns
+        are placed in.
+
+        Returns:
+            A list of tuples of the index of the yearly table and the name of
+            the column in it.
+        '''
+        timeseries_columns = [(0, col_name) for col_name in yearly_dfs[0].columns]
+        for df_index in range(1, len(yearly_dfs)):
+            file_columns = yearly_dfs[df_index].columns
+            timeseries_columns.insert(len(timeseries_columns)-1,
+                                      (df_index, file_columns[self.inserted_col_index]))
+            timeseries_columns.append((df_index, file_columns[-2]))
+            timeseries_columns.append((df_index, file_columns[-1]))
+        return timeseries_columns
+
+    def get_row_keys(self, yearly_dfs):
+        '''Get the row keys of the timeseries, the keys of the first yearly
+        table with the keys only later tables have inserted right after the
+        key they follow in the first table having them, or before all keys if
+        they come first in it
+        '''
+        known_row_keys = set(yearly_dfs[0].index)
+        inserted_row_keys = {}
+        for file_df in yearly_dfs[1:]:
+            file_inserted_row_keys = {}
+            previous_row_key = None
+            for row_key in file_df.index:
+                if row_key not in known_row_keys:
+                    file_inserted_row_keys.setdefault(previous_row_key, []).append(row_key)
+                    known_row_keys.add(row_key)
+                previous_row_key = row_key
+            for previous_row_key, row_keys in file_inserted_row_keys.items():
+                inserted_row_keys[previous_row_key] = row_keys + inserted_row_keys.get(previous_row_key, [])
+        row_keys = []
+        pending_row_keys = list(reversed(inserted_row_keys.get(None, []) + list(yearly_dfs[0].index)))
+        while pending_row_keys:
+            row_key = pending_row_keys.pop()
+            row_keys.append(row_key)
+            pending_row_keys.extend(reversed(inserted_row_keys.get(row_key, [])))
+        return pd.MultiIndex.from_tuples(row_keys)
+
+    def build_timeseries(self, file_names):
+        '''Build the timeseries of yearly CSV files.
+
+        Args:
+            - file_names (list): Yearly CSV filepaths, oldest first.
+
+        Returns:
+            A pandas DataFrame of the timeseries, None without files.
+        '''
+        if not file_names:
+            return None
+        yearly_dfs = [self.set_row_keys(file_df) for file_df in self.read_csv_files(file_names)]
+        return self.merge_yearly_tables(yearly_dfs, file_names)
+
+    def merge_yearly_tables(self, yearly_dfs, file_names):
+        row_keys = self.get_row_keys(yearly_dfs)
+        timeseries_columns = []
+        for df_index, col_name in self.get_timeseries_columns(yearly_dfs):
+            # object columns keep integer values written as integers next to
+            # the empty cells of missing rows
+            timeseries_columns.append(yearly_dfs[df_index][col_name].astype(object).reindex(row_keys))
+        timeseries_df = pd.concat(timeseries_columns, axis=1).reset_index(drop=True)
+        inserted_rows = ~row_keys.isin(yearly_dfs[0].index)
+        if inserted_rows.any():
+            timeseries_df.iloc[inserted_rows, 0] = row_keys.get_level_values(0)[inserted_rows]
+        for df_index in range(1, len(yearly_dfs)):
+            missing_row_count = len(row_keys) - len(yearly_dfs[df_index].index)
+            if missing_row_count:
+                logger.warning("%s rows of the timeseries not found in %s" % (missing_row_count,
+                                                                                file_names[df_index]))
+        return timeseries_df
+
+    def append_years(self, output_filepath, file_names):
+        '''Append the columns of newer yearly CSV files to a timeseries file.
+
+        Raises:
+            ValueError: If a yearly file has less than `MIN_MATCHED_ROW_SHARE`
+                of the rows of the timeseries, like the file of another
+                table.
+        '''
+        # values are read back as written, without reparsing integer columns
+        # with empty cells as floats
+        timeseries_df = self.set_row_keys(pd.read_csv(output_filepath, dtype=object))
+        yearly_dfs = [self.set_row_keys(file_df) for file_df in self.read_csv_files(file_names)]
+        for file_name, file_df in zip(file_names, yearly_dfs):
+            matched_row_share = timeseries_df.index.isin(file_df.index).mean() if len(timeseries_df.index) else 0.0
+            if matched_row_share < MIN_MATCHED_ROW_SHARE:
+                raise ValueError("Only %.0f%% of the rows of the timeseries %s found in %s" % (matched_row_share*100,
+                                                                                             output_filepath,
+                                                                                             file_name))
+        timeseries_df = self.merge_yearly_tables([timeseries_df] + yearly_dfs,
+                                                 [output_filepath] + file_names)
+        timeseries_df.to_csv(output_filepath, index=False)
+
+    def generate_timeseries_file(self, file_names, output_filepath, force=False):
+        '''Write the timeseries of yearly CSV files, unless the files did not
+        change since it was written.
+
+        If the files recorded in the manifest are the oldest of the files
+        given, unchanged, only the columns of the newer files are appended.
+
+        Args:
+            - file_names (list): Yearly CSV filepaths, oldest first.
+            - output_filepath (string): Path of the timeseries CSV file.
+            - force (boolean): Build the timeseries from all files ignoring
+                the manifest.
+        '''
+        if not file_names:
+            logger.error("No yearly CSV files to build %s from" % output_filepath)
+            return
+        manifest_filepath = output_filepath + MANIFEST_FILE_SUFFIX
+        sources = [self.get_source_entry(file_name) for file_name in file_names]
+        recorded_sources = []
+        if not force and os.path.exists(output_filepath):
+            recorded_sources = self.load_manifest(manifest_filepath)
+        if recorded_sources and recorded_sources == sources[:len(recorded_sources)]:
+            if len(recorded_sources) == len(sources):
+                logger.info("Timeseries %s is up to date" % output_filepath)
+                return
+            logger.info("Appending %s years to timeseries %s" % (len(sources) - len(recorded_sources),
+                                                                output_filepath))
+            self.append_years(output_filepath, file_names[len(recorded_sources):])
+        else:
+            self.build_timeseries(file_names).to_csv(output_filepath, index=False)
+        self.write_manifest(manifest_filepath, sources)
+
+    def append_timeseries_file(self, output_filepath, file_names):
+        '''Append the columns of newer yearly CSV files to a timeseries file,
+        and record them in its manifest.
+
+        Args:
+            - output_filepath (string): Path of the timeseries CSV file.
+            - file_names (list): Yearly CSV filepaths, oldest first.
+
+        Files already recorded in the manifest are not appended again, files
+        recorded with other content are skipped too, as their columns can
+        only be replaced by building the timeseries again.
+        '''
+        manifest_filepath = output_filepath + MANIFEST_FILE_SUFFIX
+        sources = self.load_manifest(manifest_filepath)
+        recorded_hashes = dict((source["path"], source["sha1"]) for source in sources)
+        new_file_names = []
+        new_sources = []
+        for file_name in file_names:
+            source = self.get_source_entry(file_name)
+            if source["path"] not in recorded_hashes:
+                new_file_names.append(file_name)
+                new_sources.append(source)
+            elif recorded_hashes[source["path"]] != source["sha1"]:
+                logger.warning("%s changed since it was added to %s, build the timeseries again to update it" % (file_name,
+                                                                                                                  output_filepath))
+        if not new_sources:
+            logger.info("Timeseries %s already has all years" % output_filepath)
+            return
+        self.append_years(output_filepath, new_file_names)
+        self.write_manifest(manifest_filepath, sources + new_sources)
+
+    def get_source_entry(self, file_name):
+        return {"path": os.path.abspath(file_name), "sha1": get_file_hash(file_name)}
+
+    def load_manifest(self, manifest_filepath):
+        '''Load the yearly files of a manifest, an empty list if the manifest
+        is missing, unreadable or of an older version
+        '''
+        try:
+            with open(manifest_filepath, "rb") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (IOError, ValueError):
+            return []
+        if manifest.get("version") != MANIFEST_VERSION:
+            return []
+        return manifest.get("sources", [])
+
+    def write_manifest(self, manifest_filepath, sources):
+        manifest_dir = os.path.dirname(os.path.abspath(manifest_filepath))
+        temp_file_descriptor, temp_file = tempfile.mkstemp(dir=manifest_dir)
+        with os.fdopen(temp_file_descriptor, "wb") as temp_file_obj:
+            json.dump({"version": MANIFEST_VERSION, "sources": sources}, temp_file_obj,
+                      indent=1, sort_keys=True)
+        os.rename(temp_file, manifest_filepath)
@@ -3,13 +3,17 @@
 import argparse
 import cv2
 import glob
+import itertools
 import logging
 from logging.config import fileConfig
 import re
 import numpy
 import os
+from parsers.document_session import PDFDocumentSession
 from parsers.pdf_to_csv import PDF2CSV
-from parsers.keywords_extractor import KeywordsExtractor
+from parsers.keywords_extractor import KeywordsExtractor, KeywordIndex
+from parsers.row_pipeline import RowPipeline, table_stage
+from parsers.table_utils import delete_columns, delete_rows
 
 fileConfig('parsers/logging_config.ini')
 logger = logging.getLogger()
@@ -19,6 +23,24 @@ SECOND_HEADER_FIELD = "budget support"
 HEADER_STUBS = ["HeadPlan", "HeadofDevB"]
 MIN_COL_COUNT = 3
 POSSIBLE_APERTURE_SIZES = [5,7] 
+INDEX_VALUE_REGEX = re.compile(r'^[\d\.]+$')
+MERGE_BOUND_HEADER_REGEX = re.compile(r"^(major|head of dev*)$")
+MERGED_EMPTY_VALUE_REGEX = re.compile(r'^(\.{3}\s(\.{3}|[0-9]|\-[0-9]))')
+LEADING_EMPTY_VALUE_REGEX = re.compile(r'^\.{3}\s')
+MULTI_COL_VALUE_REGEX = re.compile(r'^((\.{3}|(\-)*[0-9]+(\.[0-9]+){,1}|Plan|Non-Plan|Total)(\s)*)+$')
+HEAD_OF_REGEX = re.compile(r'head of')
+BUDGET_REGEX = re.compile(r'budget')
+MAJOR_HEAD_CODE_REGEX = re.compile(r'\s[0-9]{4,}$|^[0-9]{4,}$|^Head of Dev|Head of$| Dev$|\s{,1}Total$|^Net$')
+MAJOR_HEAD_VALUE_REGEX = re.compile(r'(^[0-9]{1,}\.[0-9]{1,})|\.{3}')
+SCHEME_NAME_REGEX = re.compile(r'\D{2,}(\s\D{2,})+')
+MAJOR_CODE_REGEX = re.compile(r'\d{4,}')
+HEADER_STUB_REGEX = re.compile(r"^(%s)" % "|".join(HEADER_STUBS))
+SUB_TOTAL_REGEX = re.compile(r'^(Total|[A-C]\.)|\:$')
+LEADING_DIGIT_REGEX = re.compile(r'^[0-9]')
+INDEX_PREFIX_REGEX = re.compile(r'^(\d{1,2}(\.)*)+(\s){0,1}')
+INDEXED_SCHEME_REGEX = re.compile(r'^(\d{1,2}(\.)*)+(\s){0,1}\D+')
+YEAR_RANGE_REGEX = re.compile(r'[0-9]{4}\-[0-9]{4}')
+SECOND_HEADER_REGEX = re.compile(r'%s' % SECOND_HEADER_FIELD)
 FORMAT_DICT={
     "form1": {
         "FIRST_HEADER_ROW" : ['Index', 'Scheme', '', 'Actual', 'Actual', 'Actual', 'Budget', 'Budget', 'Budget', 'Revised', 'Revised', 'Revised', 'Budget', 'Budget', 'Budget'],
@@ -37,179 +59,213 @@ class ExpenditureBudgetCSVGenerator(PDF2CSV):
         self.header_rows_cap = 5
         self.header_format = None
         self.header_padding_required = False
-        self.keywords_extractor = KeywordsExtractor()        
-        self.bold_keywords = []
+        self.keywords_extractor = KeywordsExtractor(stream_html=True)
+        self.bold_keywords = KeywordIndex()
 
-    def check_missing_vertical(self, lines):
+    def check_missing_vertical(self, line_geometry):
         found_missing_vertical = False
         min_vertical = None
-        for line in lines:
-            for x1,y1,x2,y2 in line:
-                if x1 == x2:
-                    if not min_vertical or x1 < min_vertical:
-                        min_vertical = x1
+        vertical_x = line_geometry.vertical[:, 0]
+        # a vertical line at x = 0 used to reset the running minimum
+        zero_x_indices = numpy.flatnonzero(vertical_x == 0)
+        if len(zero_x_indices):
+            vertical_x = vertical_x[zero_x_indices[-1]+1:]
+        if len(vertical_x):
+            min_vertical = int(vertical_x.min())
         if min_vertical:
-            for line in lines:
-                for x1,y1,x2,y2 in line:
-                    if y1 == y2 and min_vertical/2 < x1 < min_vertical:
-                        found_missing_vertical = x1
+            flat_x = line_geometry.flat[:, 0]
+            missing_vertical_x = flat_x[(min_vertical/2 < flat_x) & (flat_x < min_vertical)]
+            if len(missing_vertical_x):
+                found_missing_vertical = int(missing_vertical_x[-1])
         return found_missing_vertical
     
     def modify_table_data(self, table):
-        table = self.correct_upper_header_rows(table)    
-        table = self.merge_splitted_coloumns(table)
+        table = RowPipeline([self.correct_upper_header_rows,
+                             self.merge_splitted_coloumns,
+                             self.split_merged_coloumns]).run(table)
         if not table:
             return table
-        table = self.split_merged_coloumns(table)
-        table = self.fix_second_header(table)
-        table = self.remove_dulicate_headers(table)
-        empty_row_indices = []
-        for row_num in range(len(table)-1):
-            if "".join(table[row_num]).strip() == "Major" and table[row_num+1][1].strip() == "Head":
-                table[row_num+1][1] = "Major " + table[row_num+1][1] 
-                table[row_num][1] == ""
-                empty_row_indices.append(row_num)
-        for row_count in empty_row_indices:
-            table.pop(row_count)
-        table = self.merge_splitted_rows(table)
-        table = self.ensure_table_intergrity(table)
-        table = self.add_index_coloumn(table)
-        table = self.add_new_headers(table)
-        return table
+        return RowPipeline([self.fix_second_header,
+                            table_stage(self.remove_dulicate_headers),
+                            self.merge_major_head_rows,
+                            self.merge_splitted_rows,
+                            self.ensure_table_intergrity,
+                            self.add_index_coloumn,
+                            self.add_new_headers]).run(table)
 
-    def correct_upper_header_rows(self, table):
+    def correct_upper_header_rows(self, rows):
+        '''Pad the first five rows with an empty index cell if tabula did not
+        leave one
+        '''
+        rows = iter(rows)
+        upper_rows = list(itertools.islice(rows, 5))
         for num in range(0,5):
-            if table[num][0].strip() != "":
-                table[num] = [""] + table[num]
+            if upper_rows[num][0].strip() != "":
+                upper_rows[num] = [""] + upper_rows[num]
                 self.header_padding_required = True
-        return table
+        for row in itertools.chain(upper_rows, rows):
+            yield row
 
-    def merge_splitted_coloumns(self, table):
-        pagewise_table_list = []
-        temp_list = []
-        for row in table:
-            if row[0] == self.page_break.replace('"',''):
-                if temp_list and len(temp_list[0]) > MIN_COL_COUNT:
-                    pagewise_table_list.append(temp_list)
-                    temp_list = []
+    def merge_splitted_coloumns(self, rows):
+        '''Drop page breaks and short rows, and merge the index and scheme
+        columns tabula split, one page at a time
+        '''
+        page_break = self.page_break.replace('"','')
+        page_table = []
+        for row in rows:
+            if row[0] == page_break:
+                if page_table and len(page_table[0]) > MIN_COL_COUNT:
+                    for page_row in self.merge_page_coloumns(page_table):
+                        yield page_row
+                    page_table = []
             elif len(row) > MIN_COL_COUNT:
                 row[0] = row[0].strip()
                 row[1] = row[1].strip()
-                if re.search(r'^[\d\.]+$', row[0]) and row[1]:
+                if INDEX_VALUE_REGEX.search(row[0]) and row[1]:
                     row[0] += " " + row[1] 
                     row[1] = ""  
-                temp_list.append(row)
-        if temp_list and len(temp_list[0]) > MIN_COL_COUNT:
-            pagewise_table_list.append(temp_list)
-        table = [] 
-        for page_table in pagewise_table_list:
-            #page_table = self.delete_empty_coloumns(page_table)
-            for row_index in range(len(page_table)):
-                while page_table[row_index][0].strip() == page_table[row_index][1].strip() == "":
-                    page_table[row_index][0] += " " + page_table[row_index][1]
-                    page_table[row_index].pop(1)
-            header_row = page_table[1]
-            merge_upper_bound = 0
-            for col_index in range(1, len(header_row)):
-                header_stub = header_row[col_index].strip().lower() 
-                if re.search(r"^(major|head of dev*)$", header_stub):
-                    merge_upper_bound = col_index
-                    break
+                page_table.append(row)
+        if page_table and len(page_table[0]) > MIN_COL_COUNT:
+            for page_row in self.merge_page_coloumns(page_table):
+                yield page_row
+
+    def merge_page_coloumns(self, page_table):
+        for row_index in range(len(page_table)):
+            while page_table[row_index][0].strip() == page_table[row_index][1].strip() == "":
+                page_table[row_index][0] += " " + page_table[row_index][1]
+                page_table[row_index].pop(1)
+        header_row = page_table[1]
+        merge_upper_bound = 0
+        for col_index in range(1, len(header_row)):
+            header_stub = header_row[col_index].strip().lower() 
+            if MERGE_BOUND_HEADER_REGEX.search(header_stub):
+                merge_upper_bound = col_index
+                break
+        if merge_upper_bound:
             for row in page_table:
-                if merge_upper_bound:
-                    num = 0
-                    row[0] = row[0].strip()
-                    for col_index in range(1, merge_upper_bound):
-                        row[0] += " " + row[col_index-num]
-                        row.pop(col_index-num)
-                        num += 1
-                table.append(row)
-        return table
-    
-    def split_merged_coloumns(self, table):
-        for row in table:
-            for col_index in range(2,len(row)):
-                if re.search(r'^(\.{3}\s(\.{3}|[0-9]|\-[0-9]))', row[col_index].strip()) and not row[col_index-1].strip():
-                    row[col_index-1] = "..."
-                    row[col_index] = re.sub(r'^\.{3}\s', '', row[col_index]).strip()
+                row[0] = " ".join([row[0].strip()] + row[1:merge_upper_bound])
+            delete_columns(page_table, range(1, merge_upper_bound))
+        return page_table
+
+    def split_merged_coloumns(self, rows):
+        '''Spread values tabula merged into one cell over the columns after
+        it, and move major head codes into their own column.
+
+        Rows are corrected as they are read, the table is held back only to
+        correct the major head values once more if columns were shifted, and
+        to add the new columns to the header row.
+        '''
         new_col_indices = []
-        for row_index in range(len(table)):
-            row = table[row_index]
-            new_col_values_map = {}
-            for col_index in range(0, len(row)):
-                row[col_index] = row[col_index].strip()
-                multi_col_match = re.search(r'^((\.{3}|(\-)*[0-9]+(\.[0-9]+){,1}|Plan|Non-Plan|Total)(\s)*)+$', row[col_index].strip())
-                if multi_col_match:
-                    multi_col_match_str = multi_col_match.group(0)
-                    if " " not in multi_col_match_str.strip():
-                        continue
-                    col_values = multi_col_match_str.split(" ")
-                    row[col_index] = col_values[0]
-                    index_correction = len(new_col_values_map)
-                    for col_count in range(1,len(col_values)):
-                        if col_index+col_count < len(row) and not row[col_index+col_count].strip():
-                            row[col_index+col_count] = col_values[col_count]
-                        else:
-                            insert_pointer = col_index+col_count+index_correction 
-                            new_col_values_map[insert_pointer] = col_values[col_count] 
-                            if not insert_pointer in new_col_indices and row_index <= self.header_rows_cap:
-                                new_col_indices.append(insert_pointer)
-            for index in sorted(new_col_values_map):
-                row.insert(index, new_col_values_map[index])
-        table = self.correct_major_head_values(table)
         col_shifted = False
-        for row_index in range(len(table)):
-            table[row_index][0] = table[row_index][0].strip()  
-            table[row_index][1] = table[row_index][1].strip()  
-            if (re.match(r'head of', table[row_index][0].lower()) and re.match(r'budget', table[row_index][1].strip().lower())):
-                continue
-            if (re.match(r'head of', table[row_index][1].lower()) and re.match(r'budget', table[row_index][2].strip().lower())):
-                continue
-            if len(table[row_index]) > len(FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"]) or not " " in " ".join(table[row_index]).strip():
-                while not table[row_index][0] and "".join(table[row_index][1:]).strip():
-                    table[row_index].pop(0)
-                    col_shifted = True
+        table = []
+        for row_index, row in enumerate(rows):
+            self.split_merged_row_values(row_index, row, new_col_indices)
+            self.correct_major_head_code(row)
+            if row_index >= 2:
+                self.correct_major_head_cell(row)
+            if self.shift_row_coloumns(row):
+                col_shifted = True
+            table.append(row)
         if col_shifted:
             table = self.correct_major_head_values(table)
         for col_index in new_col_indices:
             table[0].insert(col_index, " ")
-        return table
-       
-    def correct_major_head_values(self, table):
         for row in table:
-            if row[0].strip() == "Grand Total":
-                if row[1].strip():
-                    row.insert(1, "")
-                continue
-            major_code_match = re.findall(r'\s[0-9]{4,}$|^[0-9]{4,}$|^Head of Dev|Head of$| Dev$|\s{,1}Total$|^Net$', row[0].strip())
-            if major_code_match:
-                major_code = major_code_match[-1]
-                scheme_name = row[0].split(major_code)[0]
-                if len(row) < len(FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"]):
-                    row[0] = scheme_name.strip()
-                    if not row[1].strip():
-                        row[1] = major_code
+            yield row
+
+    def split_merged_row_values(self, row_index, row, new_col_indices):
+        for col_index in range(2,len(row)):
+            if MERGED_EMPTY_VALUE_REGEX.search(row[col_index].strip()) and not row[col_index-1].strip():
+                row[col_index-1] = "..."
+                row[col_index] = LEADING_EMPTY_VALUE_REGEX.sub('', row[col_index]).strip()
+        new_col_values_map = {}
+        for col_index in range(0, len(row)):
+            row[col_index] = row[col_index].strip()
+            multi_col_match = MULTI_COL_VALUE_REGEX.search(row[col_index])
+            if multi_col_match:
+                multi_col_match_str = multi_col_match.group(0)
+                if " " not in multi_col_match_str.strip():
+                    continue
+                col_values = multi_col_match_str.split(" ")
+                row[col_index] = col_values[0]
+                index_correction = len(new_col_values_map)
+                for col_count in range(1,len(col_values)):
+                    if col_index+col_count < len(row) and not row[col_index+col_count].strip():
+                        row[col_index+col_count] = col_values[col_count]
                     else:
-                        row.insert(1, major_code)
-                elif not row[1].strip():
-                    row[0] = scheme_name.strip()
-                    row[1] = major_code
+                        insert_pointer = col_index+col_count+index_correction 
+                        new_col_values_map[insert_pointer] = col_values[col_count] 
+                        if not insert_pointer in new_col_indices and row_index <= self.header_rows_cap:
+                            new_col_indices.append(insert_pointer)
+        for index in sorted(new_col_values_map):
+            row.insert(index, new_col_values_map[index])
+
+    def shift_row_coloumns(self, row):
+        '''Shift the values of a row with more columns than the header, or
+        with a single value, to the left over its empty leading cells.
+
+        Returns:
+            True if the row was shifted.
+        '''
+        col_shifted = False
+        row[0] = row[0].strip()
+        row[1] = row[1].strip()
+        if (HEAD_OF_REGEX.match(row[0].lower()) and BUDGET_REGEX.match(row[1].lower())):
+            return col_shifted
+        if (HEAD_OF_REGEX.match(row[1].lower()) and BUDGET_REGEX.match(row[2].strip().lower())):
+            return col_shifted
+        if len(row) > len(FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"]) or not " " in " ".join(row).strip():
+            while not row[0] and "".join(row[1:]).strip():
+                row.pop(0)
+                col_shifted = True
+        return col_shifted
+
+    def correct_major_head_values(self, table):
+        for row in table:
+            self.correct_major_head_code(row)
         for row_index in range(2, len(table)):
-            major_head_cell_val = table[row_index][1].strip() 
-            if not major_head_cell_val or (re.match(r'head of', major_head_cell_val.lower()) and re.match(r'budget', table[row_index][2].strip().lower())):
-                continue
-            if re.search(r'(^[0-9]{1,}\.[0-9]{1,})|\.{3}', major_head_cell_val):
-                table[row_index].insert(1, '')
-            elif re.search(r'\D{2,}(\s\D{2,})+', major_head_cell_val):
-                major_code_match = re.search(r'\d{4,}', major_head_cell_val)
-                if major_code_match:
-                    major_code = major_code_match.group(0)
-                    table[row_index][0] += table[row_index][0].strip() + " " + major_head_cell_val.split(major_code)[0].strip()
-                    table[row_index][1] = major_code
-                else:
-                    table[row_index][0] = major_head_cell_val
-                    table[row_index][1] = ""
+            self.correct_major_head_cell(table[row_index])
         return table
+
+    def correct_major_head_code(self, row):
+        '''Move a major head code at the end of the scheme name into the
+        major head column
+        '''
+        if row[0].strip() == "Grand Total":
+            if row[1].strip():
+                row.insert(1, "")
+            return
+        major_code_match = MAJOR_HEAD_CODE_REGEX.findall(row[0].strip())
+        if major_code_match:
+            major_code = major_code_match[-1]
+            scheme_name = row[0].split(major_code)[0]
+            if len(row) < len(FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"]):
+                row[0] = scheme_name.strip()
+                if not row[1].strip():
+                    row[1] = major_code
+                else:
+                    row.insert(1, major_code)
+            elif not row[1].strip():
+                row[0] = scheme_name.strip()
+                row[1] = major_code
+
+    def correct_major_head_cell(self, row):
+        '''Correct a major head cell holding a value or a scheme name
+        '''
+        major_head_cell_val = row[1].strip() 
+        if not major_head_cell_val or (HEAD_OF_REGEX.match(major_head_cell_val.lower()) and BUDGET_REGEX.match(row[2].strip().lower())):
+            return
+        if MAJOR_HEAD_VALUE_REGEX.search(major_head_cell_val):
+            row.insert(1, '')
+        elif SCHEME_NAME_REGEX.search(major_head_cell_val):
+            major_code_match = MAJOR_CODE_REGEX.search(major_head_cell_val)
+            if major_code_match:
+                major_code = major_code_match.group(0)
+                row[0] += row[0].strip() + " " + major_head_cell_val.split(major_code)[0].strip()
+                row[1] = major_code
+            else:
+                row[0] = major_head_cell_val
+                row[1] = ""
     
     def remove_dulicate_headers(self, table):
         empty_row_indices = []
@@ -219,65 +275,101 @@ class ExpenditureBudgetCSVGenerator(PDF2CSV):
             header_rows.append("".join(table[row_num]).replace(" ", ""))
         for row_num in range(self.header_rows_indices[-1]+1, len(table)):
             row_stub = "".join(table[row_num]).replace(" ", "")
-            if row_stub in header_rows or re.search(r"^(%s)" % "|".join(HEADER_STUBS), row_stub):
+            if row_stub in header_rows or HEADER_STUB_REGEX.search(row_stub):
                 empty_row_indices.append(row_num)
             if row_stub == seconary_header_stub and not seconary_header_stub in header_rows:
                 header_rows.append(seconary_header_stub)
             elif "IEBR" in row_stub:
                 empty_row_indices.append(row_num)
-        num = 0
-        for row_count in empty_row_indices:
-            table.pop(row_count-num)
-            num += 1
-        return table
+        return delete_rows(table, empty_row_indices)
 
-    def merge_splitted_rows(self, table):
-        empty_row_indices = []
+    def merge_major_head_rows(self, rows):
+        '''Merge a "Major" row into the "Head" row below it.
+
+        Every merge deletes the row as many rows after its "Major" row as
+        there were merges before it, the way popping by the unadjusted indices
+        used to, so a row is held back only until it is known not to be
+        deleted.
+        '''
+        deleted_row_indices = set()
+        previous_row = None
+        row_index = -1
+        for row_index, row in enumerate(rows):
+            if previous_row is not None:
+                if "".join(previous_row).strip() == "Major" and row[1].strip() == "Head":
+                    if len(previous_row) < 2:
+                        raise IndexError("list index out of range")
+                    row[1] = "Major " + row[1] 
+                    deleted_row_indices.add(row_index - 1 + len(deleted_row_indices))
+                if row_index - 1 not in deleted_row_indices:
+                    yield previous_row
+            previous_row = row
+        if previous_row is not None and row_index not in deleted_row_indices:
+            yield previous_row
+        if deleted_row_indices and max(deleted_row_indices) > row_index:
+            raise IndexError("pop index out of range")
+
+    def merge_splitted_rows(self, rows):
+        '''Merge scheme names split over several rows.
+
+        The rows after the last row with values are held back, as the text
+        of following rows without values is merged into it.
+        '''
+        rows = iter(rows)
+        previous_row = next(rows, None)
+        if previous_row is None:
+            return
+        yield previous_row
+        held_rows = []
+        parent_row = None
         previous_data_slug = ""
-        for row_index in range(1,len(table)):
-            table[row_index][0] = table[row_index][0].strip()
-            if not table[row_index][0] or re.search(r'^(Total|[A-C]\.)|\:$', table[row_index][0]) or (re.sub(r'\s{2,}', ' ', table[row_index][0].lower()) in self.bold_keywords): 
-                continue
-            elif re.search(r'^[0-9]', table[row_index][0]) and not "".join(table[row_index][1:]).strip():
-                index_col_val = re.search(r'^(\d{1,2}(\.)*)+(\s){0,1}', table[row_index][0]).group(0).strip()
-                scheme_col_val = re.sub(r'\s{2,}', ' ', table[row_index][0].lower().replace(index_col_val, "").strip())
-                if scheme_col_val in self.bold_keywords:
-                    continue
-                previous_data_slug += table[row_index][0] + " "
-                empty_row_indices.append(row_index)
-                continue 
-            elif table[row_index][0].strip() and not "".join(table[row_index][1:]).strip() and table[row_index-1][0].strip():
-                parent_row_index = row_index
-                while parent_row_index > 1:
-                    parent_row_index -= 1
-                    if "".join(table[parent_row_index][1:]).strip():
-                        break
-                table[parent_row_index][0] = table[parent_row_index][0].strip() + " " + table[row_index][0].strip()
-                empty_row_indices.append(row_index)
+        for row_index, row in enumerate(rows, 1):
+            row[0] = row[0].strip()
+            has_values = bool("".join(row[1:]).strip())
+            if has_values or row_index == 1:
+                for held_row in held_rows:
+                    yield held_row
+                held_rows = []
+                parent_row = row
+            delete_row = False
+            if not row[0] or SUB_TOTAL_REGEX.search(row[0]) or self.bold_keywords.matches(row[0]): 
+                pass
+            elif LEADING_DIGIT_REGEX.search(row[0]) and not has_values:
+                index_col_val = INDEX_PREFIX_REGEX.search(row[0]).group(0).strip()
+                scheme_col_val = row[0].lower().replace(index_col_val, "").strip()
+                if not self.bold_keywords.matches(scheme_col_val):
+                    previous_data_slug += row[0] + " "
+                    delete_row = True
+            elif row[0] and not has_values and previous_row[0].strip():
+                parent_row[0] = parent_row[0].strip() + " " + row[0]
+                delete_row = True
             elif previous_data_slug:
-                table[row_index][0] =  previous_data_slug + table[row_index][0]
+                row[0] =  previous_data_slug + row[0]
                 previous_data_slug = ""
-        num = 0
-        for row_count in empty_row_indices:
-            table.pop(row_count-num)
-            num += 1
-        return table
+            if not delete_row:
+                held_rows.append(row)
+            previous_row = row
+        for held_row in held_rows:
+            yield held_row
     
-    def add_index_coloumn(self, table):
-        for row_index in range(len(table)):
+    def add_index_coloumn(self, rows):
+        for row in rows:
             index_col_val = ""
-            table[row_index][0] = table[row_index][0].strip()
-            if re.search(r'^(\d{1,2}(\.)*)+(\s){0,1}\D+', table[row_index][0]):
-                index_col_val = re.search(r'^(\d{1,2}(\.)*)+(\s){0,1}', table[row_index][0]).group(0).strip()
-                table[row_index][0] = table[row_index][0].split(index_col_val)[-1].strip()
-            table[row_index] = [index_col_val] + table[row_index]
-        return table
+            row[0] = row[0].strip()
+            if INDEXED_SCHEME_REGEX.search(row[0]):
+                index_col_val = INDEX_PREFIX_REGEX.search(row[0]).group(0).strip()
+                row[0] = row[0].split(index_col_val)[-1].strip()
+            yield [index_col_val] + row
     
-    def add_new_headers(self, table):
+    def add_new_headers(self, rows):
+        '''Replace the two header rows with the header of the format, with
+        the years of the first header row
+        '''
+        rows = iter(rows)
+        table = [row for row in itertools.islice(rows, 2)]
         year_list = []
-        header_size = len(table[0])
-        for col_index in range(header_size):
-            year_data_match = re.search(r'[0-9]{4}\-[0-9]{4}', table[0][col_index])
+        for col_index in range(len(table[0])):
+            year_data_match = YEAR_RANGE_REGEX.search(table[0][col_index])
             if year_data_match:
                 year = year_data_match.group(0)
                 year_list.append(year)
@@ -290,33 +382,35 @@ class ExpenditureBudgetCSVGenerator(PDF2CSV):
         while len(table[0]) > len(table[1]):
             table[1] = [""] + table[1]
         table = self.merge_up_rows(0, table)
-        return table
+        for row in itertools.chain(table, rows):
+            yield row
 
-    def fix_second_header(self, table):
-        merge_up_required = False
-        header_row_index = None
-        for row_index in range(len(table)):
-            row = table[row_index]
+    def fix_second_header(self, rows):
+        '''Replace the second header rows with the header of the format, up to
+        the first one tabula split
+        '''
+        rows = iter(rows)
+        for row in rows:
             if self.header_padding_required:
                 col_value = row[1].lower().strip()
             else:
                 col_value = row[2].lower().strip()
-            if re.match(r'%s' % SECOND_HEADER_FIELD, col_value):
-                header_row_index = row_index
-                table[header_row_index] = FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"][:]
+            if SECOND_HEADER_REGEX.match(col_value):
+                yield FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"][:]
             elif "Head of" in "".join(row).strip():
-                header_row_index = row_index
-                if table[header_row_index][0].strip(): 
-                    table[header_row_index+1][0] = (table[header_row_index][0] + " " + table[header_row_index + 1][0]).strip() 
-                table[header_row_index] = FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"][:]
-                merge_up_required = True
+                next_row = next(rows, None)
+                if next_row is None:
+                    raise IndexError("list index out of range")
+                if row[0].strip(): 
+                    next_row[0] = (row[0] + " " + next_row[0]).strip() 
+                yield FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"][:]
+                if next_row[0]:
+                    yield [next_row[0]]
                 break
-        if merge_up_required:
-            if table[header_row_index+1][0]:
-                table[header_row_index+1] = [table[header_row_index+1][0]]
             else:
-                table.pop(header_row_index+1)
-        return table
+                yield row
+        for row in rows:
+            yield row
 
     def merge_up_rows(self, row_index, table):
         for col_index in range(len(table[row_index])): 
@@ -324,7 +418,7 @@ class ExpenditureBudgetCSVGenerator(PDF2CSV):
         table.pop(row_index+1)
         return table
 
-    def generate_expenditure_budgets_csv(self, doc_dir, header_format, page_header, identify_columns):
+    def generate_expenditure_budgets_csv(self, doc_dir, header_format, page_header, identify_columns, workers=1):
         self.header_format = header_format
         year_data_match = re.search(r'[0-9]{4}\-[0-9]{2,}', doc_dir) 
         if year_data_match:
@@ -334,27 +428,24 @@ class ExpenditureBudgetCSVGenerator(PDF2CSV):
             if not department_name in SKIP_FILENAMES:
                 logger.info("Processing PDF document for department: %s" % department_name)
                 try:
-                    self.bold_keywords = self.keywords_extractor.get_bold_text_phrases(file_name, is_other_starting_phrases=True, single_word=True)
-                    logger.info("BOLD Keywords: %s" % str(self.bold_keywords))
-                    self.generate_csv_file(file_name, file_name.split(".pdf")[0] + ".csv", is_header=page_header, identify_columns=identify_columns, temp_file_postfix=year)
+                    with PDFDocumentSession(file_name) as document_session:
+                        self.bold_keywords = self.keywords_extractor.get_bold_text_phrases(file_name, is_other_starting_phrases=True, single_word=True, document_session=document_session)
+                        logger.info("BOLD Keywords: %s" % str(self.bold_keywords))
+                        self.generate_csv_file(file_name, file_name.split(".pdf")[0] + ".csv", is_header=page_header, identify_columns=identify_columns, temp_file_postfix=year, workers=workers, document_session=document_session)
                 except Exception, error_message:
                     logger.error("Unable to extract CSV for department: %s, error_message: %s" % (department_name, error_message), exc_info = True)
 
-    def ensure_table_intergrity(self, table):
-        for row in table:
+    def ensure_table_intergrity(self, rows):
+        for row in rows:
             if len(row) > len(FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"]):
                 col_to_delete = []
                 for col_index in range(1, len(row)):
                     if not row[col_index].strip():
                         col_to_delete.append(col_index)
-                if col_to_delete:
-                    num = 0
-                    for col_index in col_to_delete:
-                        row.pop(col_index-num)
-                        num += 1
+                delete_columns([row], col_to_delete)
             while len(row) < len(FORMAT_DICT[self.header_format]["SECOND_HEADER_ROW"]):
                 row.append("")
-        return table
+            yield row
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Generates CSV files from Expenditure Budgets directory")
@@ -362,9 +453,10 @@ if __name__ == '__main__':
     parser.add_argument("header_format", help="Header format out of following: %s" % str(FORMAT_DICT))
     parser.add_argument("--columns", help="Identify columns and then parse")
     parser.add_argument("--page_header", help="Use if file consists of a page header(& we need to skip it)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to parse pages in parallel")
     args = parser.parse_args()
     obj = ExpenditureBudgetCSVGenerator()
     if not args.doc_dir: 
         print("Please input directory to begin CSV extraction")
     else:
-        obj.generate_expenditure_budgets_csv(args.doc_dir, args.header_format, page_header=args.page_header, identify_columns=args.columns)
+        obj.generate_expenditure_budgets_csv(args.doc_dir, args.header_format, page_header=args.page_header, identify_columns=args.columns, workers=args.workers)
@@ -0,0 +1,342 @@
+'Class for detecting tables from the drawing operators of born-digital PDF pages'
+
+import logging
+import numpy
+from PyPDF2.pdf import ContentStream
+
+logger = logging.getLogger()
+# Raster detection thresholds(in pixels at 300 DPI) converted to points
+MIN_RULE_LENGTH = 24.0
+BUFFER_LENGTH = 2.4
+AXIS_TOLERANCE = 0.5
+MIN_VERTICAL_RULES = 2
+IDENTITY_MATRIX = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+STROKE_OPERATORS = ["S", "s", "B", "B*", "b", "b*"]
+FILL_OPERATORS = ["f", "F", "f*"]
+TEXT_SHOW_OPERATORS = ["Tj", "TJ", "'", '"']
+
+
+def multiply_matrices(first_matrix, second_matrix):
+    '''Multiply two PDF transformation matrices given as (a, b, c, d, e, f)
+    '''
+    a1, b1, c1, d1, e1, f1 = first_matrix
+    a2, b2, c2, d2, e2, f2 = second_matrix
+    return (a1*a2 + b1*c2, a1*b2 + b1*d2,
+            c1*a2 + d1*c2, c1*b2 + d1*d2,
+            e1*a2 + f1*c2 + e2, e1*b2 + f1*d2 + f2)
+
+
+def transform_point(matrix, x, y):
+    a, b, c, d, e, f = matrix
+    return (a*x + c*y + e, b*x + d*y + f)
+
+
+def get_clubbed_coordinates(coordinates):
+    '''Average coordinates lying within `BUFFER_LENGTH` of a cluster's first
+    coordinate, like `PDF2CSV.get_clubbed_column_coordinates`
+    '''
+    clubbed_coordinates = []
+    point_cluster = []
+    for point in sorted(set(coordinates)):
+        if point_cluster and point - point_cluster[0] >= BUFFER_LENGTH:
+            clubbed_coordinates.append(sum(point_cluster)/len(point_cluster))
+            point_cluster = []
+        point_cluster.append(point)
+    if point_cluster:
+        clubbed_coordinates.append(sum(point_cluster)/len(point_cluster))
+    return clubbed_coordinates
+
+
+class PageVectorContent(object):
+    """
+    Ruling lines and text positions of a page, read from its content stream.
+
+    Coordinates are in points with the origin at the top left corner of the
+    page as displayed, the space tabula expects table areas and columns in.
+    """
+    def __init__(self, page):
+        self.rules = []
+        self.text_positions = []
+        media_box = page.mediaBox
+        self.page_left = float(media_box.getLowerLeft_x())
+        self.page_bottom = float(media_box.getLowerLeft_y())
+        self.page_width = float(media_box.getWidth())
+        self.page_height = float(media_box.getHeight())
+        self.rotation = 0
+        if '/Rotate' in page:
+            self.rotation = int(page['/Rotate']) % 360
+        contents = page.getContents()
+        if contents is not None:
+            self.read_operations(ContentStream(contents, page.pdf).operations)
+
+    def to_display_space(self, x, y):
+        '''Map a point in default user space to top left based page coordinates
+        '''
+        x = x - self.page_left
+        y = y - self.page_bottom
+        if self.rotation == 90:
+            return (y, x)
+        elif self.rotation == 180:
+            return (self.page_width - x, y)
+        elif self.rotation == 270:
+            return (self.page_height - y, self.page_width - x)
+        return (x, self.page_height - y)
+
+    def read_operations(self, operations):
+        '''Collect painted path segments and shown text positions.
+
+        Tracks the current transformation matrix through `q`/`Q`/`cm`, the
+        text matrix through the text positioning operators and whether the
+        fill color is white, as white fills are not visible on the page.
+        '''
+        matrix = IDENTITY_MATRIX
+        is_white_fill = False
+        state_stack = []
+        path_segments = []
+        current_point = None
+        subpath_start = None
+        text_matrix = text_line_matrix = IDENTITY_MATRIX
+        text_leading = 0.0
+        for operands, operator in operations:
+            if operator == "q":
+                state_stack.append((matrix, is_white_fill))
+            elif operator == "Q":
+                if state_stack:
+                    matrix, is_white_fill = state_stack.pop()
+            elif operator == "cm":
+                matrix = multiply_matrices(tuple(float(value) for value in operands),
+                                           matrix)
+            elif operator in ("g", "rg", "k", "sc", "scn"):
+                color = [float(value) for value in operands
+                         if not isinstance(value, basestring)]
+                if operator == "k":
+                    is_white_fill = bool(color) and not any(color)
+                else:
+                    is_white_fill = bool(color) and all(value == 1 for value in color)
+            elif operator == "m":
+                current_point = subpath_start = transform_point(matrix, float(operands[0]),
+                                                                float(operands[1]))
+            elif operator == "l":
+                point = transform_point(matrix, float(operands[0]), float(operands[1]))
+                if current_point:
+                    path_segments.append((current_point, point))
+                current_point = point
+            elif operator == "h":
+                if current_point and subpath_start:
+                    path_segments.append((current_point, subpath_start))
+                current_point = subpath_start
+            elif operator == "re":
+                x, y, width, height = [float(value) for value in operands]
+                corners = [transform_point(matrix, x, y),
+                           transform_point(matrix, x + width, y),
+                           transform_point(matrix, x + width, y + height),
+                           transform_point(matrix, x, y + height)]
+                for corner_index in range(4):
+                    path_segments.append((corners[corner_index],
+                                          corners[(corner_index+1) % 4]))
+                current_point = subpath_start = corners[0]
+            elif operator in STROKE_OPERATORS or operator in FILL_OPERATORS or operator == "n":
+                if operator in STROKE_OPERATORS or (operator in FILL_OPERATORS and not is_white_fill):
+                    self.add_rules(path_segments)
+                path_segments = []
+                current_point = subpath_start = None
+            elif operator == "BT":
+                text_matrix = text_line_matrix = IDENTITY_MATRIX
+            elif operator == "Tm":
+                text_matrix = text_line_matrix = tuple(float(value) for value in operands)
+            elif operator in ("Td", "TD"):
+                offset_x, offset_y = float(operands[0]), float(operands[1])
+                if operator == "TD":
+                    text_leading = -offset_y
+                text_matrix = text_line_matrix = multiply_matrices((1.0, 0.0, 0.0, 1.0, offset_x, offset_y),
+                                                                   text_line_matrix)
+            elif operator == "TL":
+                text_leading = float(operands[0])
+            elif operator in ("T*", "'", '"'):
+                text_matrix = text_line_matrix = multiply_matrices((1.0, 0.0, 0.0, 1.0, 0.0, -text_leading),
+                                                                   text_line_matrix)
+            if operator in TEXT_SHOW_OPERATORS:
+                x, y = transform_point(multiply_matrices(text_matrix, matrix), 0.0, 0.0)
+                self.text_positions.append(self.to_display_space(x, y))
+
+    def add_rules(self, path_segments):
+        '''Keep the horizontal and vertical segments of a painted path
+        '''
+        for start_point, end_point in path_segments:
+            x1, y1 = self.to_display_space(*start_point)
+            x2, y2 = self.to_display_space(*end_point)
+            if abs(x1 - x2) <= AXIS_TOLERANCE or abs(y1 - y2) <= AXIS_TOLERANCE:
+                self.rules.append((min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)))
+
+    def get_vertical_rules(self):
+        return [rule for rule in self.rules
+                if rule[2] - rule[0] <= AXIS_TOLERANCE and rule[3] - rule[1] >= MIN_RULE_LENGTH]
+
+    def get_horizontal_rules(self):
+        return [rule for rule in self.rules
+                if rule[3] - rule[1] <= AXIS_TOLERANCE and rule[2] - rule[0] >= MIN_RULE_LENGTH]
+
+
+def is_rule_connected(rule, other_rules):
+    '''Check which rules touch or cross a rule, within `BUFFER_LENGTH`.
+
+    Args:
+        - rule (tuple): (x1, y1, x2, y2) rule.
+        - other_rules (obj:`numpy.ndarray`): Rules as rows of (x1, y1, x2, y2).
+
+    Returns:
+        A boolean numpy array with an entry for every one of other_rules.
+    '''
+    return ((other_rules[:, 0] <= rule[2] + BUFFER_LENGTH) &
+            (other_rules[:, 2] >= rule[0] - BUFFER_LENGTH) &
+            (other_rules[:, 1] <= rule[3] + BUFFER_LENGTH) &
+            (other_rules[:, 3] >= rule[1] - BUFFER_LENGTH))
+
+
+def get_rule_grids(rules):
+    '''Group rules into grids of rules touching or crossing each other.
+
+    Returns:
+        A list of lists of rules, one for every grid.
+    '''
+    if not rules:
+        return []
+    rule_array = numpy.array(rules, dtype=float)
+    grid_indices = [None] * len(rules)
+    rule_grids = []
+    for rule_index in range(len(rules)):
+        if grid_indices[rule_index] is not None:
+            continue
+        grid_indices[rule_index] = len(rule_grids)
+        rule_grid = [rules[rule_index]]
+        pending_indices = [rule_index]
+        while pending_indices:
+            connected_indices = numpy.nonzero(is_rule_connected(rule_array[pending_indices.pop()],
+                                                                rule_array))[0]
+            for connected_index in connected_indices.tolist():
+                if grid_indices[connected_index] is None:
+                    grid_indices[connected_index] = len(rule_grids)
+                    rule_grid.append(rules[connected_index])
+                    pending_indices.append(connected_index)
+        rule_grids.append(rule_grid)
+    return rule_grids
+
+
+def get_rules_box(rules):
+    return (min(rule[0] for rule in rules), min(rule[1] for rule in rules),
+            max(rule[2] for rule in rules), max(rule[3] for rule in rules))
+
+
+def is_box_inside(inner_box, outer_box):
+    return (outer_box[0] <= inner_box[0] and outer_box[1] <= inner_box[1] and
+            inner_box[2] <= outer_box[2] and inner_box[3] <= outer_box[3])
+
+
+class VectorTableDetector(object):
+    """
+    Detect the table on a page from its ruling lines without rendering it.
+
+    Born-digital budget documents draw their table rules as vector paths, so
+    the rules and text positions are read from the content stream instead of
+    rendering the page and running Canny and Hough on it. Rules touching or
+    crossing each other are grouped into grids, and the table is the largest
+    grid with enough columns, like the largest closed contour of the raster
+    detection. Grids framing other grids, like page borders, and rules
+    outside the table, like title underlines and footer rules, are left out.
+    Pages without shown text, like scanned pages, or without enough rules
+    are left to the raster detection.
+    """
+    def detect_table(self, page, is_header=True):
+        '''Detect the table on a page.
+
+        Args:
+            - page (obj:`PageObject`): PyPDF2 page to detect the table on.
+            - is_header (boolean): Whether the table is bounded by its
+                vertical rules below a header, or by its horizontal rules,
+                like in `PDF2CSV.get_table_limits`. Defaults to True.
+
+        Returns:
+            A dict with the `table_limits`, `table_bounds` and
+            `column_coordinates` of the table in points, None if no table was
+            detected.
+        '''
+        try:
+            page_content = PageVectorContent(page)
+        except Exception, error_message:
+            logger.warning("Unable to read page content stream: %s" % error_message)
+            return None
+        table_grid = self.get_table_grid(page_content.get_vertical_rules() +
+                                         page_content.get_horizontal_rules())
+        if not table_grid:
+            return None
+        vertical_rules, horizontal_rules = table_grid
+        table_limits = self.get_table_limits(vertical_rules, horizontal_rules, is_header)
+        table_bounds = {"top": table_limits["vertical"]["max"][1],
+                        "left": table_limits["horizontal"]["max"][1],
+                        "bottom": table_limits["vertical"]["max"][2],
+                        "right": table_limits["horizontal"]["max"][2]}
+        if not any(table_bounds["left"] <= x <= table_bounds["right"] and
+                   table_bounds["top"] <= y <= table_bounds["bottom"]
+                   for x, y in page_content.text_positions):
+            return None
+        return {"table_limits": table_limits,
+                "table_bounds": table_bounds,
+                "column_coordinates": get_clubbed_coordinates([rule[0] for rule in vertical_rules])}
+
+    def get_table_grid(self, rules):
+        '''Get the rules of the largest grid with at least
+        `MIN_VERTICAL_RULES` columns and a horizontal rule, which does not
+        frame another such grid.
+
+        Returns:
+            A tuple of the vertical and horizontal rules of the grid, None if
+            there is no such grid.
+        '''
+        table_grids = []
+        for rule_grid in get_rule_grids(rules):
+            vertical_rules = [rule for rule in rule_grid if rule[2] - rule[0] <= AXIS_TOLERANCE]
+            horizontal_rules = [rule for rule in rule_grid if rule[2] - rule[0] > AXIS_TOLERANCE]
+            column_coordinates = get_clubbed_coordinates([rule[0] for rule in vertical_rules])
+            if len(column_coordinates) >= MIN_VERTICAL_RULES and horizontal_rules:
+                table_grids.append((get_rules_box(rule_grid), vertical_rules, horizontal_rules))
+        table_grids = [table_grid for table_grid in table_grids
+                       if not any(other_grid is not table_grid and
+                                  is_box_inside(other_grid[0], table_grid[0])
+                                  for other_grid in table_grids)]
+        if not table_grids:
+            return None
+        grid_box, vertical_rules, horizontal_rules = max(table_grids,
+                                                         key=lambda table_grid: (table_grid[0][2] - table_grid[0][0]) *
+                                                                                (table_grid[0][3] - table_grid[0][1]))
+        return vertical_rules, horizontal_rules
+
+    def get_table_limits(self, vertical_rules, horizontal_rules, is_header):
+        '''Get table limits in the layout of `PDF2CSV.get_table_limits`.
+
+        The table spans the horizontal rules from left to right. With a
+        header, it spans from the topmost rule to the bottom of the vertical
+        rules, which run down the body of the table, without one it spans
+        from the first to the last horizontal rule, which the vertical rules
+        are extended to.
+        '''
+        max_vertical = max(vertical_rules, key=lambda rule: rule[3] - rule[1])
+        max_horizontal = max(horizontal_rules, key=lambda rule: rule[2] - rule[0])
+        vertical_x = [rule[0] for rule in vertical_rules]
+        horizontal_y = [rule[1] for rule in horizontal_rules]
+        horizontal_stretch = [min(vertical_x), max(vertical_x)]
+        vertical_stretch = [min(horizontal_y), max(horizontal_y)]
+        table_left = min(horizontal_stretch[0], min(rule[0] for rule in horizontal_rules)) - BUFFER_LENGTH
+        table_right = max(horizontal_stretch[1], max(rule[2] for rule in horizontal_rules))
+        if is_header:
+            table_top = min(vertical_stretch[0], min(rule[1] for rule in vertical_rules))
+            table_bottom = max(rule[3] for rule in vertical_rules)
+        else:
+            table_top, table_bottom = vertical_stretch
+        return {"horizontal": {"stretch": horizontal_stretch,
+                               "found": True,
+                               "max": [max_horizontal[2] - max_horizontal[0],
+                                       table_left, table_right, min(horizontal_y)]},
+                "vertical": {"stretch": vertical_stretch,
+                             "found": True,
+                             "max": [max_vertical[3] - max_vertical[1],
+                                     table_top, table_bottom, min(vertical_x)]}}
@@ -0,0 +1,85 @@
+'Scratch directories isolating the temp files of conversion jobs'
+
+import ConfigParser
+import io
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger()
+PARSER_CONFIG_FILE = 'parsers/parsers_config.ini'
+
+
+def get_workspace_root():
+    '''Get the directory under which workspaces are created.
+
+    The root is read from the `[workspace]` section of `parsers_config.ini`,
+    it can point to a tmpfs mount like `/dev/shm` to keep scratch files in
+    memory.
+
+    Returns:
+        The configured root directory, None to use the system temp directory.
+    '''
+    if not os.path.exists(PARSER_CONFIG_FILE):
+        return None
+    with open(PARSER_CONFIG_FILE) as f:
+        parser_config = f.read()
+    PARSER_CONFIG = ConfigParser.RawConfigParser(allow_no_value=True)
+    PARSER_CONFIG.readfp(io.BytesIO(parser_config))
+    if not PARSER_CONFIG.has_option('workspace', 'root'):
+        return None
+    workspace_root = PARSER_CONFIG.get('workspace', 'root')
+    if not workspace_root or not os.path.isdir(workspace_root):
+        return None
+    return workspace_root
+
+
+class Workspace(object):
+    """
+    Private scratch directory of a conversion job.
+
+    Temp files used to be written to fixed paths under /tmp named after the
+    document, so two jobs on the same document overwrote each other's files.
+    Every job, and every worker process of a job, now gets its own directory
+    which is deleted along with its content once the job is done.
+
+    Usage:
+        with Workspace(prefix="pdf2csv_") as workspace:
+            temp_csv_file = workspace.get_path("temp_data.csv")
+    """
+    def __init__(self, prefix="parsers_", root=None, keep=False):
+        self.prefix = prefix
+        self.root = root
+        self.keep = keep
+        self.path = None
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def create(self):
+        '''Create the scratch directory
+        '''
+        workspace_root = self.root or get_workspace_root()
+        self.path = tempfile.mkdtemp(prefix=self.prefix, dir=workspace_root)
+        return self.path
+
+    def get_path(self, file_name):
+        '''Get the path of a scratch file inside the workspace
+        '''
+        return os.path.join(self.path, file_name)
+
+    def cleanup(self):
+        '''Delete the scratch directory, unless it is to be kept for debugging
+        '''
+        if not self.path:
+            return
+        if self.keep:
+            logger.info("Keeping workspace: %s" % self.path)
+        else:
+            shutil.rmtree(self.path, ignore_errors=True)
+        self.path = None